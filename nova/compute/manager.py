@@ -35,6 +35,7 @@ terminating it.
 
 """
 
+import datetime
 import os
 import socket
 import sys
@@ -83,6 +84,17 @@ flags.DEFINE_integer("rescue_timeout", 0,
                      " Set to 0 to disable.")
 flags.DEFINE_integer('host_state_interval', 120,
                      'Interval in seconds for querying the host status')
+flags.DEFINE_bool('power_state_sync_incremental', True,
+                  'Only write power states that changed since the last sync')
+flags.DEFINE_integer('power_state_sync_min_interval', 0,
+                     'Seconds between power state syncs while states are '
+                     'changing, 0 syncs on every periodic task')
+flags.DEFINE_integer('power_state_sync_max_interval', 0,
+                     'Longest time in seconds the power state sync backs '
+                     'off to while nothing changes, 0 disables the backoff')
+flags.DEFINE_integer('power_state_full_sync_interval', 600,
+                     'Interval in seconds for reloading the power states of '
+                     'this host\'s instances from the database')
 
 LOG = logging.getLogger('nova.compute.manager')
 
@@ -145,12 +157,27 @@ class ComputeManager(manager.SchedulerDependentManager):
         self.network_manager = utils.import_object(FLAGS.network_manager)
         self.volume_manager = utils.import_object(FLAGS.volume_manager)
         self._last_host_check = 0
+        # Last known database power_state by instance id, and instance id
+        # by name, for the incremental power state sync.
+        self._power_states = None
+        self._power_state_ids = {}
+        self._power_states_loaded_at = 0
+        self._power_states_checked_at = None
+        self._power_sync_names = None
+        self._power_sync_interval = FLAGS.power_state_sync_min_interval
+        self._next_power_sync = 0
+        self.power_sync_stats = {'ticks': 0, 'updates': 0,
+                                 'total_time': 0.0, 'last_time': 0.0}
         super(ComputeManager, self).__init__(service_name="compute",
                                              *args, **kwargs)
 
     def _instance_update(self, context, instance_id, **kwargs):
         """Update an instance in the database using kwargs as value."""
-        return self.db.instance_update(context, instance_id, kwargs)
+        instance_ref = self.db.instance_update(context, instance_id, kwargs)
+        if 'power_state' in kwargs and self._power_states is not None and \
+           instance_ref['id'] in self._power_states:
+            self._power_states[instance_ref['id']] = kwargs['power_state']
+        return instance_ref
 
     def init_host(self):
         """Initialization for a standalone compute service."""
@@ -1699,7 +1726,101 @@ class ComputeManager(manager.SchedulerDependentManager):
         then it will be set to power_state.NOSTATE, because it doesn't exist
         on the hypervisor.
 
+        With power_state_sync_incremental the hypervisor's states are read
+        in one call and compared with the last states known to be in the
+        database, and only the ones that differ are written.  The known
+        states are refreshed from the rows updated since the last sync, as
+        drivers write power states to the database themselves.  The sync
+        runs every power_state_sync_min_interval seconds while states change
+        and, if power_state_sync_max_interval is set, backs off up to it
+        while they don't.
+
         """
+        if not FLAGS.power_state_sync_incremental:
+            return self._sync_power_states_full(context)
+
+        start = time.time()
+        if start < self._next_power_sync:
+            return
+
+        vm_power_states = self.driver.get_power_states()
+        names = set(vm_power_states)
+        # New instances show up on the hypervisor first, and other services
+        # change the database, so go back to it when the set of instances
+        # changes and every power_state_full_sync_interval seconds.
+        if self._power_states is None or names != self._power_sync_names or \
+           start - self._power_states_loaded_at > \
+           FLAGS.power_state_full_sync_interval:
+            self._load_power_states(context, names)
+        else:
+            self._refresh_power_states(context)
+        self._power_sync_names = names
+
+        changes = {}
+        for name, instance_id in self._power_state_ids.iteritems():
+            vm_power_state = vm_power_states.get(name, power_state.NOSTATE)
+            if vm_power_state != self._power_states[instance_id]:
+                changes[instance_id] = vm_power_state
+
+        if changes:
+            LOG.info(_("Updating the power state of %d instances"),
+                     len(changes))
+            self.db.instance_power_state_update_many(context, changes)
+            self._power_states.update(changes)
+            self._power_sync_interval = FLAGS.power_state_sync_min_interval
+        else:
+            self._power_sync_interval = min(
+                max(self._power_sync_interval * 2, 1),
+                FLAGS.power_state_sync_max_interval)
+        self._power_sync_interval = max(self._power_sync_interval,
+                                        FLAGS.power_state_sync_min_interval)
+        self._next_power_sync = start + self._power_sync_interval
+
+        elapsed = time.time() - start
+        stats = self.power_sync_stats
+        stats['ticks'] += 1
+        stats['updates'] += len(changes)
+        stats['total_time'] += elapsed
+        stats['last_time'] = elapsed
+        LOG.debug(_("Power state sync of %(count)d instances took "
+                    "%(elapsed).3fs, %(changed)d changed, next in "
+                    "%(interval)ds") %
+                  {'count': len(self._power_state_ids), 'elapsed': elapsed,
+                   'changed': len(changes),
+                   'interval': self._power_sync_interval})
+
+    def _load_power_states(self, context, vm_names):
+        """Read the power state of this host's instances from the database."""
+        self._power_states_checked_at = utils.utcnow()
+        self._power_states = self.db.instance_power_states_get_by_host(
+            context, self.host)
+        self._power_state_ids = dict(
+            (FLAGS.instance_name_template % instance_id, instance_id)
+            for instance_id in self._power_states)
+        self._power_states_loaded_at = time.time()
+
+        num_vm_instances = len(vm_names)
+        num_db_instances = len(self._power_states)
+        if num_vm_instances != num_db_instances:
+            LOG.info(_("Found %(num_db_instances)s in the database and "
+                       "%(num_vm_instances)s on the hypervisor.") % locals())
+
+    def _refresh_power_states(self, context):
+        """Pick up the power states written since the last sync, such as the
+        ones the driver writes while starting and stopping instances."""
+        checked_at = utils.utcnow()
+        # updated_at may be stored without fractions of a second.
+        since = self._power_states_checked_at - datetime.timedelta(seconds=1)
+        changed = self.db.instance_power_states_get_by_host(
+            context, self.host, changed_since=since)
+        self._power_states_checked_at = checked_at
+        for instance_id, state in changed.iteritems():
+            self._power_states[instance_id] = state
+            self._power_state_ids[FLAGS.instance_name_template %
+                                  instance_id] = instance_id
+
+    def _sync_power_states_full(self, context):
+        """Compare and update every instance's power state, one at a time."""
         vm_instances = self.driver.list_instances_detail()
         vm_instances = dict((vm.name, vm) for vm in vm_instances)
         db_instances = self.db.instance_get_all_by_host(context, self.host)
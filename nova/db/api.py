@@ -526,6 +526,17 @@ def instance_get_active_by_window_joined(context, begin, end=None,
                                               project_id)
 
 
+def instance_get_active_by_window_page(context, begin, end=None,
+                                       after_id=0, limit=500):
+    """Get the next page of instances active during a time window.
+
+    Instances are ordered by id and only those with an id greater than
+    after_id are returned, so callers can walk a large window a page at a
+    time and resume from the last id they saw."""
+    return IMPL.instance_get_active_by_window_page(context, begin, end,
+                                                   after_id, limit)
+
+
 def instance_get_all_by_user(context, user_id):
     """Get all instances."""
     return IMPL.instance_get_all_by_user(context, user_id)
@@ -541,6 +552,21 @@ def instance_get_all_by_host(context, host):
     return IMPL.instance_get_all_by_host(context, host)
 
 
+def instance_power_states_get_by_host(context, host, changed_since=None):
+    """Get {instance id: power_state} for the instances on a host,
+    optionally only those updated at or after changed_since."""
+    return IMPL.instance_power_states_get_by_host(context, host,
+                                                  changed_since=changed_since)
+
+
+def instance_power_state_update_many(context, power_states):
+    """Set the power_state of several instances in one update.
+
+    :param power_states: dict of instance id to power_state
+    """
+    return IMPL.instance_power_state_update_many(context, power_states)
+
+
 def instance_get_all_by_reservation(context, reservation_id):
     """Get all instances belonging to a reservation."""
     return IMPL.instance_get_all_by_reservation(context, reservation_id)
@@ -36,6 +36,7 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import joinedload_all
 from sqlalchemy.sql import func
+from sqlalchemy.sql.expression import case
 from sqlalchemy.sql.expression import desc
 from sqlalchemy.sql.expression import literal_column
 
@@ -1382,6 +1383,26 @@ def instance_get_active_by_window_joined(context, begin, end=None,
     return query.all()
 
 
+@require_admin_context
+def instance_get_active_by_window_page(context, begin, end=None,
+                                       after_id=0, limit=500):
+    """Return a page of instances continuously active over window.
+
+    Only the instance_type is joined, which is all usage notifications need.
+    """
+    session = get_session()
+    query = session.query(models.Instance).\
+                    options(joinedload('instance_type')).\
+                    filter(models.Instance.launched_at < begin).\
+                    filter(models.Instance.id > after_id)
+    if end:
+        query = query.filter(or_(models.Instance.terminated_at == None,
+                                 models.Instance.terminated_at > end))
+    else:
+        query = query.filter(models.Instance.terminated_at == None)
+    return query.order_by(models.Instance.id).limit(limit).all()
+
+
 @require_admin_context
 def instance_get_all_by_user(context, user_id):
     session = get_session()
@@ -1412,6 +1433,33 @@ def instance_get_all_by_host(context, host):
                    all()
 
 
+@require_admin_context
+def instance_power_states_get_by_host(context, host, changed_since=None):
+    session = get_session()
+    query = session.query(models.Instance.id, models.Instance.power_state).\
+                    filter_by(host=host).\
+                    filter_by(deleted=False)
+    if changed_since:
+        query = query.filter(models.Instance.updated_at >= changed_since)
+    return dict(query.all())
+
+
+@require_admin_context
+def instance_power_state_update_many(context, power_states):
+    if not power_states:
+        return
+    instances = models.Instance.__table__
+    whens = sorted(power_states.items())
+    statement = instances.update().\
+                    where(instances.c.id.in_(power_states.keys())).\
+                    where(instances.c.deleted == False).\
+                    values(power_state=case(whens, value=instances.c.id),
+                           updated_at=utils.utcnow())
+    session = get_session()
+    with session.begin():
+        session.execute(statement)
+
+
 @require_context
 def instance_get_all_by_project(context, project_id):
     authorize_project_context(context, project_id)
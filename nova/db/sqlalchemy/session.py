@@ -18,9 +18,13 @@
 
 """Session Handling for SQLAlchemy backend."""
 
+import os
 import sqlalchemy.exc
+import sqlalchemy.interfaces
 import sqlalchemy.orm
+import sqlalchemy.pool
 import time
+import traceback
 
 import nova.exception
 import nova.flags as flags
@@ -32,37 +36,241 @@ LOG = logging.getLogger("nova.db.sqlalchemy.session")
 
 _ENGINE = None
 _MAKER = None
+_READER = None
+_REPLICA = None
+_REPLICA_STATE = {'checked_at': 0, 'usable': False}
+
+
+class Session(sqlalchemy.orm.session.Session):
+    """Session whose query and flush errors are raised as DBError."""
+
+    @nova.exception.wrap_db_error
+    def query(self, *args, **kwargs):
+        return super(Session, self).query(*args, **kwargs)
+
+    @nova.exception.wrap_db_error
+    def flush(self, *args, **kwargs):
+        return super(Session, self).flush(*args, **kwargs)
 
 
 def get_session(autocommit=True, expire_on_commit=False):
     """Return a SQLAlchemy session."""
+    return _get_maker(autocommit, expire_on_commit)()
+
+
+def get_reader_session():
+    """Return the calling thread's reusable session for read only queries.
+
+    The session is created once per (green)thread instead of on every call.
+    Its identity map is emptied each time it is handed out so results are
+    never served from an earlier read.
+    """
+    global _READER
+
+    if _READER is None:
+        _READER = sqlalchemy.orm.scoped_session(_get_maker())
+    session = _READER()
+    session.expunge_all()
+    return session
+
+
+def get_replica_session():
+    """Return the calling thread's reusable session on the read replica.
+
+    Falls back to :py:func:`get_reader_session` on the primary when no
+    sql_read_connection is configured or the replica lags more than
+    sql_read_max_lag seconds behind.
+    """
+    if not FLAGS.sql_read_connection or not _replica_usable():
+        return get_reader_session()
+    session = _REPLICA()
+    session.expunge_all()
+    return session
+
+
+def _replica_usable():
+    """Check the replica lag, at most every sql_read_lag_check_interval."""
+    global _REPLICA
+
+    now = time.time()
+    if now - _REPLICA_STATE['checked_at'] < FLAGS.sql_read_lag_check_interval:
+        return _REPLICA_STATE['usable']
+    _REPLICA_STATE['checked_at'] = now
+    try:
+        if _REPLICA is None:
+            engine = _create_engine(FLAGS.sql_read_connection)
+            _REPLICA = sqlalchemy.orm.scoped_session(get_maker(engine))
+        lag = replica_lag(_REPLICA.bind)
+    except Exception, e:
+        LOG.warning(_('Read replica unavailable, reading from the primary: '
+                      '%s'), e)
+        lag = None
+    usable = lag is not None and lag <= FLAGS.sql_read_max_lag
+    if not usable and _REPLICA_STATE['usable']:
+        LOG.warning(_('Read replica lag is %s seconds, reading from the '
+                      'primary'), lag)
+    _REPLICA_STATE['usable'] = usable
+    return usable
+
+
+def replica_lag(engine):
+    """Return how many seconds the replica behind ``engine`` is behind its
+    primary, or None when replication is not running."""
+    if engine.url.drivername != 'mysql':
+        return 0
+    status = engine.execute("SHOW SLAVE STATUS").first()
+    if status is None:
+        # Not a slave at all, so it can not fall behind.
+        return 0
+    return status['Seconds_Behind_Master']
+
+
+def _get_maker(autocommit=True, expire_on_commit=False):
     global _ENGINE, _MAKER
 
     if _MAKER is None or _ENGINE is None:
         _ENGINE = get_engine()
         _MAKER = get_maker(_ENGINE, autocommit, expire_on_commit)
+    return _MAKER
 
-    session = _MAKER()
-    session.query = nova.exception.wrap_db_error(session.query)
-    session.flush = nova.exception.wrap_db_error(session.flush)
-    return session
+
+class PoolMetrics(object):
+    """Counts connection checkouts, the time spent waiting on the pool and
+    the statements slower than sql_slow_query_time."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.checked_out = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        self.queries = 0
+        self.query_total = 0.0
+        self.slow_queries = 0
+
+    def record_wait(self, seconds, timed_out=False):
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        if timed_out:
+            self.timeouts += 1
+
+    def record_query(self, seconds, slow=False):
+        self.queries += 1
+        self.query_total += seconds
+        if slow:
+            self.slow_queries += 1
+
+    def summary(self):
+        """Return the counters as a dict, e.g. for logging."""
+        return {'checkouts': self.checkouts,
+                'checked_out': self.checked_out,
+                'wait_total': self.wait_total,
+                'wait_max': self.wait_max,
+                'timeouts': self.timeouts,
+                'queries': self.queries,
+                'query_total': self.query_total,
+                'slow_queries': self.slow_queries}
+
+
+POOL_METRICS = PoolMetrics()
+
+
+class InstrumentedQueuePool(sqlalchemy.pool.QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def do_get(self):
+        start = time.time()
+        timed_out = False
+        try:
+            return super(InstrumentedQueuePool, self).do_get()
+        except sqlalchemy.exc.TimeoutError:
+            timed_out = True
+            LOG.error(_('Timed out waiting for a sql connection, %d are '
+                        'checked out'), POOL_METRICS.checked_out)
+            raise
+        finally:
+            POOL_METRICS.record_wait(time.time() - start, timed_out)
+
+
+class CheckoutListener(sqlalchemy.interfaces.PoolListener):
+    """Tracks checked out connections and, when sql_pool_ping is set,
+    replaces connections the server has dropped before handing them out."""
+
+    def checkout(self, dbapi_con, con_record, con_proxy):
+        if FLAGS.sql_pool_ping:
+            try:
+                dbapi_con.cursor().execute("SELECT 1")
+            except Exception, e:
+                LOG.warning(_('Dropping dead sql connection: %s'), e)
+                raise sqlalchemy.exc.DisconnectionError()
+        POOL_METRICS.checkouts += 1
+        POOL_METRICS.checked_out += 1
+
+    def checkin(self, dbapi_con, con_record):
+        POOL_METRICS.checked_out = max(POOL_METRICS.checked_out - 1, 0)
+
+
+def _call_site():
+    """Return the first frame outside of SQLAlchemy and this module."""
+    skip = (os.path.dirname(sqlalchemy.__file__),
+            os.path.splitext(__file__)[0])
+    for filename, lineno, function, _text in reversed(
+            traceback.extract_stack()):
+        if not filename.startswith(skip):
+            return "%s:%s in %s" % (filename, lineno, function)
+    return "unknown"
+
+
+class QueryTimer(sqlalchemy.interfaces.ConnectionProxy):
+    """Times every statement and logs the slow ones with their call site."""
+
+    def cursor_execute(self, execute, cursor, statement, parameters,
+                       context, executemany):
+        start = time.time()
+        try:
+            return execute(cursor, statement, parameters, context)
+        finally:
+            elapsed = time.time() - start
+            slow = (FLAGS.sql_slow_query_time and
+                    elapsed >= FLAGS.sql_slow_query_time)
+            POOL_METRICS.record_query(elapsed, bool(slow))
+            if slow:
+                LOG.warning(_('Slow sql query (%(elapsed).3fs) from '
+                              '%(site)s: %(statement)s'),
+                            {'elapsed': elapsed,
+                             'site': _call_site(),
+                             'statement': statement})
 
 
 def get_engine():
     """Return a SQLAlchemy engine."""
-    connection_dict = sqlalchemy.engine.url.make_url(FLAGS.sql_connection)
+    engine = _create_engine(FLAGS.sql_connection)
+    ensure_connection(engine)
+    return engine
+
+
+def _create_engine(sql_connection):
+    connection_dict = sqlalchemy.engine.url.make_url(sql_connection)
 
     engine_args = {
         "pool_recycle": FLAGS.sql_idle_timeout,
         "echo": False,
+        "proxy": QueryTimer(),
     }
 
     if "sqlite" in connection_dict.drivername:
         engine_args["poolclass"] = sqlalchemy.pool.NullPool
+    else:
+        engine_args["poolclass"] = InstrumentedQueuePool
+        engine_args["pool_size"] = FLAGS.sql_pool_size
+        engine_args["max_overflow"] = FLAGS.sql_max_overflow
+        engine_args["pool_timeout"] = FLAGS.sql_pool_timeout
+        engine_args["listeners"] = [CheckoutListener()]
 
-    engine = sqlalchemy.create_engine(FLAGS.sql_connection, **engine_args)
-    ensure_connection(engine)
-    return engine
+    return sqlalchemy.create_engine(sql_connection, **engine_args)
 
 
 def ensure_connection(engine):
@@ -85,5 +293,6 @@ def ensure_connection(engine):
 def get_maker(engine, autocommit=True, expire_on_commit=False):
     """Return a SQLAlchemy sessionmaker using the given engine."""
     return sqlalchemy.orm.sessionmaker(bind=engine,
+                                       class_=Session,
                                        autocommit=autocommit,
                                        expire_on_commit=expire_on_commit)
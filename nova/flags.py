@@ -359,6 +359,24 @@ DEFINE_integer('sql_idle_timeout',
               'timeout for idle sql database connections')
 DEFINE_integer('sql_max_retries', 12, 'sql connection attempts')
 DEFINE_integer('sql_retry_interval', 10, 'sql connection retry interval')
+DEFINE_integer('sql_pool_size', 10,
+               'connections kept open in the sql connection pool')
+DEFINE_integer('sql_max_overflow', 10,
+               'connections allowed beyond sql_pool_size under load')
+DEFINE_integer('sql_pool_timeout', 30,
+               'seconds to wait for a pooled sql connection to free up')
+DEFINE_bool('sql_pool_ping', True,
+            'check pooled sql connections are alive before handing them out')
+DEFINE_float('sql_slow_query_time', 0.5,
+             'log sql statements slower than this many seconds, 0 disables')
+DEFINE_string('sql_read_connection', None,
+              'connection string for a read only replica of the sql '
+              'database, reads marked for it use the primary when unset')
+DEFINE_integer('sql_read_max_lag', 5,
+               'seconds the read replica may fall behind the primary '
+               'before its reads go to the primary instead')
+DEFINE_integer('sql_read_lag_check_interval', 10,
+               'seconds between checks of the read replica lag')
 
 DEFINE_string('compute_manager', 'nova.compute.manager.ComputeManager',
               'Manager for compute')
@@ -412,6 +430,9 @@ DEFINE_bool('resume_guests_state_on_host_boot', False,
 
 DEFINE_string('root_helper', 'sudo',
               'Command prefix to use for running commands as root')
+DEFINE_string('privileged_helper_socket', None,
+              'UNIX socket of the privileged helper to run commands as root '
+              'through instead of root_helper')
 
 DEFINE_bool('use_ipv6', False, 'use ipv6')
 
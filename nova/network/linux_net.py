@@ -22,6 +22,11 @@ import calendar
 import inspect
 import netaddr
 import os
+import sys
+import time
+
+from eventlet import event
+from eventlet import greenthread
 
 from nova import db
 from nova import exception
@@ -70,6 +75,9 @@ flags.DEFINE_bool('send_arp_for_ha', False,
 flags.DEFINE_bool('use_single_default_gateway',
                    False, 'Use single default gateway. Only first nic of vm'
                           ' will get default gateway from dhcp server')
+flags.DEFINE_float('iptables_apply_delay', 0.2,
+                   'Seconds apply_coalesced waits to gather rule changes '
+                   'into one iptables-restore, 0 applies right away')
 binary_name = os.path.basename(inspect.stack()[-1][1])
 
 
@@ -238,6 +246,9 @@ class IptablesManager(object):
         self.ipv4 = {'filter': IptablesTable(),
                      'nat': IptablesTable()}
         self.ipv6 = {'filter': IptablesTable()}
+        self._pending_apply = None
+        self.apply_stats = {'applies': 0, 'requests': 0,
+                            'total_time': 0.0, 'last_time': 0.0}
 
         # Add a nova-filter-top chain. It's intended to be shared
         # among the various nova components. It sits at the very top
@@ -314,6 +325,46 @@ class IptablesManager(object):
                              process_input='\n'.join(new_filter),
                              attempts=5)
 
+    def apply_coalesced(self):
+        """Apply the current rules, sharing the restore with other callers.
+
+        The first caller schedules an apply iptables_apply_delay seconds
+        out and every caller until then waits on that same apply, so a
+        burst of rule changes, say from several instances being built at
+        once, costs one iptables-save/restore instead of one each.  Returns
+        once rules including the caller's changes are in place and raises
+        what apply raised if it failed.
+
+        """
+        self.apply_stats['requests'] += 1
+        if FLAGS.iptables_apply_delay <= 0:
+            return self._timed_apply()
+        if self._pending_apply is None:
+            self._pending_apply = event.Event()
+            greenthread.spawn_after(FLAGS.iptables_apply_delay,
+                                    self._run_pending_apply)
+        return self._pending_apply.wait()
+
+    def _run_pending_apply(self):
+        # Changes made from here on wait for the next apply, this one may
+        # already have read the tables they touch.
+        done, self._pending_apply = self._pending_apply, None
+        try:
+            self._timed_apply()
+        except Exception:
+            done.send_exception(*sys.exc_info())
+        else:
+            done.send()
+
+    def _timed_apply(self):
+        start = time.time()
+        self.apply()
+        elapsed = time.time() - start
+        self.apply_stats['applies'] += 1
+        self.apply_stats['total_time'] += elapsed
+        self.apply_stats['last_time'] = elapsed
+        LOG.debug(_('Applied iptables rules in %.3fs'), elapsed)
+
     def _modify_rules(self, current_lines, table, binary=None):
         unwrapped_chains = table.unwrapped_chains
         chains = table.chains
@@ -0,0 +1,305 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2011 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Long running helper that runs whitelisted commands as root.
+
+Running a command through ``root_helper`` costs a sudo fork and exec, plus
+sudo's own policy and logging work, on top of the command itself.  With
+``privileged_helper_socket`` set, :py:func:`nova.utils.execute` hands
+``run_as_root`` commands to a helper started as root on the same host
+(``bin/nova-privileged-helper``), which runs them directly and answers over a
+local UNIX socket.  Several commands may be sent in one request.
+
+Each request and reply is one line of JSON::
+
+    {"commands": [{"cmd": ["vzctl", "status", "101"], "input": null}]}
+    {"results": [{"exit_code": 0, "stdout": "...", "stderr": "",
+                  "elapsed": 0.01}]}
+
+Strings are sent as latin-1 so arbitrary bytes survive the round trip.  A
+command whose executable is not in ``privileged_helper_commands`` is refused
+with exit code 126 and is not run.
+"""
+
+import json
+import os
+import socket
+import time
+
+import eventlet
+from eventlet import pools
+from eventlet.green import subprocess
+
+from nova import exception
+from nova import flags
+from nova import log as logging
+
+
+LOG = logging.getLogger('nova.privileged')
+FLAGS = flags.FLAGS
+flags.DEFINE_list('privileged_helper_commands',
+                  ['vzctl', 'vzlist', 'vzquota', 'rm', 'touch', 'chmod',
+                   'chown', 'mkdir', 'cat', 'cp', 'mv', 'ln', 'mount',
+                   'umount', 'blkid', 'e2fsck', 'resize2fs', 'mkfs',
+                   'mkfs.ext3', 'mkfs.ext4', 'iscsiadm', 'iptables',
+                   'iptables-save', 'iptables-restore', 'ip', 'brctl',
+                   'ovs-vsctl', 'sysctl', 'tee', 'dd', 'blockdev',
+                   'service'],
+                  'Executables the privileged helper is allowed to run')
+flags.DEFINE_list('privileged_helper_paths',
+                  ['/bin', '/sbin', '/usr/bin', '/usr/sbin',
+                   '/usr/local/bin', '/usr/local/sbin'],
+                  'Directories commands given with a path must be in')
+flags.DEFINE_string('privileged_helper_group', None,
+                    'Group allowed to connect to the privileged helper socket')
+flags.DEFINE_integer('privileged_helper_pool_size', 4,
+                     'Connections each process keeps to the privileged helper')
+
+REFUSED_EXIT_CODE = 126
+
+
+class HelperUnavailable(exception.Error):
+    """The privileged helper could not be reached."""
+    pass
+
+
+class CommandMetrics(object):
+    """Count and time of the commands run, by executable."""
+
+    def __init__(self):
+        self.commands = {}
+
+    def record(self, cmd, elapsed):
+        name = os.path.basename(cmd[0]) if cmd else ''
+        count, total, longest = self.commands.get(name, (0, 0.0, 0.0))
+        self.commands[name] = (count + 1, total + elapsed,
+                               max(longest, elapsed))
+
+    def summary(self):
+        """Return {executable: {'count', 'total', 'mean', 'max'}}."""
+        return dict((name, {'count': count,
+                            'total': total,
+                            'mean': total / count,
+                            'max': longest})
+                    for name, (count, total, longest)
+                    in self.commands.iteritems())
+
+
+METRICS = CommandMetrics()
+
+
+def is_allowed(cmd):
+    """Whether the helper may run ``cmd``."""
+    if not cmd:
+        return False
+    executable = cmd[0]
+    if os.path.basename(executable) not in FLAGS.privileged_helper_commands:
+        return False
+    if os.sep in executable:
+        return os.path.dirname(executable) in FLAGS.privileged_helper_paths
+    return True
+
+
+def _bytes(value):
+    if isinstance(value, unicode):
+        return value.encode('latin-1')
+    return value
+
+
+def run_command(cmd, process_input=None):
+    """Run one command for a client, returning its result dict."""
+    cmd = [str(_bytes(arg)) for arg in cmd]
+    process_input = _bytes(process_input)
+    start = time.time()
+    if not is_allowed(cmd):
+        LOG.warning(_('Refused to run %s'), ' '.join(cmd))
+        return {'exit_code': REFUSED_EXIT_CODE, 'stdout': '',
+                'stderr': 'command not allowed by the privileged helper',
+                'elapsed': 0.0}
+    try:
+        obj = subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               close_fds=True)
+        stdout, stderr = obj.communicate(process_input)
+        exit_code = obj.returncode
+    except OSError, e:
+        stdout, stderr, exit_code = '', str(e), 127
+    elapsed = time.time() - start
+    METRICS.record(cmd, elapsed)
+    LOG.debug(_('Ran %(cmd)s as root: %(exit_code)s in %(elapsed).3fs'),
+              {'cmd': ' '.join(cmd), 'exit_code': exit_code,
+               'elapsed': elapsed})
+    return {'exit_code': exit_code, 'stdout': stdout, 'stderr': stderr,
+            'elapsed': elapsed}
+
+
+def _handle_client(sock):
+    stream = sock.makefile('rw')
+    try:
+        for line in stream:
+            try:
+                request = json.loads(line)
+                results = [run_command(command['cmd'], command.get('input'))
+                           for command in request['commands']]
+                reply = {'results': results}
+            except Exception, e:
+                LOG.exception(_('Bad privileged helper request'))
+                reply = {'error': str(e)}
+            stream.write(json.dumps(reply, encoding='latin-1') + '\n')
+            stream.flush()
+    finally:
+        stream.close()
+        sock.close()
+
+
+def serve(path):
+    """Listen on ``path`` and run the commands sent to it, forever."""
+    if os.path.exists(path):
+        os.unlink(path)
+    server = eventlet.listen(path, family=socket.AF_UNIX)
+    if FLAGS.privileged_helper_group:
+        import grp
+        gid = grp.getgrnam(FLAGS.privileged_helper_group).gr_gid
+        os.chown(path, 0, gid)
+        os.chmod(path, 0660)
+    else:
+        os.chmod(path, 0600)
+    LOG.info(_('Privileged helper listening on %s'), path)
+    pool = eventlet.GreenPool()
+    while True:
+        sock, _address = server.accept()
+        pool.spawn_n(_handle_client, sock)
+
+
+class _ConnectionPool(pools.Pool):
+    """Open connections to the helper, reused across calls."""
+
+    def __init__(self, path, *args, **kwargs):
+        self.path = path
+        super(_ConnectionPool, self).__init__(*args, **kwargs)
+
+    def create(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        return sock.makefile('rw')
+
+
+_POOL = None
+
+
+def _get_pool():
+    global _POOL
+    if _POOL is None or _POOL.path != FLAGS.privileged_helper_socket:
+        _POOL = _ConnectionPool(FLAGS.privileged_helper_socket,
+                                max_size=FLAGS.privileged_helper_pool_size,
+                                order_as_stack=True)
+    return _POOL
+
+
+def _send(pool, request):
+    """Write request to a pooled connection and return the connection.
+
+    A pooled connection goes stale when the helper restarts, which only
+    shows when writing to it; as nothing reached the helper then, the
+    request is written once more on a fresh connection.
+    """
+    try:
+        stream = pool.get()
+    except socket.error, e:
+        raise HelperUnavailable(str(e))
+    try:
+        _write(stream, request)
+        return stream
+    except socket.error, e:
+        _discard(pool, stream)
+        LOG.debug(_('Privileged helper connection went stale, '
+                    'reconnecting: %s'), e)
+    try:
+        stream = pool.create()
+    except socket.error, e:
+        raise HelperUnavailable(str(e))
+    pool.current_size += 1
+    try:
+        _write(stream, request)
+    except socket.error, e:
+        _discard(pool, stream)
+        raise HelperUnavailable(str(e))
+    return stream
+
+
+def _write(stream, request):
+    stream.write(request + '\n')
+    stream.flush()
+
+
+def _discard(pool, stream):
+    """Close a broken connection and let the pool open one in its place."""
+    try:
+        stream.close()
+    except socket.error:
+        pass
+    pool.current_size -= 1
+
+
+def execute_many(commands):
+    """Run several commands in one round trip to the helper.
+
+    :param commands: list of (cmd list, process_input) pairs
+    :returns: list of result dicts with exit_code, stdout, stderr and
+              elapsed keys, in the same order
+    :raises HelperUnavailable: if the commands could not be sent to the
+                               helper, in which case nothing was run
+    :raises ProcessExecutionError: if the connection was lost after the
+                                   commands were sent
+    """
+    request = json.dumps({'commands': [{'cmd': map(str, cmd),
+                                        'input': process_input}
+                                       for cmd, process_input in commands]},
+                         encoding='latin-1')
+    pool = _get_pool()
+    stream = _send(pool, request)
+    try:
+        line = stream.readline()
+        if not line:
+            raise socket.error('connection closed by the helper')
+    except socket.error, e:
+        _discard(pool, stream)
+        # The helper may already have run the commands, so they must not
+        # be run again some other way.
+        raise exception.ProcessExecutionError(
+                cmd='; '.join(' '.join(map(str, cmd))
+                              for cmd, _input in commands),
+                description=_('Lost the privileged helper connection: %s')
+                            % e)
+    pool.put(stream)
+    reply = json.loads(line)
+    if 'error' in reply:
+        raise exception.Error(_('Privileged helper failed: %s')
+                              % reply['error'])
+    results = reply['results']
+    for (cmd, _input), result in zip(commands, results):
+        result['stdout'] = _bytes(result['stdout'])
+        result['stderr'] = _bytes(result['stderr'])
+        METRICS.record(cmd, result['elapsed'])
+    return results
+
+
+def execute(cmd, process_input=None):
+    """Run one command through the helper, see :py:func:`execute_many`."""
+    return execute_many([(cmd, process_input)])[0]
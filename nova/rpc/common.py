@@ -8,6 +8,13 @@ flags.DEFINE_integer('rpc_thread_pool_size', 1024,
                              'Size of RPC thread pool')
 flags.DEFINE_integer('rpc_conn_pool_size', 30,
                              'Size of RPC connection pool')
+flags.DEFINE_integer('rpc_response_timeout', 0,
+                     'Seconds to wait for a response to a call before '
+                     'raising Timeout; 0 waits forever')
+flags.DEFINE_bool('rpc_single_reply_queue', False,
+                  'Receive call responses on one long lived queue per '
+                  'process instead of declaring a queue for every call. '
+                  'Only enable once every service understands _reply_q.')
 
 
 class RemoteError(exception.Error):
@@ -27,3 +34,11 @@ class RemoteError(exception.Error):
         super(RemoteError, self).__init__('%s %s\n%s' % (exc_type,
                                                          value,
                                                          traceback))
+
+
+class Timeout(exception.Error):
+    """Signifies that a timeout has occurred while waiting for a response
+    from a remote procedure call.
+
+    """
+    pass
@@ -512,8 +512,11 @@ class RpcContext(context.RequestContext):
         msg_reply(self.msg_id, *args, **kwargs)
 
 
-def multicall(context, topic, msg):
-    """Make a call that returns multiple times."""
+def multicall(context, topic, msg, timeout=None):
+    """Make a call that returns multiple times.
+
+    Response timeouts are only supported by impl_kombu; timeout is ignored.
+    """
     LOG.debug(_('Making asynchronous call on %s ...'), topic)
     msg_id = uuid.uuid4().hex
     msg.update({'_msg_id': msg_id})
@@ -580,9 +583,9 @@ def create_connection(new=True):
     return Connection.instance(new=new)
 
 
-def call(context, topic, msg):
+def call(context, topic, msg, timeout=None):
     """Sends a message on a topic and wait for a response."""
-    rv = multicall(context, topic, msg)
+    rv = multicall(context, topic, msg, timeout=timeout)
     # NOTE(vish): return the last result from the multicall
     rv = list(rv)
     if not rv:
@@ -28,12 +28,14 @@ import uuid
 import eventlet
 from eventlet import greenpool
 from eventlet import pools
+from eventlet import queue
+from eventlet import semaphore
 import greenlet
 
 from nova import context
 from nova import exception
 from nova import flags
-from nova.rpc.common import RemoteError, LOG
+from nova.rpc.common import RemoteError, Timeout, LOG
 
 # Needed for tests
 eventlet.monkey_patch()
@@ -643,6 +645,7 @@ def _unpack_context(msg):
             value = msg.pop(key)
             context_dict[key[9:]] = value
     context_dict['msg_id'] = msg.pop('_msg_id', None)
+    context_dict['reply_q'] = msg.pop('_reply_q', None)
     LOG.debug(_('unpacked context: %s'), context_dict)
     return RpcContext.from_dict(context_dict)
 
@@ -666,19 +669,21 @@ class RpcContext(context.RequestContext):
     def __init__(self, *args, **kwargs):
         msg_id = kwargs.pop('msg_id', None)
         self.msg_id = msg_id
+        self.reply_q = kwargs.pop('reply_q', None)
         super(RpcContext, self).__init__(*args, **kwargs)
 
     def reply(self, *args, **kwargs):
         if self.msg_id:
-            msg_reply(self.msg_id, *args, **kwargs)
+            msg_reply(self.msg_id, *args, reply_q=self.reply_q, **kwargs)
 
 
 class MulticallWaiter(object):
-    def __init__(self, connection):
+    def __init__(self, connection, timeout=None):
         self._connection = connection
         self._iterator = connection.iterconsume()
         self._result = None
         self._done = False
+        self._timeout = timeout
 
     def done(self):
         self._done = True
@@ -697,8 +702,14 @@ class MulticallWaiter(object):
         """Return a result until we get a 'None' response from consumer"""
         if self._done:
             raise StopIteration
+        deadline = _deadline(self._timeout)
         while True:
-            self._iterator.next()
+            try:
+                with eventlet.Timeout(_remaining(deadline)):
+                    self._iterator.next()
+            except eventlet.Timeout:
+                self.done()
+                raise Timeout(_('Timed out waiting for a response'))
             result = self._result
             if isinstance(result, Exception):
                 self.done()
@@ -709,34 +720,144 @@ class MulticallWaiter(object):
             yield result
 
 
+class ReplyProxy(object):
+    """Receives the responses to every call made by this process.
+
+    A single reply queue is declared when the first call is made; callers
+    register the msg_id they sent and the responses, which carry the
+    msg_id back, are handed to them as they arrive.
+
+    """
+
+    def __init__(self):
+        self.reply_q = 'reply_%s' % uuid.uuid4().hex
+        self._waiters = {}
+        self.connection = Connection()
+        self.connection.declare_direct_consumer(self.reply_q,
+                                                self._process_reply)
+        self.connection.consume_in_thread()
+
+    def _process_reply(self, data):
+        msg_id = data.pop('_msg_id', None)
+        waiter = self._waiters.get(msg_id)
+        if waiter is None:
+            LOG.warn(_('No call waiting for response to msg_id %s, it '
+                       'may have timed out'), msg_id)
+            return
+        waiter.put(data)
+
+    def register(self, msg_id):
+        waiter = queue.LightQueue()
+        self._waiters[msg_id] = waiter
+        return waiter
+
+    def unregister(self, msg_id):
+        self._waiters.pop(msg_id, None)
+
+
+class ReplyProxyWaiter(object):
+    """Iterates over the responses the ReplyProxy receives for one call."""
+
+    def __init__(self, reply_proxy, msg_id, timeout=None):
+        self._reply_proxy = reply_proxy
+        self._msg_id = msg_id
+        self._queue = reply_proxy.register(msg_id)
+        self._timeout = timeout
+        self._done = False
+
+    def done(self):
+        self._done = True
+        self._reply_proxy.unregister(self._msg_id)
+
+    def __iter__(self):
+        """Return a result until we get a 'None' response from consumer"""
+        if self._done:
+            raise StopIteration
+        deadline = _deadline(self._timeout)
+        while True:
+            try:
+                data = self._queue.get(timeout=_remaining(deadline))
+            except queue.Empty:
+                self.done()
+                raise Timeout(_('Timed out waiting for a response'))
+            if data['failure']:
+                self.done()
+                raise RemoteError(*data['failure'])
+            result = data['result']
+            if result == None:
+                self.done()
+                raise StopIteration
+            yield result
+
+
+_reply_proxy = None
+_reply_proxy_lock = semaphore.Semaphore()
+
+
+def _get_reply_proxy():
+    global _reply_proxy
+    with _reply_proxy_lock:
+        if _reply_proxy is None:
+            _reply_proxy = ReplyProxy()
+    return _reply_proxy
+
+
+def _deadline(timeout):
+    if timeout is None:
+        timeout = FLAGS.rpc_response_timeout
+    if not timeout:
+        return None
+    return time.time() + timeout
+
+
+def _remaining(deadline):
+    """Seconds left before deadline, or None to wait forever."""
+    if deadline is None:
+        return None
+    return max(deadline - time.time(), 0)
+
+
 def create_connection(new=True):
     """Create a connection"""
     return ConnectionContext(pooled=not new)
 
 
-def multicall(context, topic, msg):
-    """Make a call that returns multiple times."""
-    # Can't use 'with' for multicall, as it returns an iterator
-    # that will continue to use the connection.  When it's done,
-    # connection.close() will get called which will put it back into
-    # the pool
+def multicall(context, topic, msg, timeout=None):
+    """Make a call that returns multiple times.
+
+    If timeout (or the rpc_response_timeout flag) is set, Timeout is raised
+    when the responses have not all arrived within that many seconds.
+    """
     LOG.debug(_('Making asynchronous call on %s ...'), topic)
     msg_id = uuid.uuid4().hex
     msg.update({'_msg_id': msg_id})
     LOG.debug(_('MSG_ID is %s') % (msg_id))
     _pack_context(msg, context)
 
+    if FLAGS.rpc_single_reply_queue:
+        reply_proxy = _get_reply_proxy()
+        msg['_reply_q'] = reply_proxy.reply_q
+        # Register before sending so a fast response can't be missed.
+        wait_msg = ReplyProxyWaiter(reply_proxy, msg_id, timeout)
+        with ConnectionContext() as conn:
+            conn.topic_send(topic, msg)
+        return wait_msg
+
+    # Can't use 'with' for multicall, as it returns an iterator
+    # that will continue to use the connection.  When it's done,
+    # connection.close() will get called which will put it back into
+    # the pool
     conn = ConnectionContext()
-    wait_msg = MulticallWaiter(conn)
+    wait_msg = MulticallWaiter(conn, timeout)
     conn.declare_direct_consumer(msg_id, wait_msg)
     conn.topic_send(topic, msg)
 
     return wait_msg
 
 
-def call(context, topic, msg):
+def call(context, topic, msg, timeout=None):
     """Sends a message on a topic and wait for a response."""
-    rv = multicall(context, topic, msg)
+    rv = multicall(context, topic, msg, timeout=timeout)
     # NOTE(vish): return the last result from the multicall
     rv = list(rv)
     if not rv:
@@ -760,10 +881,11 @@ def fanout_cast(context, topic, msg):
         conn.fanout_send(topic, msg)
 
 
-def msg_reply(msg_id, reply=None, failure=None):
+def msg_reply(msg_id, reply=None, failure=None, reply_q=None):
     """Sends a reply or an error on the channel signified by msg_id.
 
-    Failure should be a sys.exc_info() tuple.
+    Failure should be a sys.exc_info() tuple. If the caller named a shared
+    reply_q the reply goes there, tagged with msg_id.
 
     """
     with ConnectionContext() as conn:
@@ -780,4 +902,8 @@ def msg_reply(msg_id, reply=None, failure=None):
             msg = {'result': dict((k, repr(v))
                             for k, v in reply.__dict__.iteritems()),
                     'failure': failure}
-        conn.direct_send(msg_id, msg)
+        if reply_q:
+            msg['_msg_id'] = msg_id
+            conn.direct_send(reply_q, msg)
+        else:
+            conn.direct_send(msg_id, msg)
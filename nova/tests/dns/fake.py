@@ -30,6 +30,7 @@ class FakeDnsDriver(object):
     def __init__(self, default_dns_zone=None):
         self.default_zone = default_dns_zone or DnsZone()
         self.zones = FakeZoneHolder()
+        self.batch_count = 0
 
     def create_entry(self, entry):
         #name, content, type, dns_zone, priority=None
@@ -38,6 +39,16 @@ class FakeDnsDriver(object):
         print("Creating entry for " + str(entry))
         self.zones.add_entry(entry)
 
+    def create_entries(self, entries):
+        self.batch_count += 1
+        for entry in entries:
+            self.create_entry(entry)
+
+    def delete_entries(self, entries):
+        self.batch_count += 1
+        for entry in entries:
+            self.delete_entry(entry.name, entry.type, entry.dns_zone)
+
     def delete_entry(self, name, type, dns_zone=None):
         dns_zone = dns_zone or self.default_zone
         if not self.zones.contains_entry(dns_zone=dns_zone, name=name):
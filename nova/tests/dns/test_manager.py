@@ -23,12 +23,18 @@ Unit tests for the Dns Manager.
 import unittest
 
 from nova import context
+from nova import flags
+from reddwarf import exception
+from reddwarf.dns import manager as dns_manager
 from reddwarf.dns.driver import DnsEntry
 from reddwarf.dns.driver import DnsEntryNotFound
 from reddwarf.dns.manager import DnsManager
 from nova.tests.dns.fake import FakeDnsDriver
 
 
+FLAGS = flags.FLAGS
+
+
 class FakeEntryFactory(object):
 
     def __init__(self):
@@ -118,3 +124,279 @@ class TestWhenEntryCreatorReturnsNoneForInstance(BaseCase):
         self.assertRaises(DnsEntryNotFound, self.manager.delete_instance_entry,
                           context.get_admin_context(), self.instance,
                           self.content)
+
+
+class TestWhenBatchingEntries(BaseCase):
+
+    def setUp(self):
+        super(TestWhenBatchingEntries, self).setUp()
+        self.manager.batch_window = 60
+        self.content = "255.1.1.1"
+        for name in ("instance-1", "instance-2"):
+            self.manager.create_instance_entry(context.get_admin_context(),
+                                               {'name': name}, self.content)
+
+    def tearDown(self):
+        self.manager.flush_pending_entries()
+
+    def entries(self):
+        return list(self.driver.get_entries_by_content(self.content))
+
+    def test_entries_wait_for_the_batch(self):
+        self.assertEqual(0, len(self.entries()))
+
+    def test_flush_creates_entries_in_one_batch(self):
+        self.manager.flush_pending_entries()
+        self.assertEqual(2, len(self.entries()))
+        self.assertEqual(1, self.driver.batch_count)
+
+    def test_flush_deletes_entries_in_one_batch(self):
+        self.manager.flush_pending_entries()
+        for name in ("instance-1", "instance-2"):
+            self.manager.delete_instance_entry(context.get_admin_context(),
+                                               {'name': name}, self.content)
+        self.assertEqual(2, len(self.entries()))
+        self.manager.flush_pending_entries()
+        self.assertEqual(0, len(self.entries()))
+        self.assertEqual(2, self.driver.batch_count)
+
+    def test_batch_is_sent_when_full(self):
+        self.manager.batch_max_size = 3
+        self.manager.create_instance_entry(context.get_admin_context(),
+                                           {'name': "instance-3"},
+                                           self.content)
+        self.assertEqual(3, len(self.entries()))
+
+    def test_delete_then_recreate_keeps_the_new_entry(self):
+        self.manager.flush_pending_entries()
+        self.manager.delete_instance_entry(context.get_admin_context(),
+                                           {'name': "instance-1"},
+                                           self.content)
+        self.manager.create_instance_entry(context.get_admin_context(),
+                                           {'name': "instance-1"},
+                                           "255.1.1.2")
+        self.manager.flush_pending_entries()
+        entries = list(self.driver.get_entries_by_name("instance-1"))
+        self.assertEqual(1, len(entries))
+        self.assertEqual("255.1.1.2", entries[0].content)
+
+    def test_partial_batch_only_retries_entries_not_created(self):
+        self.driver = PartialBatchDriver()
+        self.manager.driver = self.driver
+        self.manager.create_instance_entry(context.get_admin_context(),
+                                           {'name': "broken"}, self.content)
+        self.manager.flush_pending_entries()
+        self.assertEqual(["broken"], self.driver.single_creates)
+        self.assertEqual(["instance-1", "instance-2"],
+                         sorted(entry.name for entry in self.entries()))
+
+
+class ReconcilingDriver(FakeDnsDriver):
+
+    def __init__(self):
+        super(ReconcilingDriver, self).__init__()
+        self.reconciles = 0
+
+    def reconcile(self):
+        self.reconciles += 1
+
+
+class TestReconcile(BaseCase):
+
+    def setUp(self):
+        super(TestReconcile, self).setUp()
+        self.driver = ReconcilingDriver()
+        self.manager.driver = self.driver
+        self.manager.process_queued_work = lambda context: None
+        self.interval = FLAGS.dns_reconcile_interval
+        FLAGS.dns_reconcile_interval = 3600
+
+    def tearDown(self):
+        FLAGS.dns_reconcile_interval = self.interval
+
+    def test_reconciles_on_first_tick(self):
+        self.manager.periodic_tasks(context.get_admin_context())
+        self.assertEqual(1, self.driver.reconciles)
+
+    def test_waits_for_interval(self):
+        self.manager.periodic_tasks(context.get_admin_context())
+        self.manager.periodic_tasks(context.get_admin_context())
+        self.assertEqual(1, self.driver.reconciles)
+        self.manager.last_reconcile -= 3600
+        self.manager.periodic_tasks(context.get_admin_context())
+        self.assertEqual(2, self.driver.reconciles)
+
+    def test_disabled(self):
+        FLAGS.dns_reconcile_interval = 0
+        self.manager.periodic_tasks(context.get_admin_context())
+        self.assertEqual(0, self.driver.reconciles)
+
+    def test_driver_without_mirror(self):
+        self.manager.driver = FakeDnsDriver()
+        self.manager.periodic_tasks(context.get_admin_context())
+
+
+class FakeWorkItem(object):
+
+    def __init__(self, id, action, instance_name, content):
+        self.id = id
+        self.action = action
+        self.instance_id = instance_name
+        self.content = content
+        self.idempotency_key = "%s:%s:%s" % (action, instance_name, content)
+
+
+class FakeWorkQueue(object):
+    """Stands in for the DNS work queue functions of reddwarf.db.api."""
+
+    def __init__(self, items, retry_result=True):
+        self.items = items
+        self.retry_result = retry_result
+        self.completed = []
+        self.retried = []
+
+    def dns_work_claim(self, limit, claim_timeout):
+        claimed, self.items = self.items[:limit], self.items[limit:]
+        return claimed
+
+    def dns_work_complete(self, id):
+        self.completed.append(id)
+
+    def dns_work_retry(self, id, error, retry_interval, max_attempts):
+        self.retried.append(id)
+        return self.retry_result
+
+    def instance_get_for_dns(self, id):
+        if id == 'missing':
+            raise RuntimeError("no instance %s" % id)
+        return {'name': id}
+
+
+class FailingBatchDriver(FakeDnsDriver):
+    """Rejects batches and any entry named broken."""
+
+    def create_entries(self, entries):
+        self.batch_count += 1
+        raise RuntimeError("batch failed")
+
+    def create_entry(self, entry):
+        if entry.name == 'broken':
+            raise RuntimeError("bad entry")
+        if self.zones.contains_entry(self.default_zone, entry.name):
+            raise exception.DuplicateRecordEntry(name=entry.name, id=1)
+        super(FailingBatchDriver, self).create_entry(entry)
+
+
+class PartialBatchDriver(FakeDnsDriver):
+    """Creates every entry of a batch but those named broken."""
+
+    def __init__(self):
+        super(PartialBatchDriver, self).__init__()
+        self.single_creates = []
+
+    def create_entries(self, entries):
+        self.batch_count += 1
+        missing = []
+        for entry in entries:
+            if entry.name == 'broken':
+                missing.append(entry.name)
+            else:
+                super(PartialBatchDriver, self).create_entry(entry)
+        if missing:
+            raise exception.DnsRecordsNotCreated(missing)
+
+    def create_entry(self, entry):
+        self.single_creates.append(entry.name)
+        if entry.name == 'broken':
+            raise RuntimeError("bad entry")
+        super(PartialBatchDriver, self).create_entry(entry)
+
+
+class TestProcessQueuedWork(BaseCase):
+
+    def setUp(self):
+        super(TestProcessQueuedWork, self).setUp()
+        self.dbapi = dns_manager.dbapi
+
+    def tearDown(self):
+        dns_manager.dbapi = self.dbapi
+
+    def process(self, items, retry_result=True):
+        queue = FakeWorkQueue(items, retry_result)
+        dns_manager.dbapi = queue
+        self.manager.process_queued_work(context.get_admin_context())
+        return queue
+
+    def test_applies_creates_and_deletes_in_batches(self):
+        self.driver.create_entry(DnsEntry(name='old', content='10.0.0.9',
+                                          type='CNAME'))
+        queue = self.process([FakeWorkItem(1, 'create', 'a', '10.0.0.1'),
+                              FakeWorkItem(2, 'create', 'b', '10.0.0.2'),
+                              FakeWorkItem(3, 'delete', 'old', '10.0.0.9')])
+        self.assertEqual(2, self.driver.batch_count)
+        self.assertEqual([1, 2, 3], sorted(queue.completed))
+        self.assertEqual([], queue.retried)
+        self.assertEqual(['a'], [entry.name for entry in
+                                 self.driver.get_entries_by_content(
+                                     '10.0.0.1')])
+        self.assertEqual([], list(self.driver.get_entries_by_name('old')))
+
+    def test_applies_items_in_queue_order(self):
+        self.driver.create_entry(DnsEntry(name='a', content='10.0.0.9',
+                                          type='CNAME'))
+        queue = self.process([FakeWorkItem(1, 'delete', 'a', '10.0.0.9'),
+                              FakeWorkItem(2, 'create', 'a', '10.0.0.1'),
+                              FakeWorkItem(3, 'create', 'b', '10.0.0.2')])
+        # The delete runs before the create queued after it, and the two
+        # consecutive creates share a batch.
+        self.assertEqual(2, self.driver.batch_count)
+        self.assertEqual([1, 2, 3], sorted(queue.completed))
+        self.assertEqual(['10.0.0.1'], [entry.content for entry in
+                                        self.driver.get_entries_by_name('a')])
+
+    def test_nothing_queued(self):
+        queue = self.process([])
+        self.assertEqual(0, self.driver.batch_count)
+        self.assertEqual([], queue.completed)
+
+    def test_no_entry_for_instance_counts_as_done(self):
+        self.entry_factory.make_entry = False
+        queue = self.process([FakeWorkItem(1, 'create', 'a', '10.0.0.1')])
+        self.assertEqual([1], queue.completed)
+        self.assertEqual(0, self.driver.batch_count)
+
+    def test_missing_instance_is_retried(self):
+        queue = self.process([FakeWorkItem(1, 'create', 'missing',
+                                           '10.0.0.1')])
+        self.assertEqual([1], queue.retried)
+        self.assertEqual([], queue.completed)
+
+    def test_failed_batch_falls_back_to_single_entries(self):
+        self.driver = FailingBatchDriver()
+        self.manager.driver = self.driver
+        self.driver.create_entry(DnsEntry(name='exists', content='10.0.0.3',
+                                          type='CNAME'))
+        queue = self.process([FakeWorkItem(1, 'create', 'a', '10.0.0.1'),
+                              FakeWorkItem(2, 'create', 'broken',
+                                           '10.0.0.2'),
+                              FakeWorkItem(3, 'create', 'exists',
+                                           '10.0.0.3')])
+        # The duplicate was already applied, the broken entry is retried.
+        self.assertEqual([1, 3], sorted(queue.completed))
+        self.assertEqual([2], queue.retried)
+
+    def test_partial_batch_completes_created_entries(self):
+        self.driver = PartialBatchDriver()
+        self.manager.driver = self.driver
+        queue = self.process([FakeWorkItem(1, 'create', 'a', '10.0.0.1'),
+                              FakeWorkItem(2, 'create', 'broken',
+                                           '10.0.0.2')])
+        self.assertEqual([1], queue.completed)
+        self.assertEqual([2], queue.retried)
+        self.assertEqual(['broken'], self.driver.single_creates)
+
+    def test_gives_up_when_retries_run_out(self):
+        queue = self.process([FakeWorkItem(1, 'create', 'missing',
+                                           '10.0.0.1')], retry_result=False)
+        self.assertEqual([1], queue.retried)
+        self.assertEqual([], queue.completed)
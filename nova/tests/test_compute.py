@@ -965,6 +965,76 @@ class ComputeTestCase(test.TestCase):
         self.assertEqual(len(instances), 1)
         self.assertEqual(power_state.NOSTATE, instances[0]['power_state'])
 
+    def test_sync_power_states_only_writes_changes(self):
+        """The incremental sync writes nothing while states match"""
+        self.flags(power_state_sync_max_interval=600)
+        instance_id = self._create_instance()
+        self.compute.run_instance(self.context, instance_id)
+        admin_context = context.get_admin_context()
+
+        updates = []
+        real_update_many = db.instance_power_state_update_many
+
+        def fake_update_many(context, power_states):
+            updates.append(power_states)
+            return real_update_many(context, power_states)
+
+        self.stubs.Set(self.compute.db, 'instance_power_state_update_many',
+                       fake_update_many)
+
+        self.compute._sync_power_states(admin_context)
+        self.assertEqual(updates, [])
+        self.assertEqual(self.compute.power_sync_stats['ticks'], 1)
+        first_interval = self.compute._power_sync_interval
+
+        self.compute._next_power_sync = 0
+        self.compute._sync_power_states(admin_context)
+        self.assertEqual(updates, [])
+        self.assertTrue(self.compute._power_sync_interval > first_interval)
+
+        instance_name = db.instance_get(admin_context, instance_id).name
+        self.compute.driver.test_remove_vm(instance_name)
+        self.compute._next_power_sync = 0
+        self.compute._sync_power_states(admin_context)
+        self.assertEqual(updates, [{instance_id: power_state.NOSTATE}])
+        self.assertEqual(self.compute._power_sync_interval,
+                         FLAGS.power_state_sync_min_interval)
+        instance = db.instance_get(admin_context, instance_id)
+        self.assertEqual(instance['power_state'], power_state.NOSTATE)
+        db.instance_destroy(admin_context, instance_id)
+
+    def test_sync_power_states_sees_driver_writes(self):
+        """Power states the driver writes itself are corrected"""
+        instance_id = self._create_instance()
+        self.compute.run_instance(self.context, instance_id)
+        admin_context = context.get_admin_context()
+        self.compute._sync_power_states(admin_context)
+
+        # Drivers such as OpenVZ write the power state directly.
+        db.instance_update(admin_context, instance_id,
+                           {'power_state': power_state.SHUTDOWN})
+        self.compute._sync_power_states(admin_context)
+        instance = db.instance_get(admin_context, instance_id)
+        self.assertEqual(instance['power_state'], power_state.RUNNING)
+        self.assertEqual(self.compute._power_sync_interval,
+                         FLAGS.power_state_sync_min_interval)
+        db.instance_destroy(admin_context, instance_id)
+
+    def test_sync_power_states_full(self):
+        """The full sync updates instances one at a time"""
+        self.flags(power_state_sync_incremental=False)
+        instance_id = self._create_instance()
+        self.compute.run_instance(self.context, instance_id)
+        admin_context = context.get_admin_context()
+        instance_name = db.instance_get(admin_context, instance_id).name
+        self.compute.driver.test_remove_vm(instance_name)
+
+        self.compute._sync_power_states(admin_context)
+        instance = db.instance_get(admin_context, instance_id)
+        self.assertEqual(instance['power_state'], power_state.NOSTATE)
+        self.assertEqual(self.compute.power_sync_stats['ticks'], 0)
+        db.instance_destroy(admin_context, instance_id)
+
     def test_get_all_by_name_regexp(self):
         """Test searching instances by name (display_name)"""
         c = context.get_admin_context()
@@ -18,6 +18,8 @@
 
 """Unit tests for the DB API"""
 
+import datetime
+
 from nova import test
 from nova import context
 from nova import db
@@ -96,6 +98,37 @@ class DbApiTestCase(test.TestCase):
         self.assertEqual(result[1].id, inst1.id)
         self.assertTrue(result[1].deleted)
 
+    def test_instance_get_active_by_window_page(self):
+        ctxt = context.get_admin_context()
+        begin = datetime.datetime(2011, 6, 1)
+        end = datetime.datetime(2011, 7, 1)
+        before = begin - datetime.timedelta(days=1)
+
+        def create(**values):
+            values.update(instance_type_id=FLAGS.default_instance_type,
+                          project_id=self.project_id)
+            return db.instance_create(self.context, values)['id']
+
+        running = [create(launched_at=before) for i in range(3)]
+        create(launched_at=begin + datetime.timedelta(days=1))
+        create(launched_at=before,
+               terminated_at=end - datetime.timedelta(days=1))
+        ended = create(launched_at=before,
+                       terminated_at=end + datetime.timedelta(days=1))
+
+        def page(after_id):
+            return [instance['id'] for instance in
+                    db.instance_get_active_by_window_page(ctxt, begin, end,
+                                                          after_id=after_id,
+                                                          limit=2)]
+
+        self.assertEqual(running[:2], page(0))
+        self.assertEqual([running[2], ended], page(running[1]))
+        self.assertEqual([], page(ended))
+        active = db.instance_get_active_by_window_page(ctxt, begin)
+        self.assertEqual(running, [instance['id'] for instance in active])
+        self.assertNotEqual(None, active[0]['instance_type'])
+
     def test_network_create_safe(self):
         ctxt = context.get_admin_context()
         values = {'host': 'localhost', 'project_id': 'project1'}
@@ -0,0 +1,66 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Unit tests for the SQLAlchemy session handling"""
+
+from nova import exception
+from nova import test
+from nova.db.sqlalchemy import models
+from nova.db.sqlalchemy import session
+
+
+class SessionTestCase(test.TestCase):
+
+    def setUp(self):
+        super(SessionTestCase, self).setUp()
+        session.POOL_METRICS.reset()
+
+    def test_query_errors_are_wrapped(self):
+        s = session.get_session()
+        self.assertRaises(exception.DBError, s.query, object())
+
+    def test_reader_session_is_reused(self):
+        self.assertTrue(session.get_reader_session() is
+                        session.get_reader_session())
+
+    def test_reader_session_starts_empty(self):
+        reader = session.get_reader_session()
+        reader.query(models.Service).all()
+        reader.add(models.Service(host='fake'))
+        self.assertEqual(0, len(session.get_reader_session().new))
+
+    def test_slow_queries_are_counted(self):
+        self.flags(sql_slow_query_time=0.000001)
+        session.get_session().query(models.Service).all()
+        metrics = session.POOL_METRICS.summary()
+        self.assertTrue(metrics['queries'] >= 1)
+        self.assertEqual(metrics['queries'], metrics['slow_queries'])
+
+    def test_replica_falls_back_to_primary(self):
+        self.flags(sql_read_connection=None)
+        self.assertTrue(session.get_replica_session() is
+                        session.get_reader_session())
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        self.flags(sql_read_connection='sqlite://',
+                   sql_read_lag_check_interval=0)
+        self.stubs.Set(session, 'replica_lag', lambda engine: 60)
+        self.assertTrue(session.get_replica_session() is
+                        session.get_reader_session())
+        self.stubs.Set(session, 'replica_lag', lambda engine: 0)
+        self.assertFalse(session.get_replica_session() is
+                         session.get_reader_session())
@@ -19,6 +19,8 @@
 
 import os
 
+from eventlet import greenthread
+
 from nova import test
 from nova.network import linux_net
 
@@ -78,6 +80,45 @@ class IptablesManagerTestCase(test.TestCase):
         super(IptablesManagerTestCase, self).setUp()
         self.manager = linux_net.IptablesManager()
 
+    def _count_applies(self, error=None):
+        applies = []
+
+        def fake_apply():
+            applies.append(1)
+            if error:
+                raise error
+
+        self.stubs.Set(self.manager, 'apply', fake_apply)
+        return applies
+
+    def test_apply_coalesced_shares_one_apply(self):
+        self.flags(iptables_apply_delay=0.01)
+        applies = self._count_applies()
+        threads = [greenthread.spawn(self.manager.apply_coalesced)
+                   for _i in range(5)]
+        for thread in threads:
+            thread.wait()
+        self.assertEqual(len(applies), 1)
+        self.assertEqual(self.manager.apply_stats['requests'], 5)
+
+        self.manager.apply_coalesced()
+        self.assertEqual(len(applies), 2)
+
+    def test_apply_coalesced_raises_for_every_caller(self):
+        self.flags(iptables_apply_delay=0.01)
+        self._count_applies(error=RuntimeError('restore failed'))
+        threads = [greenthread.spawn(self.manager.apply_coalesced)
+                   for _i in range(2)]
+        for thread in threads:
+            self.assertRaises(RuntimeError, thread.wait)
+
+    def test_apply_coalesced_without_delay(self):
+        self.flags(iptables_apply_delay=0)
+        applies = self._count_applies()
+        self.manager.apply_coalesced()
+        self.manager.apply_coalesced()
+        self.assertEqual(len(applies), 2)
+
     def test_filter_rules_are_wrapped(self):
         current_lines = self.sample_filter
 
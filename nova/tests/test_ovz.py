@@ -16,6 +16,9 @@
 #    under the License.
 
 import mox
+import os
+import shutil
+import tempfile
 import __builtin__
 from nova import exception
 from nova import flags
@@ -54,6 +57,16 @@ VZNAMES = """\tinstance-00001001\n\t%s
               \tinstance-00001003\n\tinstance-00001004\n""" % (
     INSTANCE['name'],)
 
+VZSTATUSES = """\tinstance-00001001 running\n\t%s stopped\n\t- mounted\n""" % (
+    INSTANCE['name'],)
+
+VZCTSTATUSES = """\t1001 running\n\t%d stopped\n""" % (INSTANCE['id'],)
+
+VZHOSTLIST = """\t1001 running %(pages)d 1000 %(disk)d 1024
+\t%(id)d running %(pages)d 1000 %(disk)d 2048
+\t1003 stopped 9223372036854775807 - - 0
+""" % {'id': INSTANCE['id'], 'pages': 131072, 'disk': 25 * 1024 * 1024}
+
 GOODSTATUS = {
     'state': power_state.RUNNING,
     'max_mem': 0,
@@ -127,15 +140,6 @@ UTILITY = {
     'CPULIMIT': 2400
 }
 
-CPUCHECKCONT = """VEID		CPUUNITS
--------------------------
-0		1000
-26		25000
-27		25000
-Current CPU utilization: 51000
-Power of the node: 758432
-"""
-
 CPUCHECKNOCONT = """Current CPU utilization: 51000
 Power of the node: 758432
 """
@@ -275,14 +279,29 @@ NETTEMPLATE = """
     #end for
     """
 
-MEMORY = 536870912
-
 MEMORYMB = 512
 
 MEM_PAGES = 131072
 
 VCPUS = 2
 
+SIZE_SPEC = [('vmguarpages', 1024), ('privvmpages', 1024),
+             ('cpuunits', 500), ('diskspace', '40G:44G')]
+
+VZ_SAVED_CONFIG = {
+    'VMGUARPAGES': '1024:1024',
+    'PRIVVMPAGES': '512:512',
+    'CPUUNITS': '500',
+    'DISKSPACE': '10485760:11534336'
+}
+
+VZ_CURRENT_CONFIG = {
+    'VMGUARPAGES': '1024:1024',
+    'PRIVVMPAGES': '1024:1024',
+    'CPUUNITS': '500',
+    'DISKSPACE': '41943040:46137344'
+}
+
 class OpenVzConnTestCase(test.TestCase):
     def setUp(self):
         super(OpenVzConnTestCase, self).setUp()
@@ -324,6 +343,198 @@ class OpenVzConnTestCase(test.TestCase):
 
         self.assertRaises(exception.Error, conn.list_instances_detail)
 
+    def test_get_power_states_success(self):
+        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
+        openvz_conn.utils.execute('vzlist', '--all', '-o', 'name,status',
+                                  '-H', run_as_root=True)\
+                                  .AndReturn((VZSTATUSES, None))
+        conn = openvz_conn.OpenVzConnection(False)
+        self.mox.ReplayAll()
+        self.assertEqual(conn.get_power_states(),
+                         {'instance-00001001': power_state.RUNNING,
+                          INSTANCE['name']: power_state.SHUTDOWN})
+
+    def test_get_power_states_failure(self):
+        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
+        openvz_conn.utils.execute('vzlist', '--all', '-o', 'name,status',
+                                  '-H', run_as_root=True)\
+                                  .AndRaise(exception.ProcessExecutionError)
+        conn = openvz_conn.OpenVzConnection(False)
+        self.mox.ReplayAll()
+        self.assertRaises(exception.Error, conn.get_power_states)
+
+    def test_container_watcher_wait_for_running(self):
+        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
+        openvz_conn.utils.execute('vzlist', '--all', '-H', '-o',
+                                  'ctid,status', run_as_root=True)\
+                                  .AndReturn((VZCTSTATUSES, None))
+        self.mox.ReplayAll()
+        watcher = openvz_conn.ContainerWatcher()
+        seen = []
+        state = watcher.wait_for(1001, ('running',), on_change=seen.append,
+                                 timeout=1)
+        self.assertEqual(state, 'running')
+        self.assertEqual(seen, ['running'])
+        self.assertEqual(watcher.waiters, {})
+
+    def test_container_watcher_wait_for_gone(self):
+        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
+        openvz_conn.utils.execute('vzlist', '--all', '-H', '-o',
+                                  'ctid,status', run_as_root=True)\
+                                  .AndReturn((VZCTSTATUSES, None))
+        self.mox.ReplayAll()
+        watcher = openvz_conn.ContainerWatcher()
+        self.assertEqual(watcher.wait_for(1003, (None,), timeout=1), None)
+
+    def test_container_watcher_timeout_reports_changes_once(self):
+        self.flags(ovz_state_poll_interval=0.01)
+        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
+        openvz_conn.utils.execute('vzlist', '--all', '-H', '-o',
+                                  'ctid,status', run_as_root=True)\
+                                  .MultipleTimes()\
+                                  .AndReturn((VZCTSTATUSES, None))
+        self.mox.ReplayAll()
+        watcher = openvz_conn.ContainerWatcher()
+        seen = []
+        self.assertRaises(exception.Error, watcher.wait_for,
+                          INSTANCE['id'], ('running',),
+                          on_change=seen.append, timeout=0.1)
+        self.assertEqual(seen, ['stopped'])
+        self.assertEqual(watcher.waiters, {})
+
+    def test_clean_orphaned_files_one_rm(self):
+        self.mox.StubOutWithMock(openvz_conn.os, 'listdir')
+        openvz_conn.os.listdir(FLAGS.ovz_config_dir).AndReturn(
+            ['%s.conf.destroyed' % INSTANCE['id'],
+             '%s.mount.destroyed' % INSTANCE['id'], '1001.conf'])
+        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
+        openvz_conn.utils.execute('rm', '-f',
+            '%s/%s.conf.destroyed' % (FLAGS.ovz_config_dir, INSTANCE['id']),
+            '%s/%s.mount.destroyed' % (FLAGS.ovz_config_dir, INSTANCE['id']),
+            run_as_root=True).AndReturn(('', ''))
+        self.mox.ReplayAll()
+        conn = openvz_conn.OpenVzConnection(False)
+        conn._clean_orphaned_files(INSTANCE['id'])
+
+    def test_clean_orphaned_files_failure(self):
+        self.mox.StubOutWithMock(openvz_conn.os, 'listdir')
+        openvz_conn.os.listdir(FLAGS.ovz_config_dir).AndReturn(
+            ['%s.conf.destroyed' % INSTANCE['id']])
+        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
+        openvz_conn.utils.execute('rm', '-f', mox.IgnoreArg(),
+                                  run_as_root=True)\
+                                  .AndRaise(exception.ProcessExecutionError)
+        self.mox.ReplayAll()
+        conn = openvz_conn.OpenVzConnection(False)
+        self.assertRaises(exception.Error, conn._clean_orphaned_files,
+                          INSTANCE['id'])
+
+    def test_teardown_janitor_retries(self):
+        self.flags(ovz_janitor_retry_interval=0)
+        calls = []
+
+        def flaky_cleanup(instance_id):
+            calls.append(instance_id)
+            if len(calls) < 3:
+                raise exception.Error('busy')
+
+        janitor = openvz_conn.TeardownJanitor()
+        janitor.queue(flaky_cleanup, INSTANCE['id'])
+        while len(calls) < 3:
+            janitor.wait()
+            openvz_conn.greenthread.sleep(0)
+        self.assertEqual(calls, [INSTANCE['id']] * 3)
+        self.assertEqual(janitor.failed, 0)
+
+    def test_teardown_janitor_gives_up(self):
+        self.flags(ovz_janitor_retry_interval=0, ovz_janitor_max_attempts=2)
+        calls = []
+
+        def broken_cleanup(instance_id):
+            calls.append(instance_id)
+            raise exception.Error('broken')
+
+        janitor = openvz_conn.TeardownJanitor()
+        janitor.queue(broken_cleanup, INSTANCE['id'])
+        while janitor.failed == 0:
+            janitor.wait()
+            openvz_conn.greenthread.sleep(0)
+        self.assertEqual(len(calls), 2)
+
+    def test_teardown_janitor_inline(self):
+        self.flags(ovz_janitor_concurrency=0)
+        calls = []
+        janitor = openvz_conn.TeardownJanitor()
+        janitor.queue(calls.append, INSTANCE['id'])
+        self.assertEqual(calls, [INSTANCE['id']])
+        self.assertEqual(janitor.tasks, None)
+
+    def test_teardown_janitor_queue_does_not_block(self):
+        self.flags(ovz_janitor_concurrency=1)
+        release = openvz_conn.event.Event()
+        calls = []
+
+        def slow_cleanup(instance_id):
+            calls.append(instance_id)
+            release.wait()
+
+        janitor = openvz_conn.TeardownJanitor()
+        janitor.queue(slow_cleanup, 1)
+        openvz_conn.greenthread.sleep(0)
+        self.assertEqual(calls, [1])
+        # The only worker is busy, queueing more must still return at once.
+        janitor.queue(slow_cleanup, 2)
+        janitor.queue(slow_cleanup, 3)
+        self.assertEqual(calls, [1])
+        release.send()
+        janitor.wait()
+        self.assertEqual(calls, [1, 2, 3])
+
+    def _fake_host_state(self, conn):
+        conn.utility = UTILITY
+        host_state = conn.host_state
+        self.mox.StubOutWithMock(host_state, '_read_memory')
+        self.mox.StubOutWithMock(host_state, '_read_disk')
+        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
+        host_state._read_memory().AndReturn({
+            'host_memory_total': 4096 * 1024 * 1024,
+            'host_memory_free': 1024 * 1024 * 1024})
+        host_state._read_disk().AndReturn({
+            'disk_total': 100 * 1024 ** 3,
+            'disk_used': 20 * 1024 ** 3,
+            'disk_available': 80 * 1024 ** 3})
+        openvz_conn.utils.execute('vzlist', '--all', '-H', '-o',
+                                  openvz_conn.OVZHostState.VZLIST_FIELDS,
+                                  run_as_root=True)\
+                                  .AndReturn((VZHOSTLIST, None))
+        return host_state
+
+    def test_get_host_stats(self):
+        conn = openvz_conn.OpenVzConnection(False)
+        self._fake_host_state(conn)
+        self.mox.ReplayAll()
+        stats = conn.get_host_stats(refresh=True)
+        self.assertEqual(stats['containers'], 3)
+        self.assertEqual(stats['containers_running'], 2)
+        self.assertEqual(stats['host_memory_committed'],
+                         2 * MEM_PAGES * 4096)
+        self.assertEqual(stats['host_memory_uncommitted'],
+                         3072 * 1024 * 1024)
+        self.assertEqual(stats['host_memory_rss'], 3072 * 4096)
+        self.assertEqual(stats['cpuunits_committed'], 2000)
+        self.assertEqual(stats['cpuunits_available'],
+                         UTILITY['UNITS'] - 2000)
+        self.assertEqual(stats['disk_committed'], 50 * 1024 ** 3)
+        self.assertEqual(stats['disk_uncommitted'], 50 * 1024 ** 3)
+        self.assertEqual(stats['disk_available'], 80 * 1024 ** 3)
+
+    def test_get_host_stats_cached(self):
+        conn = openvz_conn.OpenVzConnection(False)
+        self._fake_host_state(conn)
+        self.mox.ReplayAll()
+        stats = conn.get_host_stats()
+        self.assertEqual(conn.get_host_stats(), stats)
+
     def test_start_success(self):
         # Testing happy path :-D
         # Mock the objects needed for this test to succeed.
@@ -546,191 +757,115 @@ class OpenVzConnTestCase(test.TestCase):
         openvz_conn.instance_types.get_instance_type(
             INSTANCE['instance_type_id']).AndReturn(FAKE_INST_TYPE)
         conn = openvz_conn.OpenVzConnection(False)
-        self.mox.StubOutWithMock(conn, '_calc_pages')
-        conn._calc_pages(FAKE_INST_TYPE['memory_mb']).AndReturn(MEM_PAGES)
-        self.mox.StubOutWithMock(conn, '_percent_of_resource')
-        conn._percent_of_resource(FAKE_INST_TYPE['memory_mb'])\
-            .AndReturn(RES_PERCENT)
-        self.mox.StubOutWithMock(conn, '_set_vmguarpages')
-        conn._set_vmguarpages(INSTANCE, MEM_PAGES)
-        self.mox.StubOutWithMock(conn, '_set_privvmpages')
-        conn._set_privvmpages(INSTANCE, MEM_PAGES)
-        self.mox.StubOutWithMock(conn, '_set_kmemsize')
-        conn._set_kmemsize(INSTANCE,
-            ((FAKE_INST_TYPE['memory_mb'] * 1024) * 1024))
-        self.mox.StubOutWithMock(conn, '_set_cpuunits')
-        conn._set_cpuunits(INSTANCE, RES_PERCENT)
-        self.mox.StubOutWithMock(conn, '_set_cpulimit')
-        conn._set_cpulimit(INSTANCE, RES_PERCENT)
-        self.mox.StubOutWithMock(conn, '_set_cpus')
-        conn._set_cpus(INSTANCE, FAKE_INST_TYPE['vcpus'])
-        self.mox.StubOutWithMock(conn, '_set_ioprio')
-        conn._set_ioprio(INSTANCE, RES_PERCENT)
-        self.mox.StubOutWithMock(conn, '_set_diskspace')
-        conn._set_diskspace(INSTANCE, FAKE_INST_TYPE)
+        self.mox.StubOutWithMock(conn, '_instance_size_spec')
+        conn._instance_size_spec(FAKE_INST_TYPE).AndReturn(SIZE_SPEC)
+        self.mox.StubOutWithMock(conn, '_apply_vz_settings')
+        conn._apply_vz_settings(INSTANCE, SIZE_SPEC, dry_run=False)\
+            .AndReturn(SIZE_SPEC)
         self.mox.ReplayAll()
-        conn._set_instance_size(INSTANCE)
+        self.assertEqual(conn._set_instance_size(INSTANCE), SIZE_SPEC)
 
     def test_set_instance_size_instance_type(self):
         self.mox.StubOutWithMock(openvz_conn.instance_types,
                                  'get_instance_type')
         openvz_conn.instance_types.get_instance_type(
-            INSTANCE['instance_type_id']).AndReturn(FAKE_INST_TYPE)
+            FAKE_INST_TYPE['id']).AndReturn(FAKE_INST_TYPE)
         conn = openvz_conn.OpenVzConnection(False)
-        self.mox.StubOutWithMock(conn, '_calc_pages')
-        conn._calc_pages(FAKE_INST_TYPE['memory_mb']).AndReturn(MEM_PAGES)
-        self.mox.StubOutWithMock(conn, '_percent_of_resource')
-        conn._percent_of_resource(FAKE_INST_TYPE['memory_mb'])\
-        .AndReturn(RES_PERCENT)
-        self.mox.StubOutWithMock(conn, '_set_vmguarpages')
-        conn._set_vmguarpages(INSTANCE, MEM_PAGES)
-        self.mox.StubOutWithMock(conn, '_set_privvmpages')
-        conn._set_privvmpages(INSTANCE, MEM_PAGES)
-        self.mox.StubOutWithMock(conn, '_set_kmemsize')
-        conn._set_kmemsize(INSTANCE,
-            ((FAKE_INST_TYPE['memory_mb'] * 1024) * 1024))
-        self.mox.StubOutWithMock(conn, '_set_cpuunits')
-        conn._set_cpuunits(INSTANCE, RES_PERCENT)
-        self.mox.StubOutWithMock(conn, '_set_cpulimit')
-        conn._set_cpulimit(INSTANCE, RES_PERCENT)
-        self.mox.StubOutWithMock(conn, '_set_cpus')
-        conn._set_cpus(INSTANCE, FAKE_INST_TYPE['vcpus'])
-        self.mox.StubOutWithMock(conn, '_set_ioprio')
-        conn._set_ioprio(INSTANCE, RES_PERCENT)
-        self.mox.StubOutWithMock(conn, '_set_diskspace')
-        conn._set_diskspace(INSTANCE, FAKE_INST_TYPE)
-        self.mox.ReplayAll()
-        conn._set_instance_size(INSTANCE, FAKE_INST_TYPE['id'])
-
-    def test_set_vmguarpages_success(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--vmguarpages', MEM_PAGES,
-                                  run_as_root=True).AndReturn(('', ''))
+        self.mox.StubOutWithMock(conn, '_instance_size_spec')
+        conn._instance_size_spec(FAKE_INST_TYPE).AndReturn(SIZE_SPEC)
+        self.mox.StubOutWithMock(conn, '_apply_vz_settings')
+        conn._apply_vz_settings(INSTANCE, SIZE_SPEC, dry_run=True)\
+            .AndReturn([])
         self.mox.ReplayAll()
-        conn = openvz_conn.OpenVzConnection(False)
-        conn._set_vmguarpages(INSTANCE, MEM_PAGES)
+        self.assertEqual(conn._set_instance_size(INSTANCE,
+                                                 FAKE_INST_TYPE['id'],
+                                                 dry_run=True), [])
 
-    def test_set_vmguarpages_failure(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--vmguarpages', MEM_PAGES,
-                                  run_as_root=True)\
-                                  .AndRaise(exception.ProcessExecutionError)
-        self.mox.ReplayAll()
+    def test_calc_privvmpages_default(self):
         conn = openvz_conn.OpenVzConnection(False)
-        self.assertRaises(exception.Error, conn._set_vmguarpages,
-                          INSTANCE, MEM_PAGES)
+        self.assertEqual(conn._calc_privvmpages(FAKE_INST_TYPE, MEM_PAGES),
+                         MEM_PAGES)
 
-    def test_set_privvmpages_success(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--privvmpages', MEM_PAGES,
-                                  run_as_root=True).AndReturn(('', ''))
-        self.mox.ReplayAll()
+    def test_calc_privvmpages_flavor_burst(self):
         conn = openvz_conn.OpenVzConnection(False)
-        conn._set_privvmpages(INSTANCE, MEM_PAGES)
+        instance_type = dict(FAKE_INST_TYPE,
+                             extra_specs={'ovz_memory_burst_percent': '150'})
+        self.assertEqual(conn._calc_privvmpages(instance_type, MEM_PAGES),
+                         MEM_PAGES * 3 / 2)
 
-    def test_set_privvmpages_failure(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--privvmpages', MEM_PAGES,
-                                  run_as_root=True)\
-                                  .AndRaise(exception.ProcessExecutionError)
-        self.mox.ReplayAll()
+    def test_calc_privvmpages_never_below_guarantee(self):
+        self.flags(ovz_memory_burst_percent=50)
         conn = openvz_conn.OpenVzConnection(False)
-        self.assertRaises(exception.Error, conn._set_privvmpages,
-                          INSTANCE, MEM_PAGES)
+        self.assertEqual(conn._calc_privvmpages(FAKE_INST_TYPE, MEM_PAGES),
+                         MEM_PAGES)
 
-    def test_set_kmemsize_success(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--kmemsize', mox.IgnoreArg(),
-                                  run_as_root=True).AndReturn(('',''))
-        self.mox.ReplayAll()
+    def test_instance_size_spec(self):
         conn = openvz_conn.OpenVzConnection(False)
-        conn._set_kmemsize(INSTANCE, MEMORY)
-
-    def test_set_kmemsize_failure(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--kmemsize', mox.IgnoreArg(),
-                                  run_as_root=True)\
-                                  .AndRaise(exception.ProcessExecutionError)
+        self.mox.StubOutWithMock(conn, '_calc_pages')
+        conn._calc_pages(FAKE_INST_TYPE['memory_mb']).AndReturn(MEM_PAGES)
+        self.mox.StubOutWithMock(conn, '_percent_of_resource')
+        conn._percent_of_resource(FAKE_INST_TYPE['memory_mb'])\
+            .AndReturn(RES_PERCENT)
+        conn.utility = UTILITY
         self.mox.ReplayAll()
-        conn = openvz_conn.OpenVzConnection(False)
-        self.assertRaises(exception.Error, conn._set_kmemsize,
-                          INSTANCE, MEMORY)
-
-    def test_set_cpuunits_success(self):
+        spec = conn._instance_size_spec(FAKE_INST_TYPE)
+        self.assertEqual([option for option, _value in spec],
+                         ['vmguarpages', 'privvmpages', 'kmemsize',
+                          'cpuunits', 'cpulimit', 'cpus', 'ioprio',
+                          'diskspace'])
+        spec = dict(spec)
+        self.assertEqual(spec['cpuunits'], UTILITY['UNITS'] * RES_PERCENT)
+        self.assertEqual(spec['cpulimit'], UTILITY['CPULIMIT'] * RES_PERCENT)
+        self.assertEqual(spec['cpus'], VCPUS * 2)
+        self.assertEqual(spec['ioprio'], 3)
+        self.assertEqual(spec['diskspace'], '40G:44G')
+
+    def test_apply_vz_settings_one_call(self):
         self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
         openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--cpuunits', UTILITY['UNITS'] * RES_PERCENT,
+                                  '--privvmpages', 1024,
+                                  '--diskspace', '40G:44G',
                                   run_as_root=True).AndReturn(('', ''))
         conn = openvz_conn.OpenVzConnection(False)
-        self.mox.StubOutWithMock(conn, 'utility')
-        conn.utility = UTILITY
+        self.mox.StubOutWithMock(conn, '_get_vz_config')
+        conn._get_vz_config(INSTANCE).AndReturn(VZ_SAVED_CONFIG)
         self.mox.ReplayAll()
-        conn._set_cpuunits(INSTANCE, RES_PERCENT)
+        changes = conn._apply_vz_settings(INSTANCE, SIZE_SPEC)
+        self.assertEqual(changes, [('privvmpages', 1024),
+                                   ('diskspace', '40G:44G')])
 
-    def test_set_cpuunits_failure(self):
+    def test_apply_vz_settings_dry_run(self):
         self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--cpuunits',
-                                  UTILITY['UNITS'] * RES_PERCENT,
-                                  run_as_root=True) \
-                                 .AndRaise(exception.ProcessExecutionError)
         conn = openvz_conn.OpenVzConnection(False)
-        self.mox.StubOutWithMock(conn, 'utility')
-        conn.utility = UTILITY
+        self.mox.StubOutWithMock(conn, '_get_vz_config')
+        conn._get_vz_config(INSTANCE).AndReturn({})
         self.mox.ReplayAll()
-        self.assertRaises(exception.Error, conn._set_cpuunits,
-                          INSTANCE, RES_PERCENT)
+        changes = conn._apply_vz_settings(INSTANCE, SIZE_SPEC, dry_run=True)
+        self.assertEqual(changes, SIZE_SPEC)
 
-    def test_set_cpulimit_success(self):
+    def test_apply_vz_settings_nothing_changed(self):
         self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--cpulimit',
-                                  UTILITY['CPULIMIT'] * RES_PERCENT,
-                                  run_as_root=True).AndReturn(('', ''))
         conn = openvz_conn.OpenVzConnection(False)
-        self.mox.StubOutWithMock(conn, 'utility')
-        conn.utility = UTILITY
+        self.mox.StubOutWithMock(conn, '_get_vz_config')
+        conn._get_vz_config(INSTANCE).AndReturn(VZ_CURRENT_CONFIG)
         self.mox.ReplayAll()
-        conn._set_cpulimit(INSTANCE, RES_PERCENT)
+        self.assertEqual(conn._apply_vz_settings(INSTANCE, SIZE_SPEC), [])
 
-    def test_set_cpulimit_failure(self):
+    def test_apply_vz_settings_failure(self):
         self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
         openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--cpulimit',
-                                  UTILITY['CPULIMIT'] * RES_PERCENT,
+                                  mox.IgnoreArg(), mox.IgnoreArg(),
+                                  mox.IgnoreArg(), mox.IgnoreArg(),
+                                  mox.IgnoreArg(), mox.IgnoreArg(),
+                                  mox.IgnoreArg(), mox.IgnoreArg(),
                                   run_as_root=True)\
                                   .AndRaise(exception.ProcessExecutionError)
         conn = openvz_conn.OpenVzConnection(False)
-        self.mox.StubOutWithMock(conn, 'utility')
-        conn.utility = UTILITY
+        self.mox.StubOutWithMock(conn, '_get_vz_config')
+        conn._get_vz_config(INSTANCE).AndReturn({})
         self.mox.ReplayAll()
-        self.assertRaises(exception.Error, conn._set_cpulimit, INSTANCE,
-                          RES_PERCENT)
-
-    def test_set_cpus_success(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--cpus', mox.IgnoreArg(), run_as_root=True)\
-                                  .AndReturn(('', ''))
-        self.mox.ReplayAll()
-        conn = openvz_conn.OpenVzConnection(False)
-        conn._set_cpus(INSTANCE, VCPUS)
-
-    def test_set_cpus_failure(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--cpus', mox.IgnoreArg(), run_as_root=True)\
-                                  .AndRaise(exception.ProcessExecutionError)
-        self.mox.ReplayAll()
-        conn = openvz_conn.OpenVzConnection(False)
-        self.assertRaises(exception.Error, conn._set_cpus,
-                          INSTANCE, VCPUS)
+        self.assertRaises(exception.Error, conn._apply_vz_settings,
+                          INSTANCE, SIZE_SPEC)
 
     def test_calc_pages_success(self):
         # this test is a little sketchy because it is testing the default
@@ -759,22 +894,6 @@ class OpenVzConnTestCase(test.TestCase):
         conn = openvz_conn.OpenVzConnection(False)
         self.assertRaises(exception.Error, conn._get_cpuunits_capability)
 
-    def test_get_cpuunits_usage_success(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzcpucheck', '-v', run_as_root=True)\
-                                  .AndReturn((CPUCHECKCONT, ''))
-        self.mox.ReplayAll()
-        conn = openvz_conn.OpenVzConnection(False)
-        conn._get_cpuunits_usage()
-
-    def test_get_cpuunits_usage_failure(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzcpucheck', '-v', run_as_root=True)\
-                                  .AndRaise(exception.ProcessExecutionError)
-        self.mox.ReplayAll()
-        conn = openvz_conn.OpenVzConnection(False)
-        conn._get_cpuunits_usage()
-
     def test_percent_of_resource(self):
         conn = openvz_conn.OpenVzConnection(False)
         self.mox.StubOutWithMock(conn, 'utility')
@@ -800,70 +919,84 @@ class OpenVzConnTestCase(test.TestCase):
         conn = openvz_conn.OpenVzConnection(False)
         self.assertRaises(exception.Error, conn._get_memory)
 
-    def test_set_ioprio_success(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--ioprio', 3, run_as_root=True)\
-                                  .AndReturn(('', None))
-        conn = openvz_conn.OpenVzConnection(False)
-        self.mox.ReplayAll()
-        conn._set_ioprio(INSTANCE, RES_PERCENT)
-
-    def test_set_ioprio_failure(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--ioprio', 3, run_as_root=True)\
-                                  .AndRaise(exception.ProcessExecutionError)
-        conn = openvz_conn.OpenVzConnection(False)
-        self.mox.ReplayAll()
-        self.assertRaises(exception.Error, conn._set_ioprio, INSTANCE,
-                          RES_PERCENT)
-
-    def test_set_diskspace_success(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--diskspace', mox.IgnoreArg(),
-                                  run_as_root=True).AndReturn(('', None))
-        self.mox.ReplayAll()
-        conn = openvz_conn.OpenVzConnection(False)
-        conn._set_diskspace(INSTANCE, FAKE_INST_TYPE)
-
-    def test_set_diskspace_soft_manual_success(self):
-        self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--diskspace', '40G:44G', run_as_root=True)\
-                                  .AndReturn(('', None))
+    def test_attach_volumes_success(self):
+        mock_scripts = self.mox.CreateMock(openvz_conn.OVZMountScripts)
+        mock_scripts.mounts = ['mount']
+        mock_scripts.add(INSTANCE['volumes'][0]['mountpoint'],
+                         uuid=INSTANCE['volumes'][0]['uuid'])
+        mock_scripts.write()
+        self.mox.StubOutWithMock(openvz_conn, 'OVZMountScripts')
+        openvz_conn.OVZMountScripts(INSTANCE['id']).AndReturn(mock_scripts)
         self.mox.ReplayAll()
         conn = openvz_conn.OpenVzConnection(False)
-        conn._set_diskspace(INSTANCE, FAKE_INST_TYPE)
+        conn._attach_volumes(INSTANCE)
 
-    def test_set_diskspace_soft_and_hard_manual_success(self):
+    def test_attach_volumes_without_uuid_writes_nothing(self):
+        instance = dict(INSTANCE, volumes=INSTANCE['volumes'][1:])
         self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'],
-                                  '--save', '--diskspace', '40G:44G',
-                                  run_as_root=True).AndReturn(('', None))
         self.mox.ReplayAll()
         conn = openvz_conn.OpenVzConnection(False)
-        conn._set_diskspace(INSTANCE, FAKE_INST_TYPE)
+        conn._attach_volumes(instance)
 
-    def test_set_diskspace_failure(self):
+    def test_mount_scripts_merge_existing_lines(self):
+        self.flags(ovz_config_dir=tempfile.mkdtemp())
+        try:
+            scripts = openvz_conn.OVZMountScripts(INSTANCE['id'])
+            scripts.add('/var/lib/mysql', uuid='1234')
+            scripts.add('/var/log', uuid='5678')
+            with open(scripts.mountfile, 'w') as fh:
+                fh.write('mount /dev/sdz /mnt/other\n%s\n' %
+                         scripts.mounts[0])
+            contents = scripts.scripts()
+        finally:
+            shutil.rmtree(FLAGS.ovz_config_dir)
+        self.assertEqual(contents[scripts.mountfile],
+                         ['#!/bin/sh', 'mount /dev/sdz /mnt/other'] +
+                         scripts.mounts)
+        self.assertEqual(contents[scripts.umountfile],
+                         ['#!/bin/sh'] + scripts.umounts)
+
+    def test_mount_scripts_write_batches_commands(self):
+        self.flags(ovz_config_dir='/nonexistent/vz/conf')
+        scripts = openvz_conn.OVZMountScripts(INSTANCE['id'])
+        scripts.add('/var/lib/mysql', uuid='1234')
+        scripts.add('/var/log', uuid='5678')
+        commands = []
+        staged = {}
+
+        def fake_execute(*cmd, **kwargs):
+            commands.append(cmd)
+            if cmd[0] == 'cp':
+                for path in cmd[2:-1]:
+                    with open(path) as fh:
+                        staged[os.path.basename(path)] = fh.read()
+            return '', ''
+
+        self.stubs.Set(openvz_conn.utils, 'execute', fake_execute)
+        scripts.write()
+        self.assertEqual([cmd[0] for cmd in commands],
+                         ['mkdir', 'cp', 'mv', 'mv'])
+        self.assertEqual(commands[0], ('mkdir', '-p') +
+                                      tuple(scripts.mount_points))
+        self.assertEqual(commands[1][-1], '/nonexistent/vz/conf')
+        self.assertEqual(commands[2], ('mv', '-f',
+                                       '%s.new' % scripts.mountfile,
+                                       scripts.mountfile))
+        self.assertEqual(staged['%s.mount.new' % INSTANCE['id']],
+                         '\n'.join(['#!/bin/sh'] + scripts.mounts) + '\n')
+        self.assertEqual(staged['%s.umount.new' % INSTANCE['id']],
+                         '\n'.join(['#!/bin/sh'] + scripts.umounts) + '\n')
+
+    def test_mount_scripts_write_failure(self):
+        self.flags(ovz_config_dir='/nonexistent/vz/conf')
+        scripts = openvz_conn.OVZMountScripts(INSTANCE['id'])
+        scripts.add('/var/lib/mysql', uuid='1234')
         self.mox.StubOutWithMock(openvz_conn.utils, 'execute')
-        openvz_conn.utils.execute('vzctl', 'set', INSTANCE['id'], '--save',
-                                  '--diskspace', mox.IgnoreArg(),
+        openvz_conn.utils.execute('mkdir', '-p', *scripts.mount_points,
                                   run_as_root=True)\
                                   .AndRaise(exception.ProcessExecutionError)
         self.mox.ReplayAll()
-        conn = openvz_conn.OpenVzConnection(False)
-        self.assertRaises(exception.Error, conn._set_diskspace, INSTANCE,
-                          FAKE_INST_TYPE)
-
-    def test_attach_volumes_success(self):
-        conn = openvz_conn.OpenVzConnection(False)
-        self.mox.StubOutWithMock(conn, 'attach_volume')
-        conn.attach_volume(INSTANCE['name'], None,
-                                      mox.IgnoreArg())
-        self.mox.ReplayAll()
-        conn._attach_volumes(INSTANCE)
+        self.assertRaises(exception.Error, scripts.write)
 
     def test_attach_volume_success(self):
         self.mox.StubOutWithMock(openvz_conn.context, 'get_admin_context')
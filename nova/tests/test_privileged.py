@@ -0,0 +1,127 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2011 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import os
+import shutil
+import socket
+import tempfile
+
+import eventlet
+
+from nova import exception
+from nova import privileged
+from nova import test
+from nova import utils
+
+
+class PrivilegedHelperTestCase(test.TestCase):
+
+    def setUp(self):
+        super(PrivilegedHelperTestCase, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmpdir, 'helper.sock')
+        self.flags(privileged_helper_socket=self.socket_path,
+                   privileged_helper_commands=['cat', 'false', 'echo'])
+        self.server = eventlet.spawn(privileged.serve, self.socket_path)
+        eventlet.sleep(0.1)
+
+    def tearDown(self):
+        self.server.kill()
+        privileged._POOL = None
+        shutil.rmtree(self.tmpdir)
+        super(PrivilegedHelperTestCase, self).tearDown()
+
+    def test_is_allowed(self):
+        self.assertTrue(privileged.is_allowed(['cat', '/proc/meminfo']))
+        self.assertTrue(privileged.is_allowed(['/bin/cat']))
+        self.assertFalse(privileged.is_allowed(['/tmp/cat']))
+        self.assertFalse(privileged.is_allowed(['sh', '-c', 'id']))
+        self.assertFalse(privileged.is_allowed([]))
+
+    def test_execute_through_helper(self):
+        out, err = utils.execute('cat', process_input='hello',
+                                 run_as_root=True)
+        self.assertEqual('hello', out)
+        self.assertTrue('cat' in privileged.METRICS.summary())
+
+    def test_exit_code_is_checked(self):
+        self.assertRaises(exception.ProcessExecutionError, utils.execute,
+                          'false', run_as_root=True)
+        utils.execute('false', run_as_root=True, check_exit_code=False)
+
+    def test_refused_command(self):
+        result = privileged.execute(['id'])
+        self.assertEqual(privileged.REFUSED_EXIT_CODE, result['exit_code'])
+
+    def test_execute_many(self):
+        results = privileged.execute_many([(['echo', 'one'], None),
+                                           (['echo', 'two'], None)])
+        self.assertEqual(['one\n', 'two\n'],
+                         [result['stdout'] for result in results])
+
+    def test_falls_back_when_helper_is_down(self):
+        self.flags(privileged_helper_socket=self.socket_path + '.missing',
+                   root_helper='')
+        out, err = utils.execute('echo', 'direct', run_as_root=True)
+        self.assertEqual('direct\n', out)
+
+    def test_no_fallback_once_sent(self):
+        class DroppedStream(object):
+            def __init__(self):
+                self.written = []
+
+            def write(self, data):
+                self.written.append(data)
+
+            def flush(self):
+                pass
+
+            def readline(self):
+                return ''
+
+            def close(self):
+                pass
+
+        stream = DroppedStream()
+        pool = privileged._get_pool()
+        pool.current_size += 1
+        self.stubs.Set(pool, 'get', lambda: stream)
+        self.flags(root_helper='')
+        self.assertRaises(exception.ProcessExecutionError, utils.execute,
+                          'echo', 'twice', run_as_root=True)
+        self.assertEqual(1, len(stream.written))
+
+    def test_stale_connection_is_replaced(self):
+        class StaleStream(object):
+            closed = False
+
+            def write(self, data):
+                raise socket.error(errno.EPIPE, 'Broken pipe')
+
+            def close(self):
+                self.closed = True
+
+        stream = StaleStream()
+        pool = privileged._get_pool()
+        pool.current_size += 1
+        self.stubs.Set(pool, 'get', lambda: stream)
+        self.flags(root_helper='false')
+        out, err = utils.execute('echo', 'again', run_as_root=True)
+        self.assertEqual('again\n', out)
+        self.assertTrue(stream.closed)
+        self.assertEqual(1, pool.current_size)
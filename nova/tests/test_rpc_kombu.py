@@ -108,3 +108,26 @@ class RpcKombuTestCase(test_rpc_common._BaseRpcTestCase):
         conn2.consume(limit=1)
         conn2.close()
         self.assertEqual(self.received_message, message)
+
+
+class RpcKombuSingleReplyQueueTestCase(test_rpc_common._BaseRpcTestCase):
+    """Runs the common rpc tests with responses sent to a shared queue."""
+
+    def setUp(self):
+        self.rpc = impl_kombu
+        super(RpcKombuSingleReplyQueueTestCase, self).setUp()
+        self.flags(rpc_single_reply_queue=True)
+
+    def test_calls_share_one_reply_queue(self):
+        self.rpc.call(self.context, 'test', {"method": "echo",
+                                             "args": {"value": 1}})
+        reply_q = self.rpc._get_reply_proxy().reply_q
+        self.rpc.call(self.context, 'test', {"method": "echo",
+                                             "args": {"value": 2}})
+        self.assertEqual(reply_q, self.rpc._get_reply_proxy().reply_q)
+
+    def test_call_timeout(self):
+        self.assertRaises(self.rpc.Timeout, self.rpc.call, self.context,
+                          'no_such_topic', {"method": "echo",
+                                            "args": {"value": 1}},
+                          timeout=0.1)
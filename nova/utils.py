@@ -47,6 +47,7 @@ from eventlet.green import subprocess
 from nova import exception
 from nova import flags
 from nova import log as logging
+from nova import privileged
 from nova import version
 
 
@@ -156,6 +157,15 @@ def execute(*cmd, **kwargs):
         raise exception.Error(_('Got unknown keyword args '
                                 'to utils.execute: %r') % kwargs)
 
+    if run_as_root and FLAGS.privileged_helper_socket:
+        try:
+            return _execute_privileged(cmd, process_input, check_exit_code,
+                                       delay_on_retry, attempts)
+        except privileged.HelperUnavailable, e:
+            LOG.warning(_('Privileged helper unavailable, falling back to '
+                          '%(root_helper)s: %(error)s'),
+                        {'root_helper': FLAGS.root_helper, 'error': e})
+
     if run_as_root:
         cmd = shlex.split(FLAGS.root_helper) + list(cmd)
     cmd = map(str, cmd)
@@ -202,6 +212,33 @@ def execute(*cmd, **kwargs):
             greenthread.sleep(0)
 
 
+def _execute_privileged(cmd, process_input, check_exit_code, delay_on_retry,
+                        attempts):
+    """Run a command through the privileged helper, with the same retries
+    and exit code checks as :py:func:`execute`."""
+    cmd = map(str, cmd)
+    while attempts > 0:
+        attempts -= 1
+        LOG.debug(_('Running cmd (privileged helper): %s'), ' '.join(cmd))
+        result = privileged.execute(cmd, process_input)
+        _returncode = result['exit_code']
+        if _returncode:
+            LOG.debug(_('Result was %s') % _returncode)
+            if type(check_exit_code) == types.IntType \
+                    and _returncode != check_exit_code:
+                if attempts:
+                    LOG.debug(_('%r failed. Retrying.'), cmd)
+                    if delay_on_retry:
+                        greenthread.sleep(random.randint(20, 200) / 100.0)
+                    continue
+                raise exception.ProcessExecutionError(
+                        exit_code=_returncode,
+                        stdout=result['stdout'],
+                        stderr=result['stderr'],
+                        cmd=' '.join(cmd))
+        return result['stdout'], result['stderr']
+
+
 def ssh_execute(ssh, cmd, process_input=None,
                 addl_env=None, check_exit_code=True):
     LOG.debug(_('Running cmd (SSH): %s'), ' '.join(cmd))
@@ -127,6 +127,15 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def get_power_states(self):
+        """Return {instance name: power_state} for all registered VMs.
+
+        Drivers that can read every state with one call to the hypervisor
+        should override this, the compute manager polls it periodically.
+        """
+        return dict((info.name, info.state)
+                    for info in self.list_instances_detail())
+
     def spawn(self, context, instance,
               network_info=None, block_device_info=None):
         """
@@ -22,8 +22,17 @@ is sketchy at best.
 
 import os
 import fnmatch
+import shutil
 import socket
 import json
+import tempfile
+import time
+
+import eventlet
+from eventlet import event
+from eventlet import greenthread
+from eventlet import queue
+
 from nova import db
 from nova import exception
 from nova import flags
@@ -112,10 +121,70 @@ flags.DEFINE_integer('ovz_kmemsize_barrier_differential',
 flags.DEFINE_bool('ovz_use_bind_mount',
                   False,
                   'Use bind mounting instead of simfs')
+flags.DEFINE_integer('ovz_memory_burst_percent',
+                     100,
+                     'privvmpages as a percent of the guaranteed memory '
+                     '(vmguarpages), for flavors without an '
+                     'ovz_memory_burst_percent extra spec')
+flags.DEFINE_float('ovz_state_poll_interval',
+                   0.5,
+                   'Seconds between container state polls while something '
+                   'is waiting for a container to boot or go away')
+flags.DEFINE_integer('ovz_state_wait_timeout',
+                     600,
+                     'Seconds to wait for a container to boot or go away')
+flags.DEFINE_integer('ovz_janitor_concurrency',
+                     4,
+                     'Cleanups of destroyed containers run at once in the '
+                     'background, 0 cleans up before destroy returns')
+flags.DEFINE_integer('ovz_janitor_max_attempts',
+                     5,
+                     'Times a failed cleanup is tried before giving up')
+flags.DEFINE_float('ovz_janitor_retry_interval',
+                   10.0,
+                   'Seconds before a failed cleanup is retried, multiplied '
+                   'by the number of attempts so far')
 
 LOG = logging.getLogger('nova.virt.openvz')
 
 
+# Settings vzctl stores as barrier:limit, a single value sets both.
+_VZ_BARRIER_LIMIT_OPTIONS = ('vmguarpages', 'privvmpages', 'kmemsize')
+_VZ_DISK_UNITS = {'K': 1, 'M': 1024, 'G': 1024 ** 2, 'T': 1024 ** 3}
+
+
+def _normalize_vz_value(option, value):
+    """
+    Put a vzctl setting in the form vzctl saves it in the container config,
+    so a value about to be set can be compared with the saved one.
+    """
+    value = str(value).strip()
+    if option == 'diskspace':
+        parts = []
+        for part in value.split(':'):
+            unit = part[-1:].upper()
+            if unit in _VZ_DISK_UNITS:
+                part = str(int(float(part[:-1]) * _VZ_DISK_UNITS[unit]))
+            parts.append(part)
+        value = ':'.join(parts)
+    if option in _VZ_BARRIER_LIMIT_OPTIONS + ('diskspace',) and \
+       ':' not in value:
+        value = '%s:%s' % (value, value)
+    return value
+
+
+def _vz_power_state(status):
+    """
+    The power_state for a container status as reported by vzlist, None
+    meaning the container does not exist.
+    """
+    if status is None:
+        return power_state.NOSTATE
+    if status == 'running':
+        return power_state.RUNNING
+    return power_state.SHUTDOWN
+
+
 def get_connection(read_only):
     return OpenVzConnection(read_only)
 
@@ -134,6 +203,9 @@ class OpenVzConnection(driver.ComputeDriver):
             }
         self.read_only = read_only
         self.vif_driver = utils.import_object(FLAGS.ovz_vif_driver)
+        self.watcher = CONTAINER_WATCHER
+        self.janitor = TEARDOWN_JANITOR
+        self.host_state = OVZHostState(self)
         LOG.debug(_('__init__ complete in OpenVzConnection'))
 
     @classmethod
@@ -237,6 +309,36 @@ class OpenVzConnection(driver.ComputeDriver):
 
         return infos
 
+    def get_power_states(self):
+        """
+        Read the state of every container with one command rather than a
+        vzlist and a database lookup for each one as list_instances_detail
+        does.
+
+        I execute the command:
+
+        vzlist --all -o name,status -H
+
+        If I fail to run an exception is raised for the same reasons as
+        list_instances_detail.
+        """
+        try:
+            out, err = utils.execute('vzlist', '--all', '-o', 'name,status',
+                                     '-H', run_as_root=True)
+            if err:
+                LOG.error(_('Stderr output from vzlist: %s') % err)
+        except ProcessExecutionError as err:
+            LOG.error(_('Stderr output from vzlist: %s') % err)
+            raise exception.Error(_('Problem listing Vzs'))
+
+        states = {}
+        for line in out.splitlines():
+            fields = line.split()
+            if len(fields) < 2 or fields[0] == '-':
+                continue
+            states[fields[0]] = _vz_power_state(fields[1])
+        return states
+
     def spawn(self, context, instance, network_info=None,
               block_device_mapping=None):
         """
@@ -263,9 +365,6 @@ class OpenVzConnection(driver.ComputeDriver):
                            {'power_state': power_state.BUILDING})
         LOG.debug(_('instance %s: is building') % instance['name'])
 
-        # Get current usages and resource availablity.
-        self._get_cpuunits_usage()
-
         # Go through the steps of creating a container
         # TODO(imsplitbit): Need to add conditionals around this stuff to make
         # it more durable during failure. And roll back changes made leading
@@ -284,30 +383,27 @@ class OpenVzConnection(driver.ComputeDriver):
         self._initial_secure_host(instance)
         self._gratuitous_arp_all_addresses(instance, network_info)
 
-        # Begin making our looping async call
-        timer = utils.LoopingCall(f=None)
+        def _update_power_state(status):
+            db.instance_update(context, instance['id'],
+                               {'power_state': _vz_power_state(status)})
 
-        # I stole this from the libvirt driver but it is appropriate to
-        # have this looping timer call so that if a VE doesn't start right
-        # away we can defer all of this.
+        # The watcher polls the state of every container on the host at
+        # once, so concurrent builds share one vzlist rather than each
+        # running their own.  The database is only written when the state
+        # of this container changes.
         def _wait_for_boot():
             try:
-                state = self.get_info(instance['name'])['state']
-                db.instance_update(context,
-                                   instance['id'], {'power_state': state})
-                if state == power_state.RUNNING:
-                    LOG.debug(_('instance %s: booted') % instance['name'])
-                    timer.stop()
-
+                self.watcher.wait_for(instance['id'], ('running',),
+                                      on_change=_update_power_state,
+                                      timeout=FLAGS.ovz_state_wait_timeout)
+                LOG.debug(_('instance %s: booted') % instance['name'])
             except:
                 LOG.exception(_('instance %s: failed to boot') %
                               instance['name'])
                 db.instance_update(context, instance['id'],
                                    {'power_state': power_state.SHUTDOWN})
-                timer.stop()
 
-        timer.f = _wait_for_boot
-        return timer.start(interval=0.5, now=True)
+        return greenthread.spawn(_wait_for_boot)
 
     def _create_vz(self, instance, ostemplate='ubuntu'):
         """
@@ -716,8 +812,9 @@ class OpenVzConnection(driver.ComputeDriver):
         for table in tables:
             table.add_rule(str(instance['id']), rule)
 
-        # Apply the rules
-        linux_net.iptables_manager.apply()
+        # Apply the rules, together with those of any other instances
+        # being set up at the same time.
+        linux_net.iptables_manager.apply_coalesced()
 
     def _initial_secure_host(self, instance, ports=None):
         """
@@ -742,8 +839,9 @@ class OpenVzConnection(driver.ComputeDriver):
         # cannot implement this until the API passes a security
         # context object down to us.
 
-        # Apply the rules
-        linux_net.iptables_manager.apply()
+        # Apply the rules, together with those of any other instances
+        # being set up at the same time.
+        linux_net.iptables_manager.apply_coalesced()
 
     def resize_in_place(self, instance, instance_type_id,
                         restart_instance=False):
@@ -751,13 +849,16 @@ class OpenVzConnection(driver.ComputeDriver):
         Making a public method for the API/Compute manager to get access
         to host based resizing.
         """
+        start = time.time()
         try:
             self._set_instance_size(instance, instance_type_id)
             if restart_instance:
                 self.reboot(instance, None)
-            return True
         except Exception:
             raise exception.InstanceUnacceptable(_("Instance resize failed"))
+        LOG.info(_('Resized instance %(id)s in %(elapsed).3fs') %
+                 {'id': instance['id'], 'elapsed': time.time() - start})
+        return True
 
     def reset_instance_size(self, instance, restart_instance=False):
         """
@@ -765,20 +866,30 @@ class OpenVzConnection(driver.ComputeDriver):
         flavor spec.  If this fails an exception is raised because this
         means that the instance flavor setting couldn't be rescued.
         """
+        start = time.time()
         try:
             self._set_instance_size(instance)
             if restart_instance:
                 self.reboot(instance, None)
-            return True
         except Exception:
             raise exception.InstanceUnacceptable(
                 _("Instance size reset FAILED"))
+        LOG.info(_('Reset size of instance %(id)s in %(elapsed).3fs') %
+                 {'id': instance['id'], 'elapsed': time.time() - start})
+        return True
 
-    def _set_instance_size(self, instance, instance_type_id = None):
+    def _set_instance_size(self, instance, instance_type_id=None,
+                           dry_run=False):
         """
         Given that these parameters make up and instance's 'size' we are
         bundling them together to make resizing an instance on the host
         an easier task.
+
+        Every limit is worked out up front and the ones that differ from the
+        container's saved config are applied with a single vzctl set, so the
+        config is only rewritten once.  With dry_run nothing is applied.
+        Returns the list of (option, value) pairs that were (or would be)
+        changed.
         """
         if not instance_type_id:
             instance_type = instance_types.get_instance_type(
@@ -786,278 +897,107 @@ class OpenVzConnection(driver.ComputeDriver):
         else:
             instance_type = instance_types.get_instance_type(instance_type_id)
 
+        spec = self._instance_size_spec(instance_type)
+        return self._apply_vz_settings(instance, spec, dry_run=dry_run)
+
+    def _instance_size_spec(self, instance_type):
+        """
+        Work out every resource limit for an instance type, returning an
+        ordered list of (vzctl option, value) pairs.
+        """
         instance_memory_bytes = ((int(instance_type['memory_mb'])
                                   * 1024) * 1024)
         instance_memory_pages = self._calc_pages(instance_type['memory_mb'])
         percent_of_resource = self._percent_of_resource(
             instance_type['memory_mb'])
 
-        self._set_vmguarpages(instance, instance_memory_pages)
-        self._set_privvmpages(instance, instance_memory_pages)
-        self._set_kmemsize(instance, instance_memory_bytes)
+        spec = [('vmguarpages', instance_memory_pages),
+                ('privvmpages', self._calc_privvmpages(instance_type,
+                                                       instance_memory_pages)),
+                ('kmemsize', self._calc_kmemsize(instance_memory_bytes))]
         if FLAGS.ovz_use_cpuunit:
-            self._set_cpuunits(instance, percent_of_resource)
+            spec.append(('cpuunits',
+                         self._calc_cpuunits(percent_of_resource)))
         if FLAGS.ovz_use_cpulimit:
-            self._set_cpulimit(instance, percent_of_resource)
+            spec.append(('cpulimit',
+                         self._calc_cpulimit(percent_of_resource)))
         if FLAGS.ovz_use_cpus:
-            self._set_cpus(instance, instance_type['vcpus'])
+            spec.append(('cpus', self._calc_cpus(instance_type['vcpus'])))
         if FLAGS.ovz_use_ioprio:
-            self._set_ioprio(instance, percent_of_resource)
+            spec.append(('ioprio', self._calc_ioprio(percent_of_resource)))
         if FLAGS.ovz_use_disk_quotas:
-            self._set_diskspace(instance, instance_type)
+            spec.append(('diskspace', self._calc_diskspace(instance_type)))
+        return spec
 
-    def _set_vmguarpages(self, instance, num_pages):
+    def _get_vz_config(self, instance):
         """
-        Set the vmguarpages attribute for a container.  This number represents
-        the number of 4k blocks of memory that are guaranteed to the container.
-        This is what shows up when you run the command 'free' in the container.
-
-        I run the command:
-
-        vzctl set <ctid> --save --vmguarpages <num_pages>
-
-        If I fail to run then an exception is raised because this affects the
-        memory allocation for the container.
+        Read the saved settings of a container from
+        <ovz_config_dir>/<ctid>.conf as a dict of upper case name to value.
+        An empty dict is returned if the config can not be read.
         """
+        conf = OVZFile('%s/%s.conf' % (FLAGS.ovz_config_dir, instance['id']))
         try:
-            out, err = utils.execute('vzctl', 'set', instance['id'],
-                                      '--save', '--vmguarpages', num_pages,
-                                      run_as_root=True)
-            LOG.debug(_('Stdout output from vzctl: %s') % out)
-            if err:
-                LOG.error(_('Stderr output from vzctl: %s') % err)
-        except ProcessExecutionError as err:
-            LOG.error(_('Stderr output from vzctl: %s') % err)
-            raise exception.Error(_('Cannot set vmguarpages for %s') %
-                                  instance['id'])
-
-    def _set_privvmpages(self, instance, num_pages):
-        """
-        Set the privvmpages attribute for a container.  This represents the
-        memory allocation limit.  Think of this as a bursting limit.  For now
-        We are setting to the same as vmguarpages but in the future this can be
-        used to thin provision a box.
-
-        I run the command:
-
-        vzctl set <ctid> --save --privvmpages <num_pages>
-
-        If I fail to run an exception is raised as this is essential for the
-        running container to operate properly within it's memory constraints.
-        """
+            conf.read()
+        except exception.Error:
+            return {}
+        settings = {}
+        for line in conf.contents:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            name, value = line.split('=', 1)
+            settings[name.strip()] = value.strip().strip('"\'')
+        return settings
+
+    def _diff_vz_settings(self, instance, spec):
+        """
+        Return the (option, value) pairs of spec that differ from what is
+        saved in the container's config.
+        """
+        current = self._get_vz_config(instance)
+        changes = []
+        for option, value in spec:
+            saved = current.get(option.upper())
+            if saved is None or (_normalize_vz_value(option, saved) !=
+                                 _normalize_vz_value(option, value)):
+                changes.append((option, value))
+        return changes
+
+    def _apply_vz_settings(self, instance, spec, dry_run=False):
+        """
+        Apply the changed settings in spec with one command:
+
+        vzctl set <ctid> --save --<option> <value> [--<option> <value> ...]
+
+        If I fail to run an exception is raised as these settings are what
+        keep the container within its subscribed slice of the host.
+        """
+        changes = self._diff_vz_settings(instance, spec)
+        if dry_run or not changes:
+            LOG.debug(_('Settings to change on %(id)s: %(changes)s') %
+                      {'id': instance['id'], 'changes': changes})
+            return changes
+
+        cmd = ['vzctl', 'set', instance['id'], '--save']
+        for option, value in changes:
+            cmd.extend(['--%s' % option, value])
+        start = time.time()
         try:
-            out, err = utils.execute('vzctl', 'set', instance['id'], '--save',
-                                     '--privvmpages', num_pages,
-                                     run_as_root=True)
+            out, err = utils.execute(*cmd, run_as_root=True)
             LOG.debug(_('Stdout output from vzctl: %s') % out)
             if err:
                 LOG.error(_('Stderr output from vzctl: %s') % err)
         except ProcessExecutionError as err:
             LOG.error(_('Stderr output from vzctl: %s') % err)
-            raise exception.Error(_('Cannot set privvmpages for %s') %
-                                  instance['id'])
-
-    def _set_kmemsize(self, instance, instance_memory):
-        """
-        Set the kmemsize attribute for a container.  This represents the
-        amount of the container's memory allocation that will be made
-        available to the kernel.  This is used for tcp connections, unix
-        sockets and the like.
-
-        This runs the command:
-
-        vzctl set <ctid> --save --kmemsize <barrier>:<limit>
-
-        If this fails to run an exception is raised as this is essential for
-        the container to operate under a normal load.  Defaults for this
-        setting are completely inadequate for any normal workload.
-        """
-        # Now use the configuration flags to calculate the appropriate
-        # values for both barrier and limit.
-        kmem_limit = int(instance_memory * (
-            float(FLAGS.ovz_kmemsize_percent_of_memory) / 100.0))
-        kmem_barrier = int(kmem_limit * (
-            float(FLAGS.ovz_kmemsize_barrier_differential) / 100.0))
-        kmemsize = '%d:%d' % (kmem_barrier, kmem_limit)
-
-        try:
-            out, err = utils.execute('vzctl', 'set', instance['id'], '--save',
-                                     '--kmemsize',
-                                     kmemsize, run_as_root=True)
-            LOG.debug(_('Stdout from vzctl: %s') % out)
-            if err:
-                LOG.error(_('Stderr from vzctl: %s') % err)
-        except ProcessExecutionError as err:
-            LOG.error(_('Error setting kmemsize: %s') % err)
             raise exception.Error(
-                _('Error setting kmemsize to %(kmemsize)s on %(id)s') %
-                {'kmemsize': kmemsize, 'id': instance['id']})
-
-    def _set_cpuunits(self, instance, percent_of_resource):
-        """
-        Set the cpuunits setting for the container.  This is an integer
-        representing the number of cpu fair scheduling counters that the
-        container has access to during one complete cycle.
-
-        I run the command:
-
-        vzctl set <ctid> --save --cpuunits <units>
-
-        If I fail to run an exception is raised because this is the secret
-        sauce to constraining each container within it's subscribed slice of
-        the host node.
-        """
-        LOG.debug(_('Reported cpuunits %s') % self.utility['UNITS'])
-        LOG.debug(_('Reported percent of resource: %s') %
-                  percent_of_resource)
-        units = int(self.utility['UNITS'] * percent_of_resource)
-        # TODO(imsplitbit): This needs to be adjusted to not allow
-        # subscription of more than available cpuunits.  For now we
-        # won't let the obvious case of a container getting more than
-        # the maximum cpuunits for the host.
-        if units > self.utility['UNITS']:
-            units = self.utility['UNITS']
-
-        try:
-            out, err = utils.execute('vzctl', 'set', instance['id'], '--save',
-                                     '--cpuunits', units, run_as_root=True)
-            LOG.debug(_('Stdout output from vzctl: %s') % out)
-            if err:
-                LOG.error(_('Stderr output from vzctl: %s') % err)
-        except ProcessExecutionError as err:
-            LOG.error(_('Stderr output from vzctl: %s') % err)
-            raise exception.Error(_('Cannot set cpuunits for %s') %
-                                  instance['id'])
-
-    def _set_cpulimit(self, instance, percent_of_resource):
-        """
-        This is a number in % equal to the amount of cpu processing power
-        the container gets.  NOTE: 100% is 1 logical cpu so if you have 12
-        cores with hyperthreading enabled then 100% of the whole host machine
-        would be 2400% or --cpulimit 2400.
-
-        I run the command:
-
-        vzctl set <ctid> --save --cpulimit <cpulimit>
-
-        If I fail to run an exception is raised because this is the secret
-        sauce to constraining each container within it's subscribed slice of
-        the host node.
-        """
-        cpulimit = int(self.utility['CPULIMIT'] * percent_of_resource)
-        # TODO(imsplitbit): Need to fix this so that we don't alocate
-        # more than the current available resource limits.  This shouldn't
-        # happen except in test cases but we should still protect
-        # ourselves from it.  For now we just won't let it go higher
-        # than the maximum cpulimit for the host on any one container.
-        if cpulimit > self.utility['CPULIMIT']:
-            cpulimit = self.utility['CPULIMIT']
-
-        try:
-            out, err = utils.execute('vzctl', 'set', instance['id'], '--save',
-                                     '--cpulimit', cpulimit, run_as_root=True)
-            LOG.debug(_('Stdout output from vzctl: %s') % out)
-            if err:
-                LOG.error(_('Stderr output from vzctl: %s') % err)
-        except ProcessExecutionError as err:
-            LOG.error(_('Stderr output from vzctl: %s') % err)
-            raise exception.Error(_('Unable to set cpulimit for %s') %
-                                  instance['id'])
-
-    def _set_cpus(self, instance, vcpus, multiplier=2):
-        """
-        The number of logical cpus that are made available to the container.
-        I default to showing 2 cpus to each container at a minimum.
-
-        I run the command:
-
-        vzctl set <ctid> --save --cpus <num_cpus>
-
-        If I fail to run an exception is raised because this limits the number
-        of cores that are presented to each container and if this fails to set
-        *ALL* cores will be presented to every container, that be bad.
-        """
-        vcpus = vcpus * multiplier
-        # TODO(imsplitbit): We need to fix this to not allow allocation of
-        # more than the maximum allowed cpus on the host.
-        if vcpus > (self.utility['CPULIMIT'] / 100):
-            vcpus = self.utility['CPULIMIT'] / 100
-
-        try:
-            out, err = utils.execute('vzctl', 'set', instance['id'], '--save',
-                                     '--cpus', vcpus, run_as_root=True)
-            LOG.debug(_('Stdout output from vzctl: %s') % out)
-            if err:
-                LOG.error(_('Stderr output from vzctl: %s') % err)
-        except ProcessExecutionError as err:
-            LOG.error(_('Stderr output from vzctl: %s') % err)
-            raise exception.Error(_('Unable to set cpus for %s') %
-                                  instance['id'])
-
-    def _set_ioprio(self, instance, percent_of_resource):
-        """
-        Set the IO priority setting for a given container.  This is represented
-        by an integer between 0 and 7.  If no priority is given one will be
-        automatically calculated based on the percentage of allocated memory
-        for the container.
-
-        I run the command:
-
-        vzctl set <ctid> --save --ioprio <iopriority>
-
-        If I fail to run an exception is raised because all containers are
-        given the same weight by default which will cause bad performance
-        across all containers when there is input/outpu contention.
-        """
-        ioprio = int(float(FLAGS.ovz_ioprio_limit) * percent_of_resource)
-
-        try:
-            out, err = utils.execute('vzctl', 'set', instance['id'], '--save',
-                                     '--ioprio', ioprio, run_as_root=True)
-            LOG.debug(_('Stdout output from vzctl: %s') % out)
-            if err:
-                LOG.error(_('Stderr output from vzctl: %s') % err)
-        except ProcessExecutionError as err:
-            LOG.error(_('Stderr output from vzctl: %s') % err)
-            raise exception.Error(_('Unable to set IO priority for %s') %
-                instance['id'])
-
-    def _set_diskspace(self, instance, instance_type):
-        """
-        Implement OpenVz disk quotas for local disk space usage.
-        This method takes a soft and hard limit.  This is also the amount
-        of diskspace that is reported by system tools such as du and df inside
-        the container.  If no argument is given then one will be calculated
-        based on the values in the instance_types table within the database.
-
-        I run the command:
-
-        vzctl set <ctid> --save --diskspace <soft_limit:hard_limit>
-
-        If I fail to run an exception is raised because this command limits a
-        container's ability to hijack all available disk space.
-        """
-        soft = int(instance_type['local_gb'])
-
-        hard = int(instance_type['local_gb'] *
-                    FLAGS.ovz_disk_space_oversub_percent)
-
-        # Now set the increment of the limit.  I do this here so that I don't
-        # have to do this in every line above.
-        soft = '%s%s' % (soft, FLAGS.ovz_disk_space_increment)
-        hard = '%s%s' % (hard, FLAGS.ovz_disk_space_increment)
-
-        try:
-            out, err = utils.execute('vzctl', 'set', instance['id'], '--save',
-                                     '--diskspace', '%s:%s' % (soft, hard),
-                                     run_as_root=True)
-            LOG.debug(_('Stdout output from vzctl: %s') % out)
-            if err:
-                LOG.error(_('Stderr output from vzctl: %s') % err)
-        except ProcessExecutionError as err:
-            LOG.error(_('Stderr output from vzctl: %s') % err)
-            raise exception.Error(_('Error setting diskspace quota for %s') %
-                                  instance['id'])
+                _('Cannot set %(options)s for %(id)s') %
+                {'options': ', '.join(option for option, _v in changes),
+                 'id': instance['id']})
+        LOG.debug(_('Applied %(count)d settings to %(id)s in '
+                    '%(elapsed).3fs') %
+                  {'count': len(changes), 'id': instance['id'],
+                   'elapsed': time.time() - start})
+        return changes
 
     def plug_vifs(self, instance, network_info):
         """
@@ -1194,31 +1134,35 @@ class OpenVzConnection(driver.ComputeDriver):
         files in /etc/vz/conf with the .destroyed extension.  We want these
         gone when we destroy a container.
 
-        This runs a command that looks like this:
+        This runs one command for all of them that looks like this:
 
-        rm -f /etc/vz/conf/<CTID>.conf.destroyed
+        rm -f /etc/vz/conf/<CTID>.conf.destroyed [...]
 
-        It this fails to execute no exception is raised but an log error
-        event is triggered.
+        If this fails to execute an exception is raised so the cleanup can
+        be tried again.
         """
+        # minor protection for /
+        if FLAGS.ovz_config_dir == '/':
+            raise exception.Error(_('I refuse to operate on /'))
+
         # first assemble a list of files that need to be cleaned up, then
         # do the deed.
-        for file in os.listdir(FLAGS.ovz_config_dir):
-            if fnmatch.fnmatch(file, '%s.*' % instance_id):
-                try:
-                    # minor protection for /
-                    if FLAGS.ovz_config_dir == '/':
-                        raise exception.Error(_('I refuse to operate on /'))
-
-                    file = '%s/%s' % (FLAGS.ovz_config_dir, file)
-                    LOG.debug(_('Deleting file: %s') % file)
-                    out, err = utils.execute('rm', '-f', file,
-                                             run_as_root=True)
-                    LOG.debug(_('Stdout output from rm: %s') % out)
-                    if err:
-                        LOG.error(_('Stderr output from rm: %s') % err)
-                except ProcessExecutionError as err:
-                    LOG.error(_('Stderr output from rm: %s') % err)
+        files = ['%s/%s' % (FLAGS.ovz_config_dir, file)
+                 for file in os.listdir(FLAGS.ovz_config_dir)
+                 if fnmatch.fnmatch(file, '%s.*' % instance_id)]
+        if not files:
+            return
+
+        LOG.debug(_('Deleting files: %s') % ', '.join(files))
+        try:
+            out, err = utils.execute('rm', '-f', *files, run_as_root=True)
+            LOG.debug(_('Stdout output from rm: %s') % out)
+            if err:
+                LOG.error(_('Stderr output from rm: %s') % err)
+        except ProcessExecutionError as err:
+            LOG.error(_('Stderr output from rm: %s') % err)
+            raise exception.Error(_('Failed to delete config files of %s') %
+                                  instance_id)
 
     def _clean_orphaned_directories(self, instance_id):
         """
@@ -1229,8 +1173,8 @@ class OpenVzConnection(driver.ComputeDriver):
 
         rm -rf /mnt/<CTID>
 
-        If this fails to execute, no exception is raised but a log error event
-        is triggered
+        If this fails to execute an exception is raised so the cleanup can
+        be tried again.
         """
         mount_root = '%s/%s' % (FLAGS.ovz_ve_host_mount_dir, instance_id)
         mount_root = os.path.abspath(mount_root)
@@ -1258,6 +1202,7 @@ class OpenVzConnection(driver.ComputeDriver):
                 LOG.error(_('Stderr from rm: %s') % err)
         except ProcessExecutionError as err:
             LOG.error(_('Stderr from rm: %s') % err)
+            raise exception.Error(_('Failed to delete %s') % mount_root)
 
     def destroy(self, instance, network_info, cleanup=True):
         """
@@ -1271,21 +1216,20 @@ class OpenVzConnection(driver.ComputeDriver):
         because a failure to destroy would leave the database and container
         in a disparate state.
         """
-        timer = utils.LoopingCall()
-        def _wait_for_destroy():
-            try:
-                LOG.debug(_('Beginning _wait_for_destroy'))
-                state = self.get_info(instance['name'])['state']
-                LOG.debug(_('State is %s') % state)
-
-                if state is power_state.RUNNING:
-                    LOG.debug(_('Ve is running, stopping now.'))
-                    self._stop(instance)
-                    LOG.debug(_('Ve stopped'))
+        status = self.watcher.refresh().get(str(instance['id']))
+        LOG.debug(_('State is %s') % status)
+        if status is None:
+            LOG.debug(_('Container not found, destroyed?'))
+        else:
+            if status == 'running':
+                LOG.debug(_('Ve is running, stopping now.'))
+                self._stop(instance)
+                LOG.debug(_('Ve stopped'))
 
+            try:
                 LOG.debug(_('Attempting to destroy container'))
                 out, err = utils.execute('vzctl', 'destroy', instance['id'],
-                                     run_as_root=True)
+                                         run_as_root=True)
                 LOG.debug(_('Stdout output from vzctl: %s') % out)
                 if err:
                     LOG.error(_('Stderr output from vzctl: %s') % err)
@@ -1295,28 +1239,30 @@ class OpenVzConnection(driver.ComputeDriver):
                     if err['stderr'] == 'Container already locked\n':
                         LOG.warn(_('Container %s locked, cannot continue') %
                                  instance['id'])
-                        timer.stop()
                 LOG.error(_('Stderr output from vzctl: %s') % err)
-                raise exception.Error(_('Error destroying %d') % instance['id'])
-            except exception.NotFound:
-                LOG.debug(_('Container not found, destroyed?'))
-                timer.stop()
-                LOG.debug(_('Timer stopped for _wait_for_destroy'))
-
-        LOG.debug(_('Making timer'))
-        timer.f = _wait_for_destroy
-        LOG.debug(_('Starting timer'))
-        running_delete = timer.start(interval=0.5, now=True)
-        LOG.debug(_('Waiting for timer'))
-        running_delete.wait()
-        LOG.debug(_('Timer finished'))
+                raise exception.Error(_('Error destroying %d') %
+                                      instance['id'])
+
+            LOG.debug(_('Waiting for container to go away'))
+            self.watcher.wait_for(instance['id'], (None,),
+                                  timeout=FLAGS.ovz_state_wait_timeout)
+            LOG.debug(_('Container destroyed'))
 
         for (network, mapping) in network_info:
             LOG.debug('Unplugging vifs')
             self.vif_driver.unplug(instance, network, mapping)
 
-        self._clean_orphaned_files(instance['id'])
-        self._clean_orphaned_directories(instance['id'])
+        # The container is gone at this point, what's left on disk is
+        # cleaned up in the background so destroy can return.
+        self.janitor.queue(self._cleanup_destroyed, instance['id'])
+
+    def _cleanup_destroyed(self, instance_id):
+        """
+        Remove the config files and mount directories a destroyed container
+        leaves behind.
+        """
+        self._clean_orphaned_files(instance_id)
+        self._clean_orphaned_directories(instance_id)
 
     def _attach_volumes(self, instance):
         """
@@ -1328,12 +1274,18 @@ class OpenVzConnection(driver.ComputeDriver):
         a limitation that is currently imposed by nova not storing the device
         name in the volumes table so we have no point of reference for which
         device goes where.
+
+        The mount and umount scripts are built for all the volumes at once
+        rather than edited once per volume through attach_volume.
         """
-        if instance['volumes']:
-            for volume in instance['volumes']:
-                if volume['uuid']:
-                    self.attach_volume(instance['name'], None,
-                                       volume['mountpoint'])
+        scripts = OVZMountScripts(instance['id'])
+        for volume in instance['volumes'] or []:
+            if volume['uuid']:
+                LOG.debug(_('Adding volume %(uuid)s to %(id)s') %
+                          {'uuid': volume['uuid'], 'id': instance['id']})
+                scripts.add(volume['mountpoint'], uuid=volume['uuid'])
+        if scripts.mounts:
+            scripts.write()
 
     def attach_volume(self, instance_name, device_path, mountpoint):
         """
@@ -1583,6 +1535,105 @@ class OpenVzConnection(driver.ComputeDriver):
         """
         return
 
+    def get_host_stats(self, refresh=False):
+        """
+        Return the resources of the host and how much of them the containers
+        on it have been given, see OVZHostState.  The figures are read again
+        when refresh is set, which the compute manager does every
+        host_state_interval.
+        """
+        return self.host_state.get_host_stats(refresh=refresh)
+
+    def _calc_privvmpages(self, instance_type, guaranteed_pages):
+        """
+        The privvmpages for an instance type, the memory a container may
+        burst to.  This is guaranteed_pages scaled by the flavor's
+        ovz_memory_burst_percent extra spec, or the flag of the same name,
+        and never less than guaranteed_pages.
+        """
+        extra_specs = instance_type.get('extra_specs') or {}
+        try:
+            burst = int(extra_specs.get('ovz_memory_burst_percent',
+                                        FLAGS.ovz_memory_burst_percent))
+        except ValueError:
+            LOG.error(_('Invalid ovz_memory_burst_percent for flavor %s') %
+                      instance_type.get('name'))
+            burst = FLAGS.ovz_memory_burst_percent
+        return max(guaranteed_pages, guaranteed_pages * burst / 100)
+
+    def _calc_kmemsize(self, instance_memory):
+        """
+        The kmemsize barrier:limit for a container with instance_memory bytes
+        of memory, worked out from the ovz_kmemsize_* flags.
+        """
+        kmem_limit = int(instance_memory * (
+            float(FLAGS.ovz_kmemsize_percent_of_memory) / 100.0))
+        kmem_barrier = int(kmem_limit * (
+            float(FLAGS.ovz_kmemsize_barrier_differential) / 100.0))
+        return '%d:%d' % (kmem_barrier, kmem_limit)
+
+    def _calc_cpuunits(self, percent_of_resource):
+        """
+        The cpuunits for a container given its share of the host.
+        """
+        LOG.debug(_('Reported cpuunits %s') % self.utility['UNITS'])
+        LOG.debug(_('Reported percent of resource: %s') %
+                  percent_of_resource)
+        units = int(self.utility['UNITS'] * percent_of_resource)
+        # TODO(imsplitbit): This needs to be adjusted to not allow
+        # subscription of more than available cpuunits.  For now we
+        # won't let the obvious case of a container getting more than
+        # the maximum cpuunits for the host.
+        if units > self.utility['UNITS']:
+            units = self.utility['UNITS']
+        return units
+
+    def _calc_cpulimit(self, percent_of_resource):
+        """
+        The cpulimit for a container given its share of the host.
+        """
+        cpulimit = int(self.utility['CPULIMIT'] * percent_of_resource)
+        # TODO(imsplitbit): Need to fix this so that we don't alocate
+        # more than the current available resource limits.  This shouldn't
+        # happen except in test cases but we should still protect
+        # ourselves from it.  For now we just won't let it go higher
+        # than the maximum cpulimit for the host on any one container.
+        if cpulimit > self.utility['CPULIMIT']:
+            cpulimit = self.utility['CPULIMIT']
+        return cpulimit
+
+    def _calc_cpus(self, vcpus, multiplier=2):
+        """
+        The number of cpus shown to a container with vcpus virtual cpus.
+        """
+        vcpus = vcpus * multiplier
+        # TODO(imsplitbit): We need to fix this to not allow allocation of
+        # more than the maximum allowed cpus on the host.
+        if vcpus > (self.utility['CPULIMIT'] / 100):
+            vcpus = self.utility['CPULIMIT'] / 100
+        return vcpus
+
+    def _calc_ioprio(self, percent_of_resource):
+        """
+        The IO priority for a container given its share of the host.
+        """
+        return int(float(FLAGS.ovz_ioprio_limit) * percent_of_resource)
+
+    def _calc_diskspace(self, instance_type):
+        """
+        The soft:hard diskspace quota for an instance type.
+        """
+        soft = int(instance_type['local_gb'])
+
+        hard = int(instance_type['local_gb'] *
+                    FLAGS.ovz_disk_space_oversub_percent)
+
+        # Now set the increment of the limit.  I do this here so that I don't
+        # have to do this in every line above.
+        soft = '%s%s' % (soft, FLAGS.ovz_disk_space_increment)
+        hard = '%s%s' % (hard, FLAGS.ovz_disk_space_increment)
+        return '%s:%s' % (soft, hard)
+
     def _calc_pages(self, instance_memory_mb, block_size=4096):
         """
         Returns the number of pages for a given size of storage/memory
@@ -1594,11 +1645,10 @@ class OpenVzConnection(driver.ComputeDriver):
         In order to evenly distribute resources this method will calculate a
         multiplier based on memory consumption for the allocated container and
         the overall host memory. This can then be applied to the cpuunits in
-        self.utility to be passed as an argument to the self._set_cpuunits
-        method to limit cpu usage of the container to an accurate percentage of
-        the host.  This is only done on self.spawn so that later, should
-        someone choose to do so, they can adjust the container's cpu usage
-        up or down.
+        self.utility by self._calc_cpuunits to limit cpu usage of the
+        container to an accurate percentage of the host.  This is only done
+        on self.spawn so that later, should someone choose to do so, they can
+        adjust the container's cpu usage up or down.
         """
         cont_mem_mb = memory_mb / \
                       float(self.utility['MEMORY_MB'])
@@ -1710,38 +1760,285 @@ class OpenVzConnection(driver.ComputeDriver):
             LOG.error(_('Stderr output from vzcpucheck: %s') % err)
             raise exception.Error(_('Problem getting cpuunits for host'))
 
-    def _get_cpuunits_usage(self):
+
+class ContainerWatcher(object):
+    """
+    Tracks the state of the containers on this host for callers waiting on
+    a container to reach a state.  While anything is waiting a single
+    greenthread polls every container with one vzlist each
+    ovz_state_poll_interval seconds and wakes the waiters whose container
+    got there, so the cost of polling doesn't grow with the number of
+    containers being built or destroyed at once.
+    """
+    def __init__(self):
+        self.waiters = {}
+        self.states = {}
+        self._poller = None
+
+    def wait_for(self, ctid, states, on_change=None, timeout=None):
+        """
+        Block until the container ctid is in one of states, a state being
+        the status vzlist reports or None for a container that doesn't
+        exist.  on_change is called with each new state of the container
+        seen while waiting, including the first.  Returns the state reached
+        and raises exception.Error if that takes more than timeout seconds.
+        """
+        ctid = str(ctid)
+        waiter = {'states': states, 'on_change': on_change,
+                  'event': event.Event(), 'last': _UNSEEN}
+        self.waiters.setdefault(ctid, []).append(waiter)
+        if self._poller is None:
+            self._poller = greenthread.spawn(self._poll)
+        try:
+            with eventlet.Timeout(timeout, False):
+                return waiter['event'].wait()
+        finally:
+            self._remove_waiter(ctid, waiter)
+        raise exception.Error(_('Timed out waiting for container %(ctid)s '
+                                'to be %(states)s') %
+                              {'ctid': ctid, 'states': states})
+
+    def _remove_waiter(self, ctid, waiter):
+        waiters = self.waiters.get(ctid, [])
+        if waiter in waiters:
+            waiters.remove(waiter)
+        if not waiters:
+            self.waiters.pop(ctid, None)
+
+    def refresh(self):
+        """
+        Read the status of every container, wake any waiters whose container
+        has reached the state they wait for and return {ctid: status}.
+
+        I run the command:
+
+        vzlist --all -H -o ctid,status
         """
-        Use openvz tools to discover the total used processing power. This is
-        done using the vzcpucheck -v command.
+        try:
+            out, err = utils.execute('vzlist', '--all', '-H', '-o',
+                                     'ctid,status', run_as_root=True)
+            if err:
+                LOG.error(_('Stderr output from vzlist: %s') % err)
+        except ProcessExecutionError as err:
+            LOG.error(_('Stderr output from vzlist: %s') % err)
+            raise exception.Error(_('Problem listing Vzs'))
+
+        states = {}
+        for line in out.splitlines():
+            fields = line.split()
+            if len(fields) >= 2:
+                states[fields[0]] = fields[1]
+        self.states = states
+        self._dispatch()
+        return states
+
+    def _dispatch(self):
+        for ctid, waiters in self.waiters.items():
+            state = self.states.get(ctid)
+            for waiter in list(waiters):
+                if waiter['on_change'] and state != waiter['last']:
+                    waiter['last'] = state
+                    try:
+                        waiter['on_change'](state)
+                    except Exception:
+                        LOG.exception(_('Error handling state change of '
+                                        'container %s') % ctid)
+                if state in waiter['states'] and \
+                   not waiter['event'].ready():
+                    waiter['event'].send(state)
+
+    def _poll(self):
+        try:
+            while self.waiters:
+                try:
+                    self.refresh()
+                except Exception:
+                    LOG.exception(_('Failed to poll container states'))
+                greenthread.sleep(FLAGS.ovz_state_poll_interval)
+        finally:
+            self._poller = None
+
+
+_UNSEEN = object()
+CONTAINER_WATCHER = ContainerWatcher()
+
+
+class TeardownJanitor(object):
+    """
+    Runs the slow part of tearing down containers, removing what they leave
+    on disk, in the background.  Cleanups wait in a queue that
+    ovz_janitor_concurrency workers take from, so queueing one never
+    blocks the caller however busy the workers are.  A cleanup that raises
+    is queued again after a growing delay, up to ovz_janitor_max_attempts
+    times.
+    """
+    def __init__(self):
+        self.tasks = None
+        self.failed = 0
+
+    def queue(self, func, *args):
+        """Run func(*args) in the background, or now if the janitor is
+        turned off."""
+        if FLAGS.ovz_janitor_concurrency <= 0:
+            return func(*args)
+        if self.tasks is None:
+            self.tasks = queue.Queue()
+            for _i in xrange(FLAGS.ovz_janitor_concurrency):
+                greenthread.spawn_n(self._work)
+        self.tasks.put((func, args, 1))
+
+    def _work(self):
+        while True:
+            func, args, attempt = self.tasks.get()
+            try:
+                self._run(func, args, attempt)
+            finally:
+                self.tasks.task_done()
+
+    def _run(self, func, args, attempt):
+        try:
+            func(*args)
+        except Exception:
+            if attempt >= FLAGS.ovz_janitor_max_attempts:
+                self.failed += 1
+                LOG.exception(_('Giving up on %(func)s%(args)s after '
+                                '%(attempt)d attempts') %
+                              {'func': func.__name__, 'args': args,
+                               'attempt': attempt})
+                return
+            delay = FLAGS.ovz_janitor_retry_interval * attempt
+            LOG.warn(_('%(func)s%(args)s failed, retrying in %(delay)ss') %
+                     {'func': func.__name__, 'args': args, 'delay': delay})
+            greenthread.spawn_after(delay, self.tasks.put,
+                                    (func, args, attempt + 1))
+
+    def wait(self):
+        """Wait for the queued cleanups to finish."""
+        if self.tasks is not None:
+            self.tasks.join()
+
+
+TEARDOWN_JANITOR = TeardownJanitor()
+
 
+class OVZHostState(object):
+    """
+    What the host has and how much of it has been promised to containers,
+    for the compute manager to report to the schedulers with
+    update_service_capabilities.  Everything is read in one pass, with a
+    single vzlist for all the containers, and kept until it is refreshed.
+
+    Memory and disk figures are in bytes like the other drivers report
+    them, so host_memory_free and disk_available mean the same thing to
+    the scheduler filters whatever the driver.
+    """
+    VZLIST_FIELDS = ('ctid,status,vmguarpages.b,cpuunits,diskspace.s,'
+                     'physpages')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.stats = {}
+
+    def get_host_stats(self, refresh=False):
+        if refresh or not self.stats:
+            self.update_status()
+        return self.stats
+
+    def update_status(self):
+        """Read the host and container resources again."""
+        LOG.debug(_('Updating host stats'))
+        stats = {'host_hostname': socket.gethostname()}
+        stats.update(self._read_memory())
+        stats.update(self._read_containers())
+        stats.update(self._read_disk())
+        stats['cpuunits_total'] = self.connection.utility['UNITS']
+        stats['cpuunits_available'] = max(
+            stats['cpuunits_total'] - stats['cpuunits_committed'], 0)
+        stats['host_memory_uncommitted'] = max(
+            stats['host_memory_total'] - stats['host_memory_committed'], 0)
+        stats['disk_uncommitted'] = max(
+            stats['disk_total'] - stats['disk_committed'], 0)
+        self.stats = stats
+        return stats
+
+    def _read_memory(self):
+        meminfo = {}
+        with open('/proc/meminfo') as fh:
+            for line in fh:
+                fields = line.split()
+                if len(fields) >= 2:
+                    meminfo[fields[0].rstrip(':')] = int(fields[1]) * 1024
+        free = (meminfo.get('MemFree', 0) + meminfo.get('Buffers', 0) +
+                meminfo.get('Cached', 0))
+        return {'host_memory_total': meminfo.get('MemTotal', 0),
+                'host_memory_free': free}
+
+    def _read_containers(self):
+        """
         I run the command:
 
-        vzcpucheck -v
+        vzlist --all -H -o ctid,status,vmguarpages.b,cpuunits,diskspace.s,
+                            physpages
 
-        If I fail to run an exception should not be raised as this is a soft
-        error and results only in the lack of knowledge of what the current
-        cpuunit usage of each container.
+        Memory committed is what the containers are guaranteed, they may
+        burst past it up to privvmpages.  physpages is the memory they
+        actually hold.
         """
         try:
-            out, err = utils.execute('vzcpucheck', '-v', run_as_root=True)
-            LOG.debug(_('Stdout output from vzcpucheck %s') % out)
+            out, err = utils.execute('vzlist', '--all', '-H', '-o',
+                                     self.VZLIST_FIELDS, run_as_root=True)
             if err:
-                LOG.error(_('Stderr output from vzcpucheck: %s') % err)
+                LOG.error(_('Stderr output from vzlist: %s') % err)
+        except ProcessExecutionError as err:
+            LOG.error(_('Stderr output from vzlist: %s') % err)
+            raise exception.Error(_('Problem listing Vzs'))
 
-            for line in out.splitlines():
-                line = line.split()
-                if len(line) > 0:
-                    if line[0] == 'Current':
-                        LOG.debug(_('Current usage of host: %s') % line[3])
-                        self.utility['TOTAL'] = int(line[3])
-                    elif line[0].isdigit():
-                        LOG.debug(_('Usage for CTID %(id)s: %(usage)s') %
-                                {'id': line[0], 'usage': line[1]})
-                        self.utility['CTIDS'][line[0]] = line[1]
+        containers = running = 0
+        memory = rss = cpuunits = disk = 0
+        for line in out.splitlines():
+            fields = line.split()
+            if len(fields) < 6:
+                continue
+            containers += 1
+            if fields[1] == 'running':
+                running += 1
+            memory += _vzlist_number(fields[2]) * 4096
+            cpuunits += _vzlist_number(fields[3])
+            disk += _vzlist_number(fields[4]) * 1024
+            rss += _vzlist_number(fields[5]) * 4096
+        return {'containers': containers,
+                'containers_running': running,
+                'host_memory_committed': memory,
+                'host_memory_rss': rss,
+                'cpuunits_committed': cpuunits,
+                'disk_committed': disk}
+
+    def _read_disk(self):
+        vfs = os.statvfs(FLAGS.ovz_ve_private_dir)
+        total = vfs.f_blocks * vfs.f_frsize
+        available = vfs.f_bavail * vfs.f_frsize
+        return {'disk_total': total,
+                'disk_used': total - vfs.f_bfree * vfs.f_frsize,
+                'disk_available': available}
+
+
+# vzlist shows unlimited beancounters as LONG_MAX.
+_VZ_UNLIMITED = 9223372036854775807
+
+
+def _vzlist_number(value):
+    """
+    A number from vzlist output, 0 for values that are unset ('-') or
+    unlimited.
+    """
+    try:
+        value = int(value)
+    except ValueError:
+        return 0
+    if value >= _VZ_UNLIMITED:
+        return 0
+    return value
 
-        except ProcessExecutionError as err:
-            LOG.error(_('Stderr output from vzcpucheck: %s') % err)
 
 class OVZFile(object):
     """
@@ -2230,6 +2527,126 @@ class OVZVolumes(object):
         self.umountfh.set_permissions(755)
 
 
+class OVZMountScripts(object):
+    """
+    Builds the CTID.mount and CTID.umount scripts for all of a container's
+    volumes in one pass.  OVZVolumes edits the scripts a volume at a time,
+    touching, chmoding and rewriting both of them for each one.  Here each
+    script is read once, the lines for every volume are merged in and the
+    finished script is moved into place with a rename so vzctl never sees a
+    half written one.
+    """
+    def __init__(self, instance_id):
+        self.instance_id = instance_id
+        self.mountfile = os.path.abspath('%s/%s.mount' %
+                                         (FLAGS.ovz_config_dir, instance_id))
+        self.umountfile = os.path.abspath('%s/%s.umount' %
+                                          (FLAGS.ovz_config_dir, instance_id))
+        self.mounts = []
+        self.umounts = []
+        self.mount_points = []
+
+    def add(self, mount, device=None, uuid=None):
+        """
+        Add the mount and umount lines and the mount points of the volume
+        with the given device or filesystem uuid mounted at mount.
+        """
+        mountfh = OVZMountFile(self.mountfile, mount, self.instance_id,
+                               device, uuid)
+        umountfh = OVZUmountFile(self.umountfile, mount, self.instance_id,
+                                 device, uuid)
+        self.mounts.append(mountfh.host_mount_line())
+        self.mounts.append(mountfh.container_mount_line())
+        self.umounts.append(umountfh.container_umount_line())
+        self.umounts.append(umountfh.host_umount_line())
+        self.mount_points.append(mountfh.host_mount)
+        self.mount_points.append(mountfh.container_mount)
+
+    def scripts(self):
+        """
+        Return a dict of script filename to the lines it should contain.
+        """
+        return {self.mountfile: self._merge(self.mountfile, self.mounts),
+                self.umountfile: self._merge(self.umountfile, self.umounts)}
+
+    @staticmethod
+    def _merge(filename, lines):
+        """
+        The current lines of filename, if it exists, followed by the lines
+        it doesn't already have, under the shell script header vzctl
+        requires.
+        """
+        script = OVZFile(filename)
+        if os.path.exists(filename):
+            script.read()
+        merged = [line.rstrip('\n') for line in script.contents]
+        if not merged or merged[0] != '#!/bin/sh':
+            merged.insert(0, '#!/bin/sh')
+        present = set(merged)
+        for line in lines:
+            if line not in present:
+                present.add(line)
+                merged.append(line)
+        return merged
+
+    def make_mount_points(self):
+        """
+        Create the host and container mount points that don't exist yet
+        with a single command:
+
+        mkdir -p <path> [...]
+        """
+        missing = []
+        for path in self.mount_points:
+            if path not in missing and not os.path.exists(path):
+                missing.append(path)
+        if missing:
+            self._execute('mkdir', '-p', *missing)
+
+    def write(self):
+        """
+        Create the mount points and replace both scripts.  The scripts are
+        staged locally, copied next to their destination with one cp and
+        renamed over it with mv, which runs:
+
+        cp -f <staging>/CTID.mount.new <staging>/CTID.umount.new <conf dir>
+        mv -f <conf dir>/CTID.mount.new <conf dir>/CTID.mount
+        mv -f <conf dir>/CTID.umount.new <conf dir>/CTID.umount
+        """
+        self.make_mount_points()
+        scripts = sorted(self.scripts().items())
+        staging = tempfile.mkdtemp()
+        try:
+            staged = []
+            for filename, lines in scripts:
+                path = os.path.join(staging,
+                                    '%s.new' % os.path.basename(filename))
+                with open(path, 'w') as fh:
+                    fh.write('\n'.join(lines) + '\n')
+                os.chmod(path, 0755)
+                staged.append(path)
+            self._execute('cp', '-f', *(staged +
+                                        [os.path.dirname(self.mountfile)]))
+            for filename, lines in scripts:
+                self._execute('mv', '-f', '%s.new' % filename, filename)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    @staticmethod
+    def _execute(*cmd):
+        try:
+            out, err = utils.execute(*cmd, run_as_root=True)
+            LOG.debug(_('Stdout output from %(cmd)s: %(out)s') %
+                      {'cmd': cmd[0], 'out': out})
+            if err:
+                LOG.error(_('Stderr output from %(cmd)s: %(err)s') %
+                          {'cmd': cmd[0], 'err': err})
+        except ProcessExecutionError as err:
+            LOG.error(_('Stderr output from %(cmd)s: %(err)s') %
+                      {'cmd': cmd[0], 'err': err})
+            raise exception.Error(_('Failed to run: "%s"') % ' '.join(cmd))
+
+
 class OVZNetworkBridgeDriver(VIFDriver):
     """
     VIF driver for a Linux Bridge
@@ -110,6 +110,8 @@ class APIRouter(wsgi.Router):
                                   controller=hosts.create_resource()) as m:
                 m.connect("", action="index",
                           conditions=dict(method=["GET"]))
+                m.connect("/capacity", action="capacity",
+                          conditions=dict(method=["GET"]))
                 m.connect("/{id}", action="show",
                           conditions=dict(method=["GET"]))
 
@@ -133,6 +135,10 @@ class APIRouter(wsgi.Router):
                             controller=management.create_resource(),
                             action="root_enabled_history", conditions=dict(method=["GET"]))
 
+            mapper.connect("/{project_id}/mgmt/instances/{id}/timeline",
+                            controller=management.create_resource(),
+                            action="timeline", conditions=dict(method=["GET"]))
+
             mapper.connect("/{project_id}/mgmt/storage",
                             controller=storage.create_resource(),
                             action="index", conditions=dict(method=["GET"]))
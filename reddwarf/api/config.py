@@ -24,6 +24,7 @@ from reddwarf import exception
 from reddwarf.api import common
 from reddwarf.api import deserializer
 from reddwarf.db import api as dbapi
+from reddwarf.db import config as config_cache
 
 
 LOG = logging.getLogger('reddwarf.api.config')
@@ -68,7 +69,9 @@ class Controller(object):
         """ Deletes a config entry"""
         LOG.info("Delete config entry %s" % id)
         LOG.debug("%s - %s", req.environ, req.body)
+        self._validate_key(id)
         dbapi.config_delete(id)
+        config_cache.invalidate()
         return exc.HTTPOk()
 
     @common.verify_admin_context
@@ -84,6 +87,8 @@ class Controller(object):
                                     config.get('description', None))
         except exception.DuplicateConfigEntry as dce:
             raise exception.InstanceFault(dce._error_string)
+        finally:
+            config_cache.invalidate()
         return exc.HTTPOk()
 
     @common.verify_admin_context
@@ -91,10 +96,12 @@ class Controller(object):
         """Update an existing config entry"""
         LOG.info("Update config entry %s" % id)
         LOG.debug("%s - %s", req.environ, req.body)
+        self._validate_key(id)
         self._validate_update(body)
         config = body['config']
         dbapi.config_update(config.get('key'), config.get('value', None),
                             config.get('description', None))
+        config_cache.invalidate()
         return exc.HTTPOk()
 
     def _validate(self, body):
@@ -102,6 +109,12 @@ class Controller(object):
         if not body:
             raise exception.BadRequest("The request contains an empty body")
 
+    def _validate_key(self, key):
+        """Keep the version the config cache is invalidated by out of reach
+        of the API"""
+        if key == dbapi.CONFIG_VERSION_KEY:
+            raise exception.BadRequest("Configuration %s is reserved" % key)
+
     def _validate_create(self, body):
         self._validate(body)
         if not body.get('configs', ''):
@@ -111,6 +124,7 @@ class Controller(object):
             if not config.get('key'):
                 raise exception.BadRequest("Required attribute/key 'key' was "
                                            "not specified")
+            self._validate_key(config['key'])
 
     def _validate_update(self, body):
         self._validate(body)
@@ -121,6 +135,7 @@ class Controller(object):
         if not config.get('key'):
                 raise exception.BadRequest("Required attribute/key 'key' was "
                                            "not specified")
+        self._validate_key(config['key'])
 
 
 def create_resource(version='1.0'):
@@ -13,9 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+import urllib
+
 from nova import exception as nova_exception
 from nova import flags
 from nova import log as logging
+from nova.api.openstack import common as nova_common
 from nova.api.openstack import wsgi
 from nova.db.sqlalchemy.api import service_get_all_compute_sorted
 
@@ -29,12 +33,16 @@ LOG.setLevel(logging.DEBUG)
 
 
 FLAGS = flags.FLAGS
+flags.DEFINE_integer('host_capacity_cache_ttl', 15,
+                     'Seconds the host capacity summary is cached for')
 
 
 class Controller(object):
     """ The Host Management Controller for the Platform API """
 
     def __init__(self):
+        self.capacity_cache = None
+        self.capacity_expires = 0
         super(Controller, self).__init__()
 
     @common.verify_admin_context
@@ -60,21 +68,61 @@ class Controller(object):
             LOG.info("List the info on nova-compute '%s'" % id)
             LOG.debug("%s - %s", req.environ, req.body)
             ctxt = req.environ['nova.context']
-            instances = dbapi.show_instances_on_host(ctxt, id)
+            params = nova_common.get_pagination_params(req)
+            limit = min(params.get('limit') or FLAGS.osapi_max_limit,
+                        FLAGS.osapi_max_limit)
+            instances = dbapi.show_instances_on_host(ctxt, id,
+                                                     params.get('marker'),
+                                                     limit)
             instances = [{'id': c.id,
                           'name': c.display_description,
                           'status': c.vm_state} for c in instances]
             total_ram = FLAGS.max_instance_memory_mb
             used_ram = dbapi.instance_get_memory_sum_by_host(ctxt, id)
             percent = int(round((used_ram / total_ram) * 100))
-            return {'host': {'name': id,
-                             'percentUsed': percent,
-                             'totalRAM': total_ram,
-                             'usedRAM': int(used_ram),
-                             'instances': instances}}
+            host = {'name': id,
+                    'percentUsed': percent,
+                    'totalRAM': total_ram,
+                    'usedRAM': int(used_ram),
+                    'instances': instances}
+            # A full page may not be the last one, point at the next.
+            if instances and len(instances) == limit:
+                query = urllib.urlencode([('limit', limit),
+                                          ('marker', instances[-1]['id'])])
+                host['links'] = [{'rel': 'next',
+                                  'href': "%s?%s" % (req.path_url, query)}]
+            return {'host': host}
         except nova_exception.HostNotFound:
             raise exception.NotFound()
 
+    @common.verify_admin_context
+    def capacity(self, req):
+        """Summarize the instances, memory and volume usage of every host"""
+        LOG.info("Get the capacity of all the nova-compute hosts")
+        LOG.debug("%s - %s", req.environ, req.body)
+        ctxt = req.environ['nova.context']
+        now = time.time()
+        if self.capacity_expires > now:
+            return {'hosts': self.capacity_cache}
+        services = service_get_all_compute_sorted(ctxt)
+        summary = dbapi.host_capacity_summary(ctxt)
+        total_ram = FLAGS.max_instance_memory_mb
+        hosts = []
+        for service, _count in services:
+            usage = summary.get(service.host, {})
+            used_ram = usage.get('memory_mb', 0)
+            hosts.append({'name': service.host,
+                          'instanceCount': usage.get('instance_count', 0),
+                          'percentUsed': int(round(
+                              (float(used_ram) / total_ram) * 100)),
+                          'totalRAM': total_ram,
+                          'usedRAM': used_ram,
+                          'usedVolumeGB': usage.get('volume_gb', 0),
+                          'states': usage.get('states', {})})
+        self.capacity_cache = hosts
+        self.capacity_expires = now + FLAGS.host_capacity_cache_ttl
+        return {'hosts': hosts}
+
 
 def create_resource(version='1.0'):
     controller = {
@@ -84,8 +132,9 @@ def create_resource(version='1.0'):
     metadata = {
         'attributes': {
             'host': ['name', 'instanceCount', 'percentUsed',
-                     'totalRAM', 'usedRAM'],
+                     'totalRAM', 'usedRAM', 'usedVolumeGB'],
             'instance': ['id', 'name', 'status'],
+            'link': ['rel', 'href'],
         },
     }
 
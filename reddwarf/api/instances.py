@@ -36,6 +36,7 @@ from nova.notifier import api as notifier
 
 from reddwarf import compute
 from reddwarf import exception
+from reddwarf import trace
 from reddwarf import volume
 from reddwarf.api import common
 from reddwarf.api import deserializer
@@ -43,6 +44,7 @@ from reddwarf.api.status import InstanceStatus
 from reddwarf.api.status import InstanceStatusLookup
 from reddwarf.api.views import instances
 from reddwarf.db import api as dbapi
+from reddwarf.db import config
 from reddwarf.guest import api as guest_api
 
 
@@ -301,23 +303,34 @@ class Controller(object):
 
         context = req.environ['nova.context']
 
-        # Create the Volume before hand
-        volume_ref = self.create_volume(context, body)
-        # Setup Security groups
-        self._setup_security_groups(context,
-                                    FLAGS.default_firewall_rule_name,
-                                    FLAGS.default_guest_mysql_port)
-
-        server = self._create_server_dict(body['instance'],
-                                          volume_ref['id'],
-                                          FLAGS.reddwarf_mysql_data_dir)
-
-        # Add any extra data that's required by the servers api
-        server_req_body = {'server':server}
-        server_resp = self._try_create_server(req, server_req_body)
-        instance_id = str(server_resp['server']['uuid'])
-        local_id = server_resp['server']['id']
-        dbapi.guest_status_create(str(local_id))
+        # The build's trace starts here, the instance id is only known once
+        # the server is created.
+        with trace.span(context, 'api.create') as create_span:
+            # Create the Volume before hand
+            volume_ref = self.create_volume(context, body)
+            # Setup Security groups
+            self._setup_security_groups(context,
+                                        FLAGS.default_firewall_rule_name,
+                                        FLAGS.default_guest_mysql_port)
+
+            server = self._create_server_dict(body['instance'],
+                                              volume_ref['id'],
+                                              FLAGS.reddwarf_mysql_data_dir)
+
+            # Add any extra data that's required by the servers api
+            server_req_body = {'server':server}
+            server_resp = self._try_create_server(req, server_req_body)
+            instance_id = str(server_resp['server']['uuid'])
+            local_id = server_resp['server']['id']
+            create_span.instance_id = local_id
+            dbapi.guest_status_create(str(local_id))
+            try:
+                self.guest_api.create_queue(context, local_id)
+            except Exception as e:
+                # The prepare cast declares the queue too, so this isn't
+                # fatal.
+                LOG.error("Could not declare the guest queue for instance "
+                          "%s: %s" % (local_id, e))
 
         status_lookup = InstanceStatusLookup([local_id])
         instance = self.view.build_single(server_resp['server'], req,
@@ -373,7 +386,7 @@ class Controller(object):
         # Append additional stuff to create.
         # Add image_ref
         try:
-            server['imageRef'] = dbapi.config_get("reddwarf_imageref").value
+            server['imageRef'] = config.get("reddwarf_imageref")
         except exception.ConfigNotFound:
             msg = "Cannot find the reddwarf_imageref config value, " \
                   "using default of 1"
@@ -437,8 +450,9 @@ class Controller(object):
         root_enabled = None
         volume_info = None
         try:
-            root_enabled = self.guest_api.is_root_enabled(context, id)
-            volume_info = self.guest_api.get_volume_info(context, id)
+            guest_info = self.guest_api.describe(context, id)
+            root_enabled = guest_info['root_enabled']
+            volume_info = guest_info['volume_info']
         except Exception as err:
             LOG.error(err)
             LOG.error("Guest not responding on instance %s" % id)
@@ -87,6 +87,18 @@ def create_resource(version='1.0'):
                 'root_enabled_history': ['id',
                                          'root_enabled_at',
                                          'root_enabled_by'],
+                'timeline': ['id',
+                             'started',
+                             'finished',
+                             'duration',
+                             'slowest'],
+                'span': ['name',
+                         'trace_id',
+                         'host',
+                         'started',
+                         'offset',
+                         'duration',
+                         'failed'],
             },
     }
 
@@ -133,8 +145,9 @@ class Controller(object):
             LOG.error("Could not find an instance with id %s" % id)
             raise exception.NotFound("No instance with id %s" % id)
 
-        # Lookup additional volume information
-        volume_info = self.guest_api.get_volume_info(context, server['id'])
+        # Lookup the volume, database and user information in one go
+        guest_info = self.guest_api.describe(context, instance_id)
+        volume_info = guest_info['volume_info']
 
         status_lookup = InstanceStatusLookup([instance_id])
         instance = self.instance_view.build_mgmt_single(server,
@@ -145,7 +158,7 @@ class Controller(object):
         try:
             status = status_lookup.get_status_from_server(server)
             instance = self._get_guest_info(context, instance_id, status,
-                                            instance)
+                                            instance, guest_info)
 
         except Exception as err:
             msg = "Unable to retrieve information from the guest"
@@ -209,12 +222,14 @@ class Controller(object):
 
         return {"instances": result}
 
-    def _get_guest_info(self, context, id, status, instance):
+    def _get_guest_info(self, context, id, status, instance, guest_info=None):
         """Get all the guest details and add it to the response"""
         dbs = []
         users = []
         if status.is_sql_running:
-            db_list = self.guest_api.list_databases(context, id)
+            if guest_info is None:
+                guest_info = self.guest_api.describe(context, id)
+            db_list = guest_info['databases'] or []
 
             LOG.debug("DBS: %r" % db_list)
             dbs = [{
@@ -222,7 +237,7 @@ class Controller(object):
                     'collate': db['_collate'],
                     'character_set': db['_character_set']
                     } for db in db_list]
-            users = self.guest_api.list_users(context, id)
+            users = guest_info['users'] or []
             users = [{'name': user['_name']} for user in users]
 
         root_access = dbapi.get_root_enabled_history(context, id)
@@ -249,6 +264,18 @@ class Controller(object):
             LOG.error(err)
             raise exception.InstanceFault("Error determining root access history")
 
+    @common.verify_admin_context
+    def timeline(self, req, id):
+        """ Returns the recorded phases of the instance's build, to show
+            where the time creating it went. """
+        LOG.info("Call to timeline for instance %s", id)
+        LOG.debug("%s - %s", req.environ, req.body)
+        ctxt = req.environ['nova.context']
+        local_id = dbapi.localid_from_uuid(id)
+        common.instance_exists(ctxt, id, self.compute_api)
+        spans = dbapi.trace_span_get_all_by_instance(local_id)
+        return {'timeline': self.instance_view.build_timeline(id, spans)}
+
     @common.verify_admin_context
     def action(self, req, id, body):
         """Multi-purpose method used to take actions on an instance."""
@@ -111,7 +111,7 @@ class InstanceStatusLookup(object):
     """
     def __init__(self, guest_ids):
         self.local_ids = guest_ids
-        lookup = dbapi.guest_status_get_list(self.local_ids).all()
+        lookup = dbapi.guest_status_get_list(self.local_ids)
         self.guest_status_mapping = dict([(r.instance_id, r) for r in lookup])
 
     def get_status_from_id(self, context, id):
@@ -40,6 +40,12 @@ def _to_gb(bytes):
     return bytes/1024.0**3
 
 
+def _seconds(delta):
+    """A timedelta in seconds, fractions included."""
+    return (delta.days * 86400 + delta.seconds +
+            delta.microseconds / 1000000.0)
+
+
 class ViewBuilder(object):
     """Views for an instance"""
 
@@ -138,6 +144,9 @@ class ViewBuilder(object):
 class MgmtViewBuilder(ViewBuilder):
     """Management views for an instance"""
 
+    # Phases that only wrap the others, never the slowest phase themselves.
+    WRAPPER_SPANS = ('api.create', 'compute.run_instance')
+
     def __init__(self):
         super(MgmtViewBuilder, self).__init__()
 
@@ -176,6 +185,34 @@ class MgmtViewBuilder(ViewBuilder):
                     'root_enabled_by': 'Nobody'
                    }
 
+    def build_timeline(self, id, spans):
+        """Lay out the recorded build phases of an instance in the order
+        they started, with their offsets from the start of the build."""
+        if not spans:
+            return {'id': id, 'spans': []}
+        started = spans[0].started_at
+        timeline = []
+        for span in spans:
+            offset = span.started_at - started
+            timeline.append({
+                'name': span.name,
+                'trace_id': span.trace_id,
+                'host': span.host,
+                'started': span.started_at,
+                'offset': _seconds(offset),
+                'duration': span.duration,
+                'failed': span.failed})
+        finished = max(span.finished_at for span in spans)
+        phases = [span for span in spans
+                  if span.name not in self.WRAPPER_SPANS] or spans
+        slowest = max(phases, key=lambda span: span.duration)
+        return {'id': id,
+                'started': started,
+                'finished': finished,
+                'duration': _seconds(finished - started),
+                'slowest': slowest.name,
+                'spans': timeline}
+
     @staticmethod
     def _build_server_details(server, instance):
         """Build more information from the servers api"""
@@ -0,0 +1,30 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2011 Openstack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import flags
+
+flags.DEFINE_string('status_collector_topic', 'status_collector',
+                    'the topic the status collector listens on')
+flags.DEFINE_float('status_collector_interval', 5.0,
+                   'Seconds between writes of the collected guest statuses.')
+flags.DEFINE_integer('status_collector_batch_size', 500,
+                     'Maximum number of guest statuses written in one '
+                     'statement.')
+flags.DEFINE_integer('status_collector_max_pending', 20000,
+                     'Maximum number of guests with an unwritten status. '
+                     'Reports from further guests are dropped until the '
+                     'next write catches up.')
@@ -0,0 +1,47 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2011 Openstack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Handles all requests to the guest status collector.
+"""
+
+from nova import flags
+from nova import log as logging
+from nova import rpc
+from nova.db import base
+
+from reddwarf import collector # import for flag values
+
+FLAGS = flags.FLAGS
+
+LOG = logging.getLogger('reddwarf.collector.api')
+
+
+class API(base.Base):
+    """API for reporting guest statuses to the status collector."""
+
+    def __init__(self, **kwargs):
+        super(API, self).__init__(**kwargs)
+
+    def report_status(self, context, instance_id, status):
+        """Make an asynchronous call to record the guest's status."""
+        LOG.debug("Reporting status %s for instance %s"
+                  % (status.description, instance_id))
+        rpc.cast(context, FLAGS.status_collector_topic,
+                 {'method': 'report_status',
+                  'args': {'instance_id': instance_id,
+                           'code': status.code}})
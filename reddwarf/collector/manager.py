@@ -0,0 +1,106 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2011 Openstack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Status collector manager.
+
+Guests report their status here instead of writing it to the database
+themselves.  Reports are kept in memory, the latest one per guest winning,
+and written out every ``status_collector_interval`` seconds in batches, so
+the database sees a fixed number of connections and writes no matter how
+many guests there are.
+"""
+
+import time
+
+from nova import flags
+from nova import log as logging
+from nova import utils
+from nova.manager import Manager
+
+from reddwarf import collector # import for flag values
+from reddwarf.db import api as dbapi
+from reddwarf.guest.status import GuestStatus
+
+FLAGS = flags.FLAGS
+
+LOG = logging.getLogger('reddwarf.collector.manager')
+
+
+class StatusCollectorManager(Manager):
+    """Collects guest statuses and writes them to the database in batches."""
+
+    def __init__(self, *args, **kwargs):
+        self.pending = {}
+        self.flush_timer = None
+        self.reset_metrics()
+        super(StatusCollectorManager, self).__init__(*args, **kwargs)
+
+    def init_host(self):
+        self.flush_timer = utils.LoopingCall(self.flush)
+        self.flush_timer.start(FLAGS.status_collector_interval, now=False)
+
+    def reset_metrics(self):
+        self.metrics = {'received': 0,
+                        'coalesced': 0,
+                        'dropped': 0,
+                        'written': 0,
+                        'failed': 0}
+
+    def report_status(self, context, instance_id, code):
+        """Record the latest status of a guest until the next write."""
+        self.metrics['received'] += 1
+        if instance_id in self.pending:
+            self.metrics['coalesced'] += 1
+        elif len(self.pending) >= FLAGS.status_collector_max_pending:
+            # The writes are falling behind; the guest reports again on
+            # its next heartbeat.
+            self.metrics['dropped'] += 1
+            return
+        self.pending[instance_id] = code
+
+    def flush(self):
+        """Write the pending statuses out and log the interval's metrics."""
+        pending, self.pending = self.pending, {}
+        start = time.time()
+        items = pending.items()
+        batch_size = FLAGS.status_collector_batch_size
+        for i in range(0, len(items), batch_size):
+            batch = items[i:i + batch_size]
+            try:
+                dbapi.guest_status_update_many(
+                    [(instance_id, GuestStatus.from_code(code))
+                     for instance_id, code in batch])
+                self.metrics['written'] += len(batch)
+            except Exception:
+                LOG.exception(_("Error writing %d guest statuses.")
+                              % len(batch))
+                self.metrics['failed'] += len(batch)
+                # Keep them for the next write unless a newer report has
+                # arrived in the meantime.
+                for instance_id, code in batch:
+                    self.pending.setdefault(instance_id, code)
+        metrics = self.metrics
+        self.reset_metrics()
+        if metrics['received'] or metrics['failed']:
+            LOG.info(_("Status collector: %(received)d reports, "
+                       "%(coalesced)d coalesced, %(dropped)d dropped, "
+                       "%(written)d written, %(failed)d failed in "
+                       "%(elapsed).3fs, %(pending)d pending")
+                     % dict(metrics, elapsed=time.time() - start,
+                            pending=len(self.pending)))
+        return metrics
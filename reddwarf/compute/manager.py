@@ -35,6 +35,7 @@ from nova.rpc.common import RemoteError
 from nova.volume import api as volume_api
 
 from reddwarf import guest
+from reddwarf import trace
 from reddwarf.db import api as dbapi
 from reddwarf import exception
 from reddwarf.guest import status as guest_status
@@ -352,17 +353,30 @@ class ReddwarfComputeManager(ComputeManager):
         this is the only way to make sure the extra provisioning actions
         occur when the REST API is called.
 
+        Each step is recorded as a phase of the build's trace.
+
         """
-        metadata = ReddwarfInstanceMetaData(self.db, context, instance_id)
-        instance = ReddwarfInstanceInitializer(self.compute_manager, self.db,
-            context, instance_id, metadata.volume_id, metadata.volume,
-            metadata.volume_mount_point, metadata.databases, metadata.users)
-        # If any steps return False, cancel subsequent steps.
-        (instance.initialize_volume(self.volume_api,
-                                    self.volume_client, self.host) and
-         instance.initialize_guest(self.guest_api) and
-         instance.initialize_compute_instance(**kwargs) and
-         instance.wait_for_guest(self.guest_api))
+        def run_phase(name, step, *args, **kwargs):
+            with trace.span(context, name, instance_id) as phase:
+                phase.failed = not step(*args, **kwargs)
+            return not phase.failed
+
+        with trace.span(context, 'compute.run_instance', instance_id) as build:
+            metadata = ReddwarfInstanceMetaData(self.db, context, instance_id)
+            instance = ReddwarfInstanceInitializer(self.compute_manager,
+                self.db, context, instance_id, metadata.volume_id,
+                metadata.volume, metadata.volume_mount_point,
+                metadata.databases, metadata.users)
+            # If any steps return False, cancel subsequent steps.
+            build.failed = not (
+                run_phase('compute.volume', instance.initialize_volume,
+                          self.volume_api, self.volume_client, self.host) and
+                run_phase('compute.guest_prepare', instance.initialize_guest,
+                          self.guest_api) and
+                run_phase('compute.spawn',
+                          instance.initialize_compute_instance, **kwargs) and
+                run_phase('compute.wait_for_guest', instance.wait_for_guest,
+                          self.guest_api))
 
     def terminate_instance(self, context, instance_id):
         """Terminate the instance and also delete all the attached volumes"""
@@ -17,11 +17,17 @@ API Interface for reddwarf datastore operations
 """
 
 import datetime
+import functools
+import uuid
 
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.sql import and_
+from sqlalchemy.sql import bindparam
 from sqlalchemy.sql import func
+from sqlalchemy.sql import or_
+from sqlalchemy.sql import select
 from sqlalchemy.sql import text
 
 from nova import exception as nova_exception
@@ -37,6 +43,8 @@ from nova.db.sqlalchemy.models import Instance
 from nova.db.sqlalchemy.models import InstanceTypes
 from nova.db.sqlalchemy.models import Service
 from nova.db.sqlalchemy.models import Volume
+from nova.db.sqlalchemy.session import get_reader_session
+from nova.db.sqlalchemy.session import get_replica_session
 from nova.db.sqlalchemy.session import get_session
 from nova.compute import power_state
 
@@ -47,6 +55,22 @@ from reddwarf.guest.status import GuestStatus
 FLAGS = flags.FLAGS
 LOG = logging.getLogger('reddwarf.db.api')
 
+CONFIG_VERSION_KEY = 'reddwarf_config_version'
+
+def read_from_replica(f):
+    """Run a read only helper on the read replica.
+
+    Callers that must see their own writes pass in their own session,
+    which is used as is.
+    """
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        if kwargs.get('session') is None:
+            kwargs['session'] = get_replica_session()
+        return f(*args, **kwargs)
+    return wrapper
+
+
 def guest_status_create(instance_id):
     """Create a new guest status for the instance
 
@@ -71,30 +95,27 @@ def guest_status_get(instance_id, session=None):
     :param session: pass in a active session if available
     """
     if not session:
-        session = get_session()
-    result = session.query(models.GuestStatus).\
-                         filter_by(instance_id=instance_id).\
-                         filter_by(deleted=False).\
-                         first()
+        session = get_reader_session()
+    result = _guest_status_execute(session, 'get',
+                                   {'id': instance_id}).first()
     if not result:
         raise nova_exception.InstanceNotFound(instance_id=instance_id)
     return result
 
+@read_from_replica
 def guest_status_get_list(instance_ids, session=None):
     """Get the status of the given guests
 
     :param instance_ids: list of instance ids for the guests
     :param session: pass in a active session if available
     """
-    if not session:
-        session = get_session()
-    ids = [str(id) for id in instance_ids]
-    result = session.query(models.GuestStatus).\
-                         filter(models.GuestStatus.instance_id.in_(ids)).\
-                         filter_by(deleted=False)
-    if not result:
-        raise nova_exception.InstanceNotFound(instance_id=instance_ids)
-    return result
+    if not instance_ids:
+        return []
+    ids = [int(id) for id in instance_ids]
+    query = select([_GUEST_STATUS]).\
+                   where(_GUEST_STATUS.c.instance_id.in_(ids)).\
+                   where(_GUEST_STATUS.c.deleted == False)
+    return session.execute(query).fetchall()
 
 def guest_status_update(instance_id, status):
     """Update the state of the guest with one of the valid states
@@ -104,12 +125,24 @@ def guest_status_update(instance_id, status):
     :param state: state id
     :param description: description of the state
     """
-    session = get_session()
-    with session.begin():
-        session.query(models.GuestStatus).\
-                filter_by(instance_id=instance_id).\
-                update({'state': status.code,
-                        'state_description': status.description})
+    _guest_status_execute(get_session(), 'update',
+                          {'id': instance_id,
+                           'state': status.code,
+                           'state_description': status.description})
+
+
+def guest_status_update_many(statuses):
+    """Update the state of several guests in one round trip
+
+    :param statuses: list of (instance id, status) pairs
+    """
+    if not statuses:
+        return
+    _guest_status_execute(get_session(), 'update',
+                          [{'id': instance_id,
+                            'state': status.code,
+                            'state_description': status.description}
+                           for instance_id, status in statuses])
 
 
 def guest_status_delete(instance_id):
@@ -118,20 +151,56 @@ def guest_status_delete(instance_id):
     :param instance_id: instance id for the guest
     """
     state = power_state.SHUTDOWN
-    session = get_session()
-    with session.begin():
-        session.query(models.GuestStatus).\
-                filter_by(instance_id=instance_id).\
-                update({'deleted': True,
-                        'deleted_at': datetime.datetime.utcnow(),
-                        'state': state,
-                        'state_description': power_state.name(state)})
+    _guest_status_execute(get_session(), 'delete',
+                          {'id': instance_id,
+                           'deleted_at': datetime.datetime.utcnow(),
+                           'state': state,
+                           'state_description': power_state.name(state)})
+
+
+# guest_status is read and written more than any other table, so its
+# statements are built and compiled once and executed on the engine
+# directly, skipping the ORM.
+_GUEST_STATUS = models.GuestStatus.__table__
+_GUEST_STATUS_STATEMENTS = {
+    'get': select([_GUEST_STATUS]).\
+               where(and_(_GUEST_STATUS.c.instance_id == bindparam('id'),
+                          _GUEST_STATUS.c.deleted == False)),
+    'update': _GUEST_STATUS.update().\
+               where(_GUEST_STATUS.c.instance_id == bindparam('id')).\
+               values(state=bindparam('state'),
+                      state_description=bindparam('state_description')),
+    'delete': _GUEST_STATUS.update().\
+               where(_GUEST_STATUS.c.instance_id == bindparam('id')).\
+               values(deleted=True,
+                      deleted_at=bindparam('deleted_at'),
+                      state=bindparam('state'),
+                      state_description=bindparam('state_description')),
+}
+_GUEST_STATUS_COMPILED = {}
+
+
+def _guest_status_execute(session, name, params):
+    """Run a prebuilt guest status statement on the session, compiling it
+    the first time it is used with the session's engine.  A list of params
+    runs it once for each with executemany."""
+    engine = session.bind
+    compiled = _GUEST_STATUS_COMPILED.get((name, engine))
+    if compiled is None:
+        compiled = _GUEST_STATUS_STATEMENTS[name].compile(bind=engine)
+        _GUEST_STATUS_COMPILED[(name, engine)] = compiled
+    return session.execute(compiled, params)
 
 @require_admin_context
-def show_instances_on_host(context, id):
-    """Show all the instances that are on the given host id."""
+@read_from_replica
+def show_instances_on_host(context, id, marker=None, limit=None,
+                           session=None):
+    """Show the instances that are on the given host id.
+
+    :param marker: only list instances with an id greater than this
+    :param limit: list at most this many instances, ordered by id
+    """
     LOG.debug("show_instances_on_host id = %s" % str(id))
-    session = get_session()
     with session.begin():
         count = session.query(Service).\
                         filter_by(host=id).\
@@ -139,14 +208,60 @@ def show_instances_on_host(context, id):
                         filter_by(disabled=False).count()
         if not count:
             raise nova_exception.HostNotFound(host=id)
-        result = session.query(Instance).\
+        query = session.query(Instance).\
                         filter_by(host=id).\
-                        filter_by(deleted=False).all()
+                        filter_by(deleted=False).\
+                        order_by(Instance.id)
+        if marker is not None:
+            query = query.filter(Instance.id > marker)
+        if limit is not None:
+            query = query.limit(limit)
+        result = query.all()
     return result
 
 @require_admin_context
-def instances_mgmt_index(context, deleted=None):
-    session = get_session()
+@read_from_replica
+def host_capacity_summary(context, session=None):
+    """Returns the instance count, memory, volume size and instance count
+    by state for every host, all from one grouped query.
+
+    :returns: dict of host name to a dict with the keys instance_count,
+              memory_mb, volume_gb and states
+    """
+    volumes = session.query(Volume.instance_id,
+                            func.sum(Volume.size).label('size')).\
+                      filter_by(deleted=False).\
+                      filter(Volume.instance_id != None).\
+                      group_by(Volume.instance_id).\
+                      subquery()
+    rows = session.query(Instance.host,
+                         Instance.vm_state,
+                         func.count(Instance.id),
+                         func.sum(Instance.memory_mb),
+                         func.sum(func.coalesce(volumes.c.size, 0))).\
+                   outerjoin((volumes, volumes.c.instance_id == Instance.id)).\
+                   filter(Instance.deleted == False).\
+                   filter(Instance.host != None).\
+                   group_by(Instance.host, Instance.vm_state).\
+                   all()
+    summary = {}
+    for host, state, count, memory_mb, volume_gb in rows:
+        host_summary = summary.setdefault(host, {'instance_count': 0,
+                                                 'memory_mb': 0,
+                                                 'volume_gb': 0,
+                                                 'states': {}})
+        host_summary['instance_count'] += int(count)
+        host_summary['memory_mb'] += int(memory_mb or 0)
+        host_summary['volume_gb'] += int(volume_gb or 0)
+        # Instances without a vm_state are counted as NOSTATE rather than
+        # under a None key.
+        state = state or power_state.name(power_state.NOSTATE)
+        host_summary['states'][state] = int(count)
+    return summary
+
+@require_admin_context
+@read_from_replica
+def instances_mgmt_index(context, deleted=None, session=None):
     instances = session.query(Instance)
     if deleted is not None:
         instances = instances.filter_by(deleted=deleted)
@@ -180,7 +295,7 @@ def instance_get_by_state_and_updated_before(context, state, time):
 
 @require_admin_context
 def instance_get_memory_sum_by_host(context, hostname):
-    session = get_session()
+    session = get_reader_session()
     result = session.query(Instance).\
                       filter_by(host=hostname).\
                       filter_by(deleted=False).\
@@ -190,12 +305,12 @@ def instance_get_memory_sum_by_host(context, hostname):
     return result
 
 @require_admin_context
-def show_instances_by_account(context, id):
+@read_from_replica
+def show_instances_by_account(context, id, session=None):
     """Show all the instances that are on the given account id."""
     LOG.debug("show_instances_by_account id = %s" % str(id))
     # This is the management API, so we want all the instances,
     # regardless of status.
-    session = get_session()
     with session.begin():
         return session.query(Instance).\
                         filter_by(user_id=id).\
@@ -228,13 +343,13 @@ def volume_get_orphans(context, latest_time):
                      all()                     
     return result
 
-def get_root_enabled_history(context, id):
+@read_from_replica
+def get_root_enabled_history(context, id, session=None):
     """
     Returns the timestamp recorded when root was first enabled for the
     given instance.
     """
     LOG.debug("Get root enabled timestamp for instance %s" % id)
-    session = get_session()
     try:
         result = session.query(models.RootEnabledHistory).\
                      filter_by(instance_id=id).one()
@@ -251,16 +366,18 @@ def record_root_enabled_history(context, id, user):
     when and if root was ever enabled for a database on an instance.
     """
     LOG.debug("Record root enabled timestamp for instance %s" % id)
-    old_record = get_root_enabled_history(context, id)
-    if old_record is not None:
-        LOG.debug("Found existing root enabled history: %s" % old_record)
-        return old_record
-    LOG.debug("Creating new root enabled timestamp.")
-    new_record = models.RootEnabledHistory()
-    new_record.update({'instance_id': id, 'user_id': user})
+    # The check must see rows written moments ago, so it runs on the
+    # primary in the same transaction as the insert, not on the replica.
     session = get_session()
     with session.begin():
-        new_record.save()
+        old_record = get_root_enabled_history(context, id, session=session)
+        if old_record is not None:
+            LOG.debug("Found existing root enabled history: %s" % old_record)
+            return old_record
+        LOG.debug("Creating new root enabled timestamp.")
+        new_record = models.RootEnabledHistory()
+        new_record.update({'instance_id': id, 'user_id': user})
+        new_record.save(session=session)
     LOG.debug("New root enabled timestamp: %s" % new_record)
     return new_record
 
@@ -280,6 +397,7 @@ def config_create(key, value=None, description=None):
     try:
         with session.begin():
             config.save(session=session)
+            _config_bump_version(session)
         return config
     except Exception:
         raise exception.DuplicateConfigEntry(key=key)
@@ -296,26 +414,57 @@ def config_get(key, session=None):
     result = session.query(models.Config).\
                          filter_by(key=key).\
                          filter_by(deleted=False).\
+                         filter(models.Config.key != CONFIG_VERSION_KEY).\
                          first()
     if not result:
         raise exception.ConfigNotFound(key=key)
     return result
 
 
+@read_from_replica
 def config_get_all(session=None):
     """Get all the active configuration values
 
     :param session: pass in a active session if available
     """
-    if not session:
-        session = get_session()
     result = session.query(models.Config).\
-                         filter_by(deleted=False)
+                         filter_by(deleted=False).\
+                         filter(models.Config.key != CONFIG_VERSION_KEY)
     if not result:
         raise exception.ConfigNotFound(key="All config values")
     return result
 
 
+def config_get_version(session=None):
+    """Get the current version of the configuration values, which changes
+    whenever a value is created, updated or deleted
+
+    :param session: pass in a active session if available
+    """
+    if not session:
+        session = get_reader_session()
+    result = session.query(models.Config.value).\
+                         filter_by(key=CONFIG_VERSION_KEY).\
+                         first()
+    return result and result[0]
+
+
+def _config_bump_version(session):
+    """Give the configuration values a new version, within the caller's
+    transaction"""
+    version = str(uuid.uuid4())
+    updated = session.query(models.Config).\
+                      filter_by(key=CONFIG_VERSION_KEY).\
+                      update({'value': version})
+    if not updated:
+        config = models.Config()
+        config.update({'key': CONFIG_VERSION_KEY,
+                       'value': version,
+                       'description': 'Changes whenever a config value '
+                                      'does, for the config caches'})
+        config.save(session=session)
+
+
 def config_update(key, value=None, description=None):
     """Update an existing configuration value
 
@@ -331,6 +480,7 @@ def config_update(key, value=None, description=None):
         session.query(models.Config).\
                 filter_by(key=key).\
                 update(update_dict)
+        _config_bump_version(session)
 
 
 def config_delete(key):
@@ -343,6 +493,7 @@ def config_delete(key):
         session.query(models.Config).\
                 filter_by(key=key).\
                 delete()
+        _config_bump_version(session)
 
 
 def localid_from_uuid(uuid):
@@ -352,7 +503,7 @@ def localid_from_uuid(uuid):
     needed.
     """
     LOG.debug("Retrieving local id for instance %s" % uuid)
-    session = get_session()
+    session = get_reader_session()
     try:
         result = session.query(Instance).filter_by(uuid=uuid).one()
         return result['id']
@@ -361,15 +512,19 @@ def localid_from_uuid(uuid):
         raise exception.NotFound()
 
 
-def rsdns_record_create(name, id):
+def rsdns_record_create(name, id, type=None, data=None, ttl=None):
     """
-    Stores a record name / ID pair in the table rsdns_records.
+    Stores a record name / ID pair in the table rsdns_records, along with
+    the record's type, data and ttl if known.
     """
     LOG.debug("Storing RSDNS record information (id=%s, name=%s)."
               % (id, name))
     record = models.RsDnsRecord()
     record.update({'name': name,
-                   'id': id})
+                   'id': id,
+                   'type': type,
+                   'data': data,
+                   'ttl': ttl})
 
     session = get_session()
     try:
@@ -406,6 +561,93 @@ def rsdns_record_delete(name):
                 delete()
 
 
+def rsdns_record_get_list(names):
+    """
+    Fetches the rsdns_records rows for all of the given names in one query.
+    """
+    LOG.debug("Fetching RSDNS records with names=%s." % names)
+    if not names:
+        return []
+    session = get_session()
+    return session.query(models.RsDnsRecord).\
+                   filter(models.RsDnsRecord.name.in_(names)).\
+                   filter_by(deleted=False).\
+                   all()
+
+
+def rsdns_record_delete_list(names):
+    """
+    Deletes the dns records with the given names.
+    """
+    if not names:
+        return
+    session = get_session()
+    with session.begin():
+        session.query(models.RsDnsRecord).\
+                filter(models.RsDnsRecord.name.in_(names)).\
+                delete(synchronize_session=False)
+
+
+def rsdns_record_find(name=None, data=None, type=None, zone=None):
+    """
+    Returns the mirrored DNS records matching the given name and / or data.
+
+    :param type: only return records of this type, such as A
+    :param zone: only return records named within this zone
+    """
+    LOG.debug("Finding RSDNS records with name=%s, data=%s, type=%s in "
+              "zone %s." % (name, data, type, zone))
+    session = get_session()
+    query = session.query(models.RsDnsRecord).filter_by(deleted=False)
+    if name:
+        query = query.filter_by(name=name)
+    if data:
+        query = query.filter_by(data=data)
+    if type:
+        query = query.filter_by(type=type)
+    if zone:
+        query = query.filter(or_(models.RsDnsRecord.name == zone,
+                                 models.RsDnsRecord.name.like('%%.%s' % zone)))
+    return query.all()
+
+
+def rsdns_record_sync(records):
+    """
+    Makes rsdns_records mirror the given records, which should be the full
+    contents of the zone as dicts with name, id, type, data and ttl keys.
+
+    Returns a tuple of the number of rows added, updated and removed.
+    """
+    session = get_session()
+    added = updated = removed = 0
+    with session.begin():
+        existing = dict((row.name, row) for row in
+                        session.query(models.RsDnsRecord).\
+                                filter_by(deleted=False).all())
+        seen = set()
+        for record in records:
+            name = record['name']
+            if name in seen:
+                LOG.debug("Skipping additional RSDNS record %s for name %s."
+                          % (record['id'], name))
+                continue
+            seen.add(name)
+            row = existing.get(name)
+            if row is None:
+                row = models.RsDnsRecord()
+                row.update(record)
+                session.add(row)
+                added += 1
+            elif any(row[key] != value for key, value in record.items()):
+                row.update(record)
+                updated += 1
+        for name, row in existing.items():
+            if name not in seen:
+                session.delete(row)
+                removed += 1
+    return added, updated, removed
+
+
 def rsdns_record_list():
     """
     Stores a record name / ID pair in the table rsdns_records.
@@ -420,6 +662,115 @@ def rsdns_record_list():
     return result
 
 
+def dns_work_enqueue(action, instance_id, content):
+    """
+    Queues a DNS entry create or delete for the DNS service to apply.
+
+    Queuing the same action for the same instance and content again while
+    the first is still pending returns the pending item instead of adding a
+    second one.
+    """
+    key = "%s:%s:%s" % (action, instance_id, content)
+    session = get_session()
+    with session.begin():
+        pending = session.query(models.DnsWorkItem).\
+                          filter_by(idempotency_key=key).\
+                          filter(models.DnsWorkItem.state.in_(['queued',
+                                                               'running'])).\
+                          first()
+        if pending:
+            LOG.debug("DNS work %s is already queued." % key)
+            return pending
+        item = models.DnsWorkItem()
+        item.update({'idempotency_key': key,
+                     'action': action,
+                     'instance_id': instance_id,
+                     'content': content,
+                     'state': 'queued',
+                     'attempts': 0,
+                     'next_attempt_at': datetime.datetime.utcnow()})
+        item.save(session=session)
+    return item
+
+
+def dns_work_claim(limit, claim_timeout):
+    """
+    Marks up to limit due DNS work items as running and returns them.
+
+    Items left running for longer than claim_timeout seconds are assumed to
+    belong to a worker that died and are claimed again.
+    """
+    now = datetime.datetime.utcnow()
+    stale = now - datetime.timedelta(seconds=claim_timeout)
+    session = get_session()
+    candidates = session.query(models.DnsWorkItem).\
+                         filter(((models.DnsWorkItem.state == 'queued') &
+                                 (models.DnsWorkItem.next_attempt_at <= now)) |
+                                ((models.DnsWorkItem.state == 'running') &
+                                 (models.DnsWorkItem.updated_at < stale))).\
+                         order_by(models.DnsWorkItem.id).\
+                         limit(limit).all()
+    claimed = []
+    for item in candidates:
+        # Another DNS worker may have claimed the item since it was read.
+        with session.begin():
+            count = session.query(models.DnsWorkItem).\
+                            filter_by(id=item.id).\
+                            filter_by(state=item.state).\
+                            filter_by(updated_at=item.updated_at).\
+                            update({'state': 'running', 'updated_at': now},
+                                   synchronize_session=False)
+        if count:
+            claimed.append(item)
+    return claimed
+
+
+def dns_work_complete(id):
+    """Marks a DNS work item as done."""
+    session = get_session()
+    with session.begin():
+        session.query(models.DnsWorkItem).\
+                filter_by(id=id).\
+                update({'state': 'done',
+                        'deleted': True,
+                        'deleted_at': datetime.datetime.utcnow()})
+
+
+def dns_work_retry(id, error, retry_interval, max_attempts):
+    """
+    Records a failed attempt at a DNS work item and schedules the next one
+    with an exponential backoff, or gives up after max_attempts.
+
+    Returns True if the item will be tried again.
+    """
+    session = get_session()
+    with session.begin():
+        item = session.query(models.DnsWorkItem).filter_by(id=id).one()
+        attempts = (item.attempts or 0) + 1
+        values = {'attempts': attempts, 'last_error': str(error)[:255]}
+        if attempts >= max_attempts:
+            values['state'] = 'failed'
+        else:
+            delay = retry_interval * (2 ** (attempts - 1))
+            values['state'] = 'queued'
+            values['next_attempt_at'] = datetime.datetime.utcnow() + \
+                                        datetime.timedelta(seconds=delay)
+        item.update(values)
+        item.save(session=session)
+    return values['state'] == 'queued'
+
+
+def instance_get_for_dns(id):
+    """
+    Returns the bare instance row, deleted or not, for naming its DNS entry.
+    """
+    session = get_session()
+    result = session.query(Instance).filter_by(id=id).first()
+    if not result:
+        raise nova_exception.InstanceNotFound(instance_id=id)
+    return result
+
+
 @require_admin_context
 def service_get_all_compute_memory(context):
     """Return a list of service nodes and the memory used at each.
@@ -460,9 +811,9 @@ def fixed_ip_get_by_instance_for_network(context, instance_id, bridge_name):
 
 
 @require_context
-def instance_state_get_all_filtered(context):
+@read_from_replica
+def instance_state_get_all_filtered(context, session=None):
     """Returns a dictionary mapping instance IDs to their state."""
-    session = get_session()
     query = session.query(nova_models.Instance).filter_by(deleted=False)
 
     if not context.is_admin:
@@ -474,3 +825,24 @@ def instance_state_get_all_filtered(context):
         results = query.all()
 
     return dict((result['id'], result['power_state']) for result in results)
+
+
+def trace_span_create(values):
+    """Records a finished phase of an instance build."""
+    span = models.TraceSpan()
+    span.update(values)
+    session = get_session()
+    with session.begin():
+        span.save(session=session)
+    return span
+
+
+@read_from_replica
+def trace_span_get_all_by_instance(instance_id, session=None):
+    """Returns the recorded build phases of an instance, oldest first."""
+    return session.query(models.TraceSpan).\
+                   filter_by(instance_id=instance_id).\
+                   filter_by(deleted=False).\
+                   order_by(models.TraceSpan.started_at,
+                            models.TraceSpan.id).\
+                   all()
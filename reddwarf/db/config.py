@@ -0,0 +1,135 @@
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Process local cache of the reddwarf config table.
+
+Every change made through :py:mod:`reddwarf.db.api` also changes the config
+version, so the cache only has to read that one row to know whether it needs
+to load the table again, and does so at most every
+``config_cache_check_interval`` seconds.
+
+    from reddwarf.db import config
+    image_ref = config.get_int('reddwarf_imageref', 1)
+"""
+
+import time
+
+from nova import flags
+from nova import log as logging
+from nova.db.sqlalchemy.session import get_reader_session
+
+from reddwarf import exception
+from reddwarf.db import api as dbapi
+
+
+LOG = logging.getLogger('reddwarf.db.config')
+FLAGS = flags.FLAGS
+flags.DEFINE_integer('config_cache_check_interval', 5,
+                     'Seconds between checks for changed config values, '
+                     '0 checks on every read')
+
+_NO_DEFAULT = object()
+_TRUE_VALUES = ('true', '1', 'yes', 'on')
+
+
+class ConfigCache(object):
+    """Holds the config table in memory, reloading it when it changes."""
+
+    def __init__(self):
+        self.values = None
+        self.version = None
+        self.checked_at = 0
+
+    def load(self):
+        """Read the version and every config value from the database."""
+        version = dbapi.config_get_version()
+        # Read from the primary, the version just read may be newer than
+        # what the replica has.
+        configs = dbapi.config_get_all(session=get_reader_session())
+        self.values = dict((config.key, config.value) for config in configs)
+        self.version = version
+        self.checked_at = time.time()
+        LOG.debug("Loaded %d config values at version %s",
+                  len(self.values), version)
+
+    def invalidate(self):
+        """Force the next read to go back to the database."""
+        self.values = None
+
+    def refresh(self):
+        """Reload the values if the config version moved since the last
+        check, checking at most every config_cache_check_interval seconds."""
+        if self.values is None:
+            self.load()
+            return
+        now = time.time()
+        if now - self.checked_at < FLAGS.config_cache_check_interval:
+            return
+        self.checked_at = now
+        if dbapi.config_get_version() != self.version:
+            self.load()
+
+    def get(self, key, default=_NO_DEFAULT):
+        """Return the value of ``key`` as a string.
+
+        Raises ConfigNotFound when the key is missing and no default is
+        given.
+        """
+        self.refresh()
+        try:
+            return self.values[key]
+        except KeyError:
+            if default is _NO_DEFAULT:
+                raise exception.ConfigNotFound(key=key)
+            return default
+
+    def get_int(self, key, default=_NO_DEFAULT):
+        return self._get_typed(key, default, int)
+
+    def get_float(self, key, default=_NO_DEFAULT):
+        return self._get_typed(key, default, float)
+
+    def get_bool(self, key, default=_NO_DEFAULT):
+        return self._get_typed(key, default,
+                               lambda value: value.lower() in _TRUE_VALUES)
+
+    def get_list(self, key, default=_NO_DEFAULT):
+        """Return a comma separated value as a list of stripped strings."""
+        return self._get_typed(key, default,
+            lambda value: [item.strip() for item in value.split(',')
+                           if item.strip()])
+
+    def _get_typed(self, key, default, convert):
+        value = self.get(key, default)
+        if value is default or value is None:
+            return value
+        try:
+            return convert(value)
+        except ValueError:
+            LOG.error("Config value %s=%r is not valid", key, value)
+            if default is _NO_DEFAULT:
+                raise
+            return default
+
+
+CONFIG = ConfigCache()
+
+get = CONFIG.get
+get_int = CONFIG.get_int
+get_float = CONFIG.get_float
+get_bool = CONFIG.get_bool
+get_list = CONFIG.get_list
+invalidate = CONFIG.invalidate
@@ -0,0 +1,42 @@
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import *
+from migrate import *
+
+
+meta = MetaData()
+
+
+record_type = Column('type', String(length=16))
+record_data = Column('data', String(length=255))
+record_ttl = Column('ttl', Integer())
+
+
+def upgrade(migrate_engine):
+    meta.bind = migrate_engine
+    dns_records = Table('rsdns_records', meta, autoload=True)
+    dns_records.create_column(record_type)
+    dns_records.create_column(record_data)
+    dns_records.create_column(record_ttl)
+    Index('rsdns_records_data_idx', dns_records.c.data).create(migrate_engine)
+
+def downgrade(migrate_engine):
+    meta.bind = migrate_engine
+    dns_records = Table('rsdns_records', meta, autoload=True)
+    Index('rsdns_records_data_idx', dns_records.c.data).drop(migrate_engine)
+    dns_records.drop_column('ttl')
+    dns_records.drop_column('data')
+    dns_records.drop_column('type')
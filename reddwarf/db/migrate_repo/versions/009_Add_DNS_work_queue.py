@@ -0,0 +1,49 @@
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import *
+from migrate import *
+
+
+meta = MetaData()
+
+
+dns_work_queue = Table('dns_work_queue', meta,
+               Column('created_at', DateTime(timezone=False)),
+               Column('updated_at', DateTime(timezone=False)),
+               Column('deleted_at', DateTime(timezone=False)),
+               Column('deleted', Boolean(create_constraint=True, name=None)),
+               Column('id', Integer(), primary_key=True, nullable=False),
+               Column('idempotency_key', String(length=255)),
+               Column('action', String(length=16)),
+               Column('instance_id', Integer()),
+               Column('content', String(length=255)),
+               Column('state', String(length=16)),
+               Column('attempts', Integer()),
+               Column('next_attempt_at', DateTime(timezone=False)),
+               Column('last_error', String(length=255)))
+
+state_index = Index('dns_work_queue_state_idx', dns_work_queue.c.state,
+                    dns_work_queue.c.next_attempt_at)
+
+
+def upgrade(migrate_engine):
+    meta.bind = migrate_engine
+    dns_work_queue.create()
+    state_index.create(migrate_engine)
+
+def downgrade(migrate_engine):
+    meta.bind = migrate_engine
+    dns_work_queue.drop()
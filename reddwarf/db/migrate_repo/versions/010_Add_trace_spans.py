@@ -0,0 +1,49 @@
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from sqlalchemy import *
+from migrate import *
+
+
+meta = MetaData()
+
+
+trace_spans = Table('trace_spans', meta,
+               Column('created_at', DateTime(timezone=False)),
+               Column('updated_at', DateTime(timezone=False)),
+               Column('deleted_at', DateTime(timezone=False)),
+               Column('deleted', Boolean(create_constraint=True, name=None)),
+               Column('id', Integer(), primary_key=True, nullable=False),
+               Column('trace_id', String(length=36)),
+               Column('instance_id', Integer()),
+               Column('name', String(length=64)),
+               Column('host', String(length=255)),
+               Column('started_at', DateTime(timezone=False)),
+               Column('finished_at', DateTime(timezone=False)),
+               Column('duration', Float()),
+               Column('failed', Boolean(create_constraint=True, name=None)))
+
+instance_index = Index('trace_spans_instance_id_idx',
+                       trace_spans.c.instance_id)
+
+
+def upgrade(migrate_engine):
+    meta.bind = migrate_engine
+    trace_spans.create()
+    instance_index.create(migrate_engine)
+
+def downgrade(migrate_engine):
+    meta.bind = migrate_engine
+    trace_spans.drop()
@@ -16,7 +16,7 @@
 SQLAlchemy models for the reddwarf datastore
 """
 
-from sqlalchemy import Column, DateTime, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 
 from nova.db.sqlalchemy.models import NovaBase
@@ -68,10 +68,48 @@ class Config(BASE, NovaBase):
 
 class RsDnsRecord(BASE, NovaBase):
     """
-    A simple pairing between a DNS record ID and its name.
+    A DNS record ID and its name, along with the record's type, content and
+    TTL so lookups can be answered without paging through the zone.
     """
     __tablename__ = 'rsdns_records'
 
     name = Column(String(length=255), primary_key=True)
     id = Column('id', String(length=64))
-    
\ No newline at end of file
+    type = Column(String(length=16))
+    data = Column(String(length=255))
+    ttl = Column(Integer)
+    
+
+class DnsWorkItem(BASE, NovaBase):
+    """
+    A DNS entry create or delete waiting to be applied by the DNS service.
+    """
+    __tablename__ = 'dns_work_queue'
+
+    id = Column(Integer, primary_key=True)
+    idempotency_key = Column(String(255))
+    action = Column(String(16))
+    instance_id = Column(Integer)
+    content = Column(String(255))
+    state = Column(String(16))
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime)
+    last_error = Column(String(255))
+
+
+class TraceSpan(BASE, NovaBase):
+    """
+    One timed phase of an instance build, such as scheduling or the guest
+    prepare, and the trace (request) it was part of.
+    """
+    __tablename__ = 'trace_spans'
+
+    id = Column(Integer, primary_key=True)
+    trace_id = Column(String(length=36))
+    instance_id = Column(Integer)
+    name = Column(String(length=64))
+    host = Column(String(length=255))
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    duration = Column(Float)
+    failed = Column(Boolean, default=False)
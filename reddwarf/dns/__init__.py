@@ -24,3 +24,25 @@ flags.DEFINE_string('dns_bridge_name', 'br100',
 flags.DEFINE_string('dns_instance_entry_factory',
                     'reddwarf.dns.driver.DnsInstanceEntryFactory',
                     'Method used to create entries for instances')
+flags.DEFINE_float('dns_batch_window', 0.0,
+                   'Seconds to collect instance entry creates and deletes '
+                   'before sending them to the driver as one batch. '
+                   'Zero sends each entry immediately.')
+flags.DEFINE_integer('dns_batch_max_size', 100,
+                     'Maximum number of entries queued before a batch is '
+                     'sent without waiting for dns_batch_window.')
+flags.DEFINE_integer('dns_reconcile_interval', 3600,
+                     'Seconds between full walks of the DNS zone to refresh '
+                     'the local record mirror, for drivers that keep one. '
+                     'Zero disables reconciliation.')
+flags.DEFINE_integer('dns_work_batch_size', 100,
+                     'Maximum number of queued DNS work items applied at '
+                     'once.')
+flags.DEFINE_integer('dns_work_retry_interval', 30,
+                     'Seconds before the first retry of a failed DNS work '
+                     'item; doubles with each further attempt.')
+flags.DEFINE_integer('dns_work_max_attempts', 10,
+                     'Attempts made at a DNS work item before giving up.')
+flags.DEFINE_integer('dns_work_claim_timeout', 600,
+                     'Seconds a DNS work item may stay claimed before another '
+                     'worker takes it over.')
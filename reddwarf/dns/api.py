@@ -69,3 +69,9 @@ class API(base.Base):
                  {'method': 'delete_instance_entry',
                   'args': {'instance': self.convert_instance(instance),
                            'content': content}})
+
+    def process_queued_work(self, context):
+        """Asks a DNS worker to apply any queued entry creates and deletes."""
+        rpc.cast(context, FLAGS.dns_topic,
+                 {'method': 'process_queued_work',
+                  'args': {}})
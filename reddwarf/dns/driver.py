@@ -33,10 +33,25 @@ class DnsDriver(object):
         """Creates the entry in the driver at the given dns zone."""
         pass
 
+    def create_entries(self, entries):
+        """Creates several entries at once.
+
+        Drivers whose service accepts multiple records per request should
+        override this; by default each entry is created individually.
+
+        """
+        for entry in entries:
+            self.create_entry(entry)
+
     def delete_entry(self, name, type, dns_zone=None):
         """Deletes an entry with the given name and type from a dns zone."""
         pass
 
+    def delete_entries(self, entries):
+        """Deletes several entries at once, see create_entries."""
+        for entry in entries:
+            self.delete_entry(entry.name, entry.type, entry.dns_zone)
+
     def get_entries_by_content(self, content, dns_zone=None):
         """Retrieves all entries in a dns_zone with a matching content field"""
         pass
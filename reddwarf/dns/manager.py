@@ -19,12 +19,20 @@
 Dns manager.
 """
 
+import itertools
+import time
+
+from eventlet import greenthread
+
+from nova import exception as nova_exception
 from nova import flags
 from nova import log as logging
 from nova import utils
 from nova.manager import Manager
 
 from reddwarf import dns # import for flag values
+from reddwarf import exception
+from reddwarf.db import api as dbapi
 
 FLAGS = flags.FLAGS
 
@@ -42,8 +50,109 @@ class DnsManager(Manager):
         if not dns_instance_entry_factory:
             dns_instance_entry_factory = FLAGS.dns_instance_entry_factory
         self.entry_factory = utils.import_object(dns_instance_entry_factory)
+        self.batch_window = FLAGS.dns_batch_window
+        self.batch_max_size = FLAGS.dns_batch_max_size
+        # (action, entry) pairs, in the order they were asked for.
+        self.pending_entries = []
+        self.flush_timer = None
+        # Reconcile on the first tick so a fresh service starts in sync.
+        self.last_reconcile = 0
         super(DnsManager, self).__init__(*args, **kwargs)
 
+    def periodic_tasks(self, context=None):
+        """Retries queued DNS work and reconciles the driver's record mirror,
+        if it keeps one."""
+        super(DnsManager, self).periodic_tasks(context)
+        self.process_queued_work(context)
+        interval = FLAGS.dns_reconcile_interval
+        if not interval or not hasattr(self.driver, 'reconcile'):
+            return
+        if time.time() - self.last_reconcile < interval:
+            return
+        self.last_reconcile = time.time()
+        try:
+            self.driver.reconcile()
+        except Exception:
+            LOG.exception(_("Error reconciling DNS records."))
+
+    def process_queued_work(self, context):
+        """Applies the DNS work queued by the network managers.
+
+        Items are applied in the order they were queued, batching runs of
+        items with the same action. Each item is tried again later with a
+        backoff if it fails; creates of entries that already exist and
+        deletes of entries that are already gone count as done so retried
+        items are harmless.
+
+        """
+        items = dbapi.dns_work_claim(FLAGS.dns_work_batch_size,
+                                     FLAGS.dns_work_claim_timeout)
+        if not items:
+            return
+        LOG.debug("Processing %d queued DNS work items." % len(items))
+        work = []
+        for item in items:
+            try:
+                instance = dbapi.instance_get_for_dns(item.instance_id)
+                entry = self.entry_factory.create_entry(instance)
+            except Exception as e:
+                self._work_failed(item, e)
+                continue
+            if not entry:
+                dbapi.dns_work_complete(item.id)
+                continue
+            entry.content = item.content
+            work.append((item, entry))
+        # Items come back in queue order; only consecutive items with the
+        # same action are batched so a delete and a later create of the same
+        # name are applied in the order they were queued.
+        for action, run in itertools.groupby(work,
+                                             lambda pair: pair[0].action):
+            if action == 'create':
+                self._apply_work(list(run), self.driver.create_entries,
+                                 self.driver.create_entry,
+                                 exception.DuplicateRecordEntry)
+            else:
+                self._apply_work(list(run), self.driver.delete_entries,
+                                 lambda entry: self.driver.delete_entry(
+                                     entry.name, entry.type),
+                                 nova_exception.NotFound)
+
+    def _apply_work(self, work, batch_method, single_method, already_done):
+        if not work:
+            return
+        try:
+            batch_method([entry for item, entry in work])
+        except Exception as e:
+            LOG.exception(_("Batched DNS request for %d entries failed, "
+                            "retrying individually.") % len(work))
+            failed = _not_applied([entry for item, entry in work], e)
+        else:
+            failed = []
+        for item, entry in work:
+            if entry not in failed:
+                dbapi.dns_work_complete(item.id)
+                continue
+            try:
+                single_method(entry)
+            except already_done:
+                LOG.debug("DNS work %s was already applied."
+                          % item.idempotency_key)
+            except Exception as e:
+                self._work_failed(item, e)
+                continue
+            dbapi.dns_work_complete(item.id)
+
+    def _work_failed(self, item, error):
+        if dbapi.dns_work_retry(item.id, error, FLAGS.dns_work_retry_interval,
+                                FLAGS.dns_work_max_attempts):
+            LOG.warn(_("DNS work %(key)s failed, will retry: %(error)s")
+                     % {'key': item.idempotency_key, 'error': error})
+        else:
+            LOG.error(_("DNS work %(key)s failed for the last time: "
+                        "%(error)s")
+                      % {'key': item.idempotency_key, 'error': error})
+
     def create_instance_entry(self, context, instance, content):
         """Connects a new instance with a DNS entry.
 
@@ -53,11 +162,13 @@ class DnsManager(Manager):
         """
         entry = self.entry_factory.create_entry(instance)
         LOG.debug("Creating entry address %s." % str(entry))
-        print("create instance entry " + str(entry))
         if entry:
             entry.content = content
             LOG.debug("Modified entry address %s." % str(entry))
-            self.driver.create_entry(entry)
+            if self.batch_window > 0:
+                self._queue_entry('create', entry)
+            else:
+                self.driver.create_entry(entry)
 
     def delete_instance_entry(self, context, instance, content):
         """Removes a DNS entry associated to an instance."""
@@ -65,4 +176,69 @@ class DnsManager(Manager):
         LOG.debug("Deleting instance entry with %s" % str(entry))
         if entry:
             entry.content = content
-            self.driver.delete_entry(entry.name, entry.type)
+            if self.batch_window > 0:
+                self._queue_entry('delete', entry)
+            else:
+                self.driver.delete_entry(entry.name, entry.type)
+
+    def _queue_entry(self, action, entry):
+        """Holds an entry until the current batch window closes."""
+        self.pending_entries.append((action, entry))
+        if len(self.pending_entries) >= self.batch_max_size:
+            self.flush_pending_entries()
+        elif self.flush_timer is None:
+            self.flush_timer = greenthread.spawn_after(
+                self.batch_window, self.flush_pending_entries)
+
+    def flush_pending_entries(self):
+        """Sends every queued create and delete to the driver.
+
+        Entries are applied in the order they were queued, with each run of
+        creates or deletes sent as one batch, so a delete followed by a
+        create of the same name leaves the new record in place.
+
+        """
+        if self.flush_timer is not None:
+            # Only kills the timer if it has not started running yet.
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        pending, self.pending_entries = self.pending_entries, []
+        LOG.debug("Flushing %d DNS entries." % len(pending))
+        for action, run in itertools.groupby(pending, lambda item: item[0]):
+            entries = [entry for _action, entry in run]
+            if action == 'create':
+                self._apply_batch(self.driver.create_entries, entries,
+                                  self.driver.create_entry)
+            else:
+                self._apply_batch(self.driver.delete_entries, entries,
+                                  lambda entry: self.driver.delete_entry(
+                                      entry.name, entry.type))
+
+    def _apply_batch(self, batch_method, entries, single_method):
+        """Runs batch_method, falling back to one call per entry on error so
+        a single bad entry does not lose the rest of the batch."""
+        if not entries:
+            return
+        try:
+            batch_method(entries)
+        except Exception as e:
+            LOG.exception(_("Batched DNS request for %d entries failed, "
+                            "retrying individually.") % len(entries))
+            for entry in _not_applied(entries, e):
+                try:
+                    single_method(entry)
+                except Exception:
+                    LOG.exception(_("Error applying DNS entry %s.") % entry)
+
+
+def _not_applied(entries, error):
+    """The entries a failed batch request may not have applied.
+
+    A batch create that reports which records it did not create has
+    created the rest, so only those are retried; any other error leaves
+    every entry in doubt.
+
+    """
+    if isinstance(error, exception.DnsRecordsNotCreated):
+        return [entry for entry in entries if entry.name in error.names]
+    return entries
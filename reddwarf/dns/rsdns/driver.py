@@ -72,6 +72,11 @@ class EntryToRecordConverter(object):
             long_name = ""
         return long_name
 
+    def db_record_to_entry(self, db_record, dns_zone):
+        return DnsEntry(name=db_record.name, content=db_record.data,
+                        type=db_record.type, ttl=db_record.ttl,
+                        dns_zone=dns_zone)
+
     def record_to_entry(self, record, dns_zone):
         entry_name = record.name
         return DnsEntry(name=entry_name, content=record.data, type=record.type,
@@ -138,11 +143,11 @@ class RsDnsDriver(object):
                 poll_until(lambda : future.ready, sleep_time=2,
                                  time_out=60*2)
                 if len(future.resource) < 1:
-                    raise RsDnsError("No DNS records were created.")
+                    raise exception.DnsRecordsNotCreated([name])
                 elif len(future.resource) > 1:
                     LOG.error("More than one DNS record created. Ignoring.")
                 actual_record = future.resource[0]
-                dbapi.rsdns_record_create(name=name, id=actual_record.id)
+                self._mirror_create(entry, actual_record)
                 LOG.debug("Added RS DNS entry.")
             except exception.PollTimeOut as pto:
                 LOG.error("Failed to create DNS entry before time_out!")
@@ -154,6 +159,42 @@ class RsDnsDriver(object):
             LOG.error("Error when creating a DNS record!")
             raise
 
+    def create_entries(self, entries):
+        """Creates all of the given entries with one request per zone.
+
+        Entries RS DNS did not create are raised together in a
+        DnsRecordsNotCreated once every zone has been tried.
+
+        """
+        missing = []
+        for dns_zone, zone_entries in self._group_by_zone(entries):
+            if dns_zone.id == None:
+                raise TypeError("The entry's dns_zone must have an ID "
+                                "specified.")
+            LOG.debug("Going to create %d RSDNS entries in zone %s."
+                      % (len(zone_entries), dns_zone))
+            records = [{"type": entry.type, "name": entry.name,
+                        "data": entry.content, "ttl": entry.ttl}
+                       for entry in zone_entries]
+            future = self.dns_client.records.create_many(domain=dns_zone.id,
+                                                         records=records)
+            try:
+                poll_until(lambda : future.ready, sleep_time=2,
+                           time_out=60*2)
+            except exception.PollTimeOut:
+                LOG.error("Failed to create DNS entries before time_out!")
+                raise
+            created = dict((record.name, record)
+                           for record in future.resource)
+            for entry in zone_entries:
+                if entry.name in created:
+                    self._mirror_create(entry, created[entry.name])
+                else:
+                    missing.append(entry.name)
+            LOG.debug("Added %d RS DNS entries." % len(created))
+        if missing:
+            raise exception.DnsRecordsNotCreated(missing)
+
     def delete_entry(self, name, type, dns_zone=None):
         dns_zone = dns_zone or self.default_dns_zone
         long_name = name
@@ -170,17 +211,86 @@ class RsDnsDriver(object):
                                        record_id=record.id)
         dbapi.rsdns_record_delete(name)
 
-    def get_entries(self, name=None, content=None, dns_zone=None):
+    def delete_entries(self, entries):
+        """Deletes all of the given entries with one request per zone.
+
+        Unlike delete_entry the records are not fetched back from RS DNS
+        first; the ids stored in rsdns_records come straight from the
+        create responses.
+
+        """
+        for dns_zone, zone_entries in self._group_by_zone(entries):
+            names = [entry.name for entry in zone_entries]
+            db_records = dbapi.rsdns_record_get_list(names)
+            found = [db_record.name for db_record in db_records]
+            for name in set(names) - set(found):
+                LOG.error("Tried to delete DNS record with name=%s, but no "
+                          "record id was stored for it." % name)
+            if not db_records:
+                continue
+            self.dns_client.records.delete_many(domain_id=dns_zone.id,
+                record_ids=[db_record.id for db_record in db_records])
+            dbapi.rsdns_record_delete_list(found)
+            LOG.debug("Deleted %d RS DNS entries." % len(db_records))
+
+    def _group_by_zone(self, entries):
+        zones = []
+        for entry in entries:
+            dns_zone = entry.dns_zone or self.default_dns_zone
+            for zone, zone_entries in zones:
+                if zone == dns_zone:
+                    zone_entries.append(entry)
+                    break
+            else:
+                zones.append((dns_zone, [entry]))
+        return zones
+
+    def _mirror_create(self, entry, record):
+        dbapi.rsdns_record_create(name=entry.name, id=record.id,
+                                  type=entry.type, data=entry.content,
+                                  ttl=entry.ttl)
+
+    def get_entries(self, name=None, content=None, dns_zone=None, type='A'):
+        """Finds entries by name and / or content.
+
+        Filtered lookups are answered from the rsdns_records mirror of the
+        zone, and only return records of the given type; only an unfiltered
+        listing pages through the zone in RS DNS.
+
+        """
         dns_zone = dns_zone or self.default_dns_zone
-        long_name = name  # self.converter.name_to_long_name(name)
-        records = self.dns_client.records.list(domain_id=dns_zone.id,
-                                               record_name=long_name,
-                                               record_address=content)
+        if not name and not content:
+            return self._get_remote_entries(dns_zone)
+        db_records = dbapi.rsdns_record_find(name=name, data=content,
+                                             type=type, zone=dns_zone.name)
+        return [self.converter.db_record_to_entry(db_record, dns_zone)
+                for db_record in db_records]
+
+    def _get_remote_entries(self, dns_zone):
+        records = self.dns_client.records.list(domain_id=dns_zone.id)
         return [self.converter.record_to_entry(record, dns_zone)
                 for record in records]
 
+    def reconcile(self, dns_zone=None):
+        """Brings the rsdns_records mirror back in line with the zone.
+
+        Entries created and deleted through this driver keep the mirror up
+        to date as they go; this catches changes made to the zone elsewhere.
+
+        """
+        dns_zone = dns_zone or self.default_dns_zone
+        records = self.dns_client.records.list(domain_id=dns_zone.id)
+        added, updated, removed = dbapi.rsdns_record_sync(
+            [{'name': record.name, 'id': record.id, 'type': record.type,
+              'data': record.data, 'ttl': record.ttl}
+             for record in records])
+        LOG.info(_("Reconciled DNS zone %(zone)s: %(added)d added, "
+                   "%(updated)d updated, %(removed)d removed.")
+                 % {'zone': dns_zone, 'added': added, 'updated': updated,
+                    'removed': removed})
+
     def get_entries_by_content(self, content, dns_zone=None):
-        return self.get_entries(content=content)
+        return self.get_entries(content=content, dns_zone=dns_zone)
 
     def get_entries_by_name(self, name, dns_zone=None):
         return self.get_entries(name=name, dns_zone=dns_zone)
@@ -101,6 +101,14 @@ class DuplicateRecordEntry(nova_exception.NovaException):
     message = _("Record with name %(name) or id=%(id) already exists.")
 
 
+class DnsRecordsNotCreated(nova_exception.NovaException):
+    message = _("DNS records %(names)s were not created.")
+
+    def __init__(self, names):
+        self.names = names
+        super(DnsRecordsNotCreated, self).__init__(names=', '.join(names))
+
+
 class DevicePathInvalidForUuid(nova_exception.NotFound):
     message = _("Could not get a UUID from device path %(device_path).")
 
@@ -19,18 +19,69 @@
 Handles all request to the Platform or Guest VM
 """
 
+import functools
+import re
+import time
+
+import eventlet
+from eventlet import greenthread
 
 from nova import flags
 from nova import log as logging
 from nova import rpc
 from nova.db import api as dbapi
 from nova.db import base
+from nova.rpc import common as rpc_common
 
 from reddwarf import rpc as reddwarf_rpc
 from reddwarf import exception
 
 FLAGS = flags.FLAGS
 LOG = logging.getLogger('nova.guest.api')
+flags.DEFINE_integer('guest_describe_timeout', 30,
+                     'Seconds to wait for the guest to describe itself, '
+                     '0 waits forever')
+
+GUEST_FS_PATH = "/var/lib/mysql"
+
+# How the Python guest and the C++ guest (GuestException::NO_SUCH_METHOD)
+# say they do not know a method.
+UNKNOWN_METHOD = re.compile(r"method not available|has no attribute|"
+                            r"no such method", re.I)
+
+# Instances whose guest has answered that it can not describe itself.
+DESCRIBE_UNSUPPORTED = set()
+
+
+def fan_out(calls, timeout=None):
+    """Run independent calls concurrently, each on its own greenthread.
+
+    ``calls`` maps a name to a callable taking no arguments.  All of the
+    calls share a single deadline of ``timeout`` seconds; any still running
+    when it passes are killed.  Returns a ``(results, errors)`` pair of
+    dicts keyed by the same names, holding the return value or the
+    exception raised (:py:class:`nova.rpc.common.Timeout` when the
+    deadline passed) for each call.
+    """
+    deadline = time.time() + timeout if timeout else None
+    threads = dict((name, greenthread.spawn(call))
+                   for name, call in calls.iteritems())
+    results = {}
+    errors = {}
+    for name, thread in threads.iteritems():
+        remaining = None
+        if deadline is not None:
+            remaining = max(deadline - time.time(), 0)
+        try:
+            with eventlet.Timeout(remaining):
+                results[name] = thread.wait()
+        except eventlet.Timeout:
+            thread.kill()
+            errors[name] = rpc_common.Timeout("%s did not return within "
+                                              "%s seconds" % (name, timeout))
+        except Exception as e:
+            errors[name] = e
+    return results, errors
 
 
 class API(base.Base):
@@ -119,6 +170,11 @@ class API(base.Base):
         return rpc.call(context, self._get_routing_key(context, id),
                  {"method": "get_diagnostics"})
 
+    def create_queue(self, context, id):
+        """Declares the guest's queue so messages sent before the guest
+           boots are kept for it"""
+        reddwarf_rpc.declare_queue(self._get_routing_key(context, id))
+
     def prepare(self, context, id, memory_mb, databases=None, users=None):
         """Make an asynchronous call to prepare the guest
            as a database container"""
@@ -164,6 +220,8 @@ class API(base.Base):
 
     def update_guest(self, context, id):
         """Make a synchronous call to update the guest agent."""
+        # The updated agent may know how to describe itself.
+        DESCRIBE_UNSUPPORTED.discard(id)
         rpc.call(context, self._get_routing_key(context, id),
                 {"method": "update_guest",
                  "args": {}
@@ -175,7 +233,57 @@ class API(base.Base):
         try:
             return rpc.call(context, self._get_routing_key(context, id),
                             {"method": "get_filesystem_stats",
-                             "args": {"fs_path": "/var/lib/mysql"}})
+                             "args": {"fs_path": GUEST_FS_PATH}})
         except Exception as e:
             LOG.error(e)
             raise exception.GuestError(original_message=str(e))
+
+    def describe(self, context, id):
+        """Make a synchronous call to get the volume info, databases, users
+           and root access of the container in a single round trip.
+
+           Guests without the describe call, or whose describe fails, are
+           asked for each detail concurrently instead; guests that do not
+           know the call are remembered so they are not asked again."""
+        LOG.debug("Describe Instance %s", id)
+        routing_key = self._get_routing_key(context, id)
+        timeout = FLAGS.guest_describe_timeout or None
+        if id not in DESCRIBE_UNSUPPORTED:
+            try:
+                return rpc.call(context, routing_key,
+                                {"method": "describe",
+                                 "args": {"fs_path": GUEST_FS_PATH}},
+                                timeout=timeout)
+            except Exception as e:
+                unknown_method = UNKNOWN_METHOD.search(str(e))
+                if not (unknown_method or
+                        isinstance(e, rpc_common.RemoteError)):
+                    LOG.error(e)
+                    raise exception.GuestError(original_message=str(e))
+                if unknown_method:
+                    DESCRIBE_UNSUPPORTED.add(id)
+                LOG.debug("Guest on Instance %s did not describe itself, "
+                          "asking for each detail instead: %s", id, e)
+
+        def _call(method, **kwargs):
+            return rpc.call(context, routing_key,
+                            {"method": method, "args": kwargs},
+                            timeout=timeout)
+
+        results, errors = fan_out({
+            'volume_info': functools.partial(_call, "get_filesystem_stats",
+                                             fs_path=GUEST_FS_PATH),
+            'databases': functools.partial(_call, "list_databases"),
+            'users': functools.partial(_call, "list_users"),
+            'root_enabled': functools.partial(_call, "is_root_enabled"),
+            }, timeout)
+        for name, error in errors.iteritems():
+            LOG.error("Guest on Instance %s failed %s: %s", id, name, error)
+        # Matches the guest side describe; only the volume info is required,
+        # the rest is left empty when MySQL can not answer.
+        if 'volume_info' in errors:
+            raise exception.GuestError(
+                original_message=str(errors['volume_info']))
+        return dict((name, results.get(name))
+                    for name in ('volume_info', 'databases', 'users',
+                                 'root_enabled'))
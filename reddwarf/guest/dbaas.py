@@ -26,8 +26,10 @@ handles RPC calls relating to Platform specific operations.
 """
 
 
+import functools
 import os
 import re
+import time
 import uuid
 
 from datetime import date
@@ -36,10 +38,12 @@ from sqlalchemy import exc
 from sqlalchemy import interfaces
 from sqlalchemy.sql.expression import text
 
+from nova import context
 from nova import flags
 from nova import log as logging
 from nova.exception import ProcessExecutionError
 
+from reddwarf.collector import api as collector_api
 from reddwarf.db import api as dbapi
 from reddwarf.guest import utils as guest_utils, utils
 from reddwarf.guest.db import models
@@ -49,10 +53,22 @@ ADMIN_USER_NAME = "os_admin"
 LOG = logging.getLogger('nova.guest.dbaas')
 FLAGS = flags.FLAGS
 FLUSH = text("""FLUSH PRIVILEGES;""")
+FINGERPRINT = text("""SELECT
+    (SELECT COUNT(*) FROM information_schema.SCHEMATA),
+    (SELECT SUM(CRC32(SCHEMA_NAME)) FROM information_schema.SCHEMATA),
+    (SELECT COUNT(*) FROM mysql.user),
+    (SELECT SUM(CRC32(CONCAT(User, '@', Host))) FROM mysql.user);""")
+flags.DEFINE_bool('guest_report_to_collector', False,
+                  'Report the guest status to the status collector instead '
+                  'of writing it to the database directly')
+flags.DEFINE_integer('guest_read_cache_ttl', 60,
+                     'Seconds the database, user and root listings are '
+                     'reused before MySQL is asked again, 0 disables')
 
 ENGINE = None
 MYSQLD_ARGS = None
 PREPARING = False
+READ_CACHE = {}
 
 
 def generate_random_password():
@@ -96,9 +112,62 @@ def load_mysqld_options():
         return None
 
 
+def data_fingerprint():
+    """Cheap marker for changes made to MySQL outside of the agent.
+
+    Counts and checksums the schema names and the user / host pairs the
+    listings are built from in a single query on the pooled connection, so
+    creating or dropping a database or user, or enabling root, moves it.
+    Returns None when MySQL can not be asked, leaving the cache to expire
+    on its ttl alone."""
+    engine = get_engine()
+    if not engine:
+        return None
+    try:
+        client = LocalSqlClient(engine, use_flush=False)
+        with client:
+            return tuple(client.execute(FINGERPRINT).fetchone())
+    except exc.SQLAlchemyError as e:
+        LOG.debug("Unable to fingerprint MySQL: %s", e)
+        return None
+
+
+def cached_read(f):
+    """Reuse the result of a read only listing until it is invalidated,
+       the data fingerprint moves or the ttl passes."""
+    @functools.wraps(f)
+    def wrapper(self):
+        ttl = FLAGS.guest_read_cache_ttl
+        if not ttl:
+            return f(self)
+        fingerprint = data_fingerprint()
+        cached = READ_CACHE.get(f.__name__)
+        if cached:
+            result, cached_fingerprint, cached_at = cached
+            if (fingerprint == cached_fingerprint and
+                time.time() - cached_at < ttl):
+                return result
+        result = f(self)
+        READ_CACHE[f.__name__] = (result, fingerprint, time.time())
+        return result
+    return wrapper
+
+
+def invalidates_reads(f):
+    """Drop the cached listings once a call that changes them is done."""
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        try:
+            return f(*args, **kwargs)
+        finally:
+            READ_CACHE.clear()
+    return wrapper
+
+
 class DBaaSAgent(object):
     """ Database as a Service Agent Controller """
 
+    @invalidates_reads
     def create_user(self, users):
         """Create users and grant them privileges for the
            specified databases"""
@@ -121,6 +190,7 @@ class DBaaSAgent(object):
                             % (mydb.name, user.name))
                     client.execute(t, host=host)
 
+    @cached_read
     def list_users(self):
         """List users that have access to the database"""
         LOG.debug("---Listing Users---")
@@ -140,6 +210,7 @@ class DBaaSAgent(object):
         LOG.debug("users = " + str(users))
         return users
 
+    @invalidates_reads
     def delete_user(self, user):
         """Delete the specified users"""
         client = LocalSqlClient(get_engine())
@@ -149,6 +220,7 @@ class DBaaSAgent(object):
             t = text("""DROP USER `%s`""" % mysql_user.name)
             client.execute(t)
 
+    @invalidates_reads
     def create_database(self, databases):
         """Create the list of specified databases"""
         client = LocalSqlClient(get_engine())
@@ -161,6 +233,7 @@ class DBaaSAgent(object):
                          % (mydb.name, mydb.character_set, mydb.collate))
                 client.execute(t)
 
+    @cached_read
     def list_databases(self):
         """List databases the user created on this mysql instance"""
         LOG.debug("---Listing Databases---")
@@ -196,6 +269,7 @@ class DBaaSAgent(object):
         LOG.debug("databases = " + str(databases))
         return databases
 
+    @invalidates_reads
     def delete_database(self, database):
         """Delete the specified database"""
         client = LocalSqlClient(get_engine())
@@ -205,6 +279,7 @@ class DBaaSAgent(object):
             t = text("""DROP DATABASE `%s`;""" % mydb.name)
             client.execute(t)
 
+    @invalidates_reads
     def enable_root(self):
         """Enable the root user global access and/or reset the root password"""
         host = "%"
@@ -229,6 +304,7 @@ class DBaaSAgent(object):
             client.execute(t, user=user.name, host=host)
             return user.serialize()
 
+    @invalidates_reads
     def disable_root(self):
         """Disable root access apart from localhost"""
         host = "localhost"
@@ -244,6 +320,7 @@ class DBaaSAgent(object):
             client.execute(t, pwd=pwd, user=user)
         return True
 
+    @cached_read
     def is_root_enabled(self):
         """Return True if root access is enabled; False otherwise."""
         client = LocalSqlClient(get_engine())
@@ -255,6 +332,37 @@ class DBaaSAgent(object):
             LOG.debug("result = " + str(result))
             return result.rowcount != 0
 
+    def get_filesystem_stats(self, fs_path="/var/lib/mysql"):
+        """Return the size in bytes of the file system holding fs_path."""
+        stats = os.statvfs(fs_path)
+        total = stats.f_blocks * stats.f_bsize
+        free = stats.f_bfree * stats.f_bsize
+        return {'block_size': stats.f_bsize,
+                'total_blocks': stats.f_blocks,
+                'free_blocks': stats.f_bfree,
+                'total': total,
+                'free': free,
+                'used': total - free}
+
+    def describe(self, fs_path="/var/lib/mysql"):
+        """Return the volume info, databases, users and root access of
+           this container in one reply.
+
+           Anything MySQL can not answer is left as None so the volume
+           info is still reported while the server is down."""
+        details = {'volume_info': None,
+                   'databases': None,
+                   'users': None,
+                   'root_enabled': None}
+        details['volume_info'] = self.get_filesystem_stats(fs_path)
+        try:
+            details['databases'] = self.list_databases()
+            details['users'] = self.list_users()
+            details['root_enabled'] = self.is_root_enabled()
+        except exc.SQLAlchemyError as e:
+            LOG.error("Unable to describe MySQL: %s", e)
+        return details
+
     def prepare(self, databases):
         """Makes ready DBAAS on a Guest container."""
         global PREPARING
@@ -274,27 +382,35 @@ class DBaaSAgent(object):
         instance_id = guest_utils.get_instance_id()
 
         if PREPARING:
-            dbapi.guest_status_update(instance_id, guest_status.BUILDING)
+            self._set_status(instance_id, guest_status.BUILDING)
             return
 
         try:
             out, err = utils.execute("/usr/bin/mysqladmin", "ping", run_as_root=True)
-            dbapi.guest_status_update(instance_id, guest_status.RUNNING)
+            self._set_status(instance_id, guest_status.RUNNING)
         except ProcessExecutionError as e:
             try:
                 out, err = utils.execute("ps", "-C", "mysqld", "h")
                 pid = out.split()[0]
                 # TODO(rnirmal): Need to create new statuses for instances where
                 # the mysql service is up, but unresponsive
-                dbapi.guest_status_update(instance_id, guest_status.BLOCKED)
+                self._set_status(instance_id, guest_status.BLOCKED)
             except ProcessExecutionError as e:
                 if not MYSQLD_ARGS:
                     MYSQLD_ARGS = load_mysqld_options()
                 pid_file = MYSQLD_ARGS.get('pid-file', '/var/run/mysqld/mysqld.pid')
                 if os.path.exists(pid_file):
-                    dbapi.guest_status_update(instance_id, guest_status.CRASHED)
+                    self._set_status(instance_id, guest_status.CRASHED)
                 else:
-                    dbapi.guest_status_update(instance_id, guest_status.SHUTDOWN)
+                    self._set_status(instance_id, guest_status.SHUTDOWN)
+
+    def _set_status(self, instance_id, status):
+        """Record the status through the collector when one is used"""
+        if FLAGS.guest_report_to_collector:
+            collector_api.API().report_status(context.get_admin_context(),
+                                              instance_id, status)
+        else:
+            dbapi.guest_status_update(instance_id, status)
 
 
 class LocalSqlClient(object):
@@ -381,11 +497,12 @@ class DBaaSPreparer(object):
         self.pkg.pkg_install("dbaas-mycnf", self.TIME_OUT)
 
         if os.path.isfile(dbaas_mycnf):
-            utils.execute("sudo", "mv", orig_mycnf,
+            utils.execute("mv", orig_mycnf,
                           "%(name)s.%(date)s"
                           % {'name': orig_mycnf,
-                             'date': date.today().isoformat()})
-            utils.execute("sudo", "cp", dbaas_mycnf, orig_mycnf)
+                             'date': date.today().isoformat()},
+                          run_as_root=True)
+            utils.execute("cp", dbaas_mycnf, orig_mycnf, run_as_root=True)
 
         mycnf_file = open(orig_mycnf, 'r')
         tmp_file = open(tmp_mycnf, 'w')
@@ -398,9 +515,9 @@ class DBaaSPreparer(object):
 
         mycnf_file.close()
         tmp_file.close()
-        utils.execute("sudo", "mv", tmp_mycnf, final_mycnf)
-        utils.execute("sudo", "rm", orig_mycnf)
-        utils.execute("sudo", "ln", "-s", final_mycnf, orig_mycnf)
+        utils.execute("mv", tmp_mycnf, final_mycnf, run_as_root=True)
+        utils.execute("rm", orig_mycnf, run_as_root=True)
+        utils.execute("ln", "-s", final_mycnf, orig_mycnf, run_as_root=True)
 
     def _remove_anonymous_user(self, client):
         t = text("""DELETE FROM mysql.user WHERE User='';""")
@@ -447,15 +564,17 @@ class DBaaSPreparer(object):
         mysql_base_dir = "/var/lib/mysql"
         try:
             LOG.debug(_("Restarting mysql..."))
-            utils.execute("sudo", "service", "mysql", "stop")
+            utils.execute("service", "mysql", "stop", run_as_root=True)
 
             # Remove the ib_logfile, if not mysql won't start.
             # For some reason wildcards don't seem to work, so
             # deleting both the files separately
-            utils.execute("sudo", "rm", "%s/ib_logfile0" % mysql_base_dir)
-            utils.execute("sudo", "rm", "%s/ib_logfile1" % mysql_base_dir)
+            utils.execute("rm", "%s/ib_logfile0" % mysql_base_dir,
+                          run_as_root=True)
+            utils.execute("rm", "%s/ib_logfile1" % mysql_base_dir,
+                          run_as_root=True)
 
-            utils.execute("sudo", "service", "mysql", "start")
+            utils.execute("service", "mysql", "start", run_as_root=True)
         except ProcessExecutionError:
             LOG.error(_("Unable to restart mysql server."))
 
@@ -34,6 +34,9 @@ from nova import log as logging
 from nova import manager
 from nova import utils
 
+from reddwarf import trace
+from reddwarf.guest import utils as guest_utils
+
 
 LOG = logging.getLogger('nova.guest.manager')
 FLAGS = flags.FLAGS
@@ -83,6 +86,17 @@ class GuestManager(manager.Manager):
         """Upgrade the guest agent and restart the agent"""
         LOG.debug(_("Self upgrade of guest agent issued"))
 
+    def prepare(self, context, *args, **kwargs):
+        """Prepare the guest, timed as a phase of the instance build"""
+        with trace.span(context, 'guest.prepare') as span:
+            # Looking up the instance must not keep the guest from being
+            # prepared, the span is just not recorded without it.
+            try:
+                span.instance_id = guest_utils.get_instance_id()
+            except Exception:
+                LOG.exception("Unable to find the instance id of this guest")
+            return self._mapper('prepare', context, *args, **kwargs)
+
     def __getattr__(self, key):
         """Converts all method calls and direct it at the driver"""
         return functools.partial(self._mapper, key)
@@ -12,6 +12,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from nova import exception
 from nova import flags
 from nova import log as logging
 from nova.network import manager
@@ -24,7 +25,13 @@ LOG = logging.getLogger("reddwarf.network.manager")
 
 
 class FixedIpDnsEntries(manager.NetworkManager):
-    """Subclass for adding DNS entries for ips to a network manager"""
+    """Subclass for adding DNS entries for ips to a network manager
+
+    The entries are not created here; the address is written to the DNS
+    work queue and the DNS service is nudged to apply it, retrying on its
+    own if the DNS provider fails.
+
+    """
     def __init__(self, *args, **kwargs):
         super(FixedIpDnsEntries, self).__init__(*args, **kwargs)
         self.dns_api = dns.API()
@@ -38,7 +45,8 @@ class FixedIpDnsEntries(manager.NetworkManager):
         admin_context = context.elevated()
         result = super(FixedIpDnsEntries, self).allocate_for_instance(context,
                                                                       **kwargs)
-        self._allocate_dns_entry(admin_context, instance_id)
+        address = self._find_address_in_network_info(result)
+        self._queue_dns_work(admin_context, 'create', instance_id, address)
         return result
 
     def deallocate_for_instance(self, context, **kwargs):
@@ -48,31 +56,59 @@ class FixedIpDnsEntries(manager.NetworkManager):
         kwargs can contain fixed_ips to circumvent another db lookup
         """
         instance_id = kwargs.get('instance_id', '')
-        self._deallocate_dns_entry(context, instance_id)
+        fixed_ips = kwargs.get('fixed_ips')
+        if fixed_ips:
+            address = self._find_address_in_fixed_ips(context, fixed_ips)
+        else:
+            address = self._find_address_used_for_dns(context, instance_id)
+        self._queue_dns_work(context, 'delete', instance_id, address)
         super(FixedIpDnsEntries, self).deallocate_for_instance(context,
                                                                **kwargs)
 
-    def _allocate_dns_entry(self, context, instance_id):
-        """Creates a DNS entry for the compute instance"""
-        instance_ref = self.db.instance_get(context, instance_id)
-        address = self._find_address_used_for_dns(context, instance_id)
-        if address:
-            LOG.debug(_("Creating DNS entry for instance_id %i, address %s") %
-                      (instance_id, address))
-            self.dns_api.create_instance_entry(context, instance_ref, address)
-        else:
-            LOG.debug(_("No address found for instance_id %i") % instance_id)
+    def _queue_dns_work(self, context, action, instance_id, address):
+        """Queues a DNS entry create or delete for the instance's address."""
+        if not address:
+            LOG.debug(_("No address found for instance_id %s") % instance_id)
+            return
+        LOG.debug(_("Queuing DNS %s for instance_id %s, address %s") %
+                  (action, instance_id, address))
+        db_api.dns_work_enqueue(action, instance_id, address)
+        self.dns_api.process_queued_work(context)
+
+    def _find_address_in_network_info(self, network_info):
+        """Picks the DNS address out of what allocate_for_instance returns."""
+        for network, info in network_info or []:
+            if network['bridge'] == FLAGS.dns_bridge_name and info['ips']:
+                return info['ips'][0]['ip']
+        return None
+
+    def _find_address_in_fixed_ips(self, context, fixed_ips):
+        """Picks the DNS address out of the fixed ips being deallocated.
+
+        A host may serve several networks, so the bridge of each fixed ip's
+        network is looked up rather than remembered.
 
-    def _deallocate_dns_entry(self, context, instance_id):
-        """Removes the dns entry. Must be called while fixed_ips exist."""
-        address = self._find_address_used_for_dns(context, instance_id)
-        if address:
-            instance_ref = self.db.instance_get(context, instance_id)
-            self.dns_api.delete_instance_entry(context, instance_ref, address)
+        """
+        bridges = {}
+        for fixed_ip in fixed_ips:
+            network_id = fixed_ip['network_id']
+            if network_id not in bridges:
+                try:
+                    network = self.db.network_get(context.elevated(),
+                                                  network_id)
+                except exception.NetworkNotFound:
+                    network = {'bridge': None}
+                bridges[network_id] = network['bridge']
+            if bridges[network_id] == FLAGS.dns_bridge_name:
+                return fixed_ip['address']
+        return None
 
     def _find_address_used_for_dns(self, context, instance_id):
-        fixed_ips = db_api.fixed_ip_get_by_instance_for_network(context,
+        try:
+            fixed_ips = db_api.fixed_ip_get_by_instance_for_network(context,
                                             instance_id, FLAGS.dns_bridge_name)
+        except exception.FixedIpNotFoundForInstance:
+            return None
         if fixed_ips and len(fixed_ips) > 0:
             return fixed_ips[0].address
         return None
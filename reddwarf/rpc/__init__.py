@@ -12,16 +12,64 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import weakref
+
+import kombu.entity
+
+from nova import flags
 from nova.rpc import impl_kombu
 from nova.rpc.common import LOG
 
+FLAGS = flags.FLAGS
+
+# Topic queues already declared, by the channel they were declared on.  A
+# reconnect opens a new channel, so queues the broker lost with the old
+# connection are declared again.
+_declared_queues = weakref.WeakKeyDictionary()
+
+
+def declare_queue(topic, conn=None):
+    """Makes sure the queue for a topic exists before anyone consumes it.
+
+    Guests only declare their queue once they boot, so anything sent to them
+    before that would be dropped. Each topic is only declared once per
+    channel.
+
+    """
+    if conn is None:
+        with impl_kombu.ConnectionContext() as conn:
+            _declare_once(conn.channel, topic)
+    else:
+        _declare_once(conn.channel, topic)
+
+
+def _declare_once(channel, topic):
+    declared = _declared_queues.setdefault(channel, set())
+    if topic in declared:
+        return
+    LOG.debug(_('Declaring queue %s'), topic)
+    _declare_topic_queue(channel, topic)
+    declared.add(topic)
+
+
+def _declare_topic_queue(channel, topic):
+    durable = FLAGS.rabbit_durable_queues
+    exchange = kombu.entity.Exchange(name=FLAGS.control_exchange,
+                                     type='topic', durable=durable,
+                                     auto_delete=False)
+    queue = kombu.entity.Queue(name=topic, exchange=exchange,
+                               routing_key=topic, channel=channel,
+                               durable=durable, auto_delete=False,
+                               exclusive=False)
+    # With nowait the declare and bind are sent ahead of whatever is
+    # published next on the channel rather than each waiting on the broker.
+    queue.declare(nowait=True)
+
 
 def cast_with_consumer(context, topic, msg):
-    """Sends a message on a topic without waiting for a response."""
-    # TODO(rnirmal): Create a better way to do this without having to
-    # create the consumer first
+    """Sends a message on a topic whose queue may not have a consumer yet."""
     LOG.debug(_('Making asynchronous cast on %s...'), topic)
+    impl_kombu._pack_context(msg, context)
     with impl_kombu.ConnectionContext() as conn:
-        consumer = conn.declare_topic_consumer(topic=topic)
-        impl_kombu.cast(context, topic, msg)
-
+        declare_queue(topic, conn)
+        conn.topic_send(topic, msg)
@@ -31,6 +31,7 @@ from nova.notifier import api as notifier
 from nova.scheduler import driver
 from nova.scheduler import chance
 
+from reddwarf import trace
 from reddwarf.db import api as db_api
 from reddwarf.exception import OutOfInstanceMemory
 
@@ -42,7 +43,21 @@ flags.DEFINE_integer("max_gigabytes", 10000,
 flags.DEFINE_integer("max_networks", 1000,
                      "maximum number of networks to allow per host")
 flags.DEFINE_integer("max_instance_memory_mb", 1024 * 15,
-                     "maximum amount of memory a host can use on instances")
+                     "maximum amount of memory a host can use on instances, "
+                     "whatever memory it reports")
+flags.DEFINE_float("memory_overcommit_ratio", 1.0,
+                   "instance memory a host may be given as a multiple of its "
+                   "usable physical memory, for hosts reporting their memory")
+flags.DEFINE_integer("memory_host_reserved_mb", 1024,
+                     "memory of each host kept back for the host itself")
+flags.DEFINE_integer("memory_rss_max_percent", 90,
+                     "percent of usable physical memory the memory instances "
+                     "actually use, plus the new instance, may reach")
+flags.DEFINE_bool("memory_pack_hosts", False,
+                  "place instances on the fullest host they fit on instead of "
+                  "the emptiest")
+
+MB = 1024 * 1024
 
 LOG = logging.getLogger('nova.scheduler.simple')
 
@@ -160,20 +175,83 @@ class SimpleScheduler(chance.ChanceScheduler):
                                    " service running?"))
 
 
+class HostMemory(object):
+    """How much instance memory a compute host can take.
+
+    Hosts whose compute service reports its memory (host_memory_total and
+    host_memory_rss, in bytes) can be given memory_overcommit_ratio times
+    their physical memory less memory_host_reserved_mb, as long as the
+    memory their instances actually use plus the new instance stays under
+    memory_rss_max_percent of it.  Other hosts get max_instance_memory_mb,
+    which also caps what a reporting host can be given, so overcommitting
+    past it means raising max_instance_memory_mb too.
+
+    """
+
+    def __init__(self, service, committed_mb, capabilities=None):
+        self.service = service
+        self.host = service['host']
+        self.committed_mb = committed_mb or 0
+        self.rss_mb = None
+        self.rss_limit_mb = None
+        if capabilities and capabilities.get('host_memory_total'):
+            usable_mb = (capabilities['host_memory_total'] / MB -
+                         FLAGS.memory_host_reserved_mb)
+            self.capacity_mb = min(usable_mb * FLAGS.memory_overcommit_ratio,
+                                   FLAGS.max_instance_memory_mb)
+            if 'host_memory_rss' in capabilities:
+                self.rss_mb = capabilities['host_memory_rss'] / MB
+                self.rss_limit_mb = (usable_mb *
+                                     FLAGS.memory_rss_max_percent / 100.0)
+        else:
+            self.capacity_mb = FLAGS.max_instance_memory_mb
+
+    @property
+    def free_mb(self):
+        return self.capacity_mb - self.committed_mb
+
+    def fits(self, memory_mb):
+        """Whether an instance with memory_mb more memory fits."""
+        if self.committed_mb + memory_mb > self.capacity_mb:
+            return False
+        if self.rss_mb is not None and \
+           self.rss_mb + memory_mb > self.rss_limit_mb:
+            return False
+        return True
+
+
 class MemoryScheduler(SimpleScheduler):
-    """Implements Naive Scheduler to find a host with the most free memory."""
+    """Implements Naive Scheduler to find a host with the most free memory,
+    or with memory_pack_hosts the least free memory that is enough."""
+
+    def _host_capabilities(self, host):
+        """The compute capabilities host last reported, if still fresh."""
+        if not self.zone_manager:
+            return None
+        services = self.zone_manager.service_states.get(host, {})
+        if 'compute' not in services or \
+           self.zone_manager.host_service_caps_stale(host, 'compute'):
+            return None
+        return services['compute']
 
     def _schedule_based_on_resources(self, context, instance_ref):
         results = db_api.service_get_all_compute_memory(context)
-        for result in results:
-            (service, memory_mb) = result
-            needed_memory = memory_mb + instance_ref['memory_mb']
-            if needed_memory <= FLAGS.max_instance_memory_mb and \
-               self.service_is_up(service):
-                LOG.debug("Scheduling instance %s" % 
-                          instance_ref['display_name'])
-                return self._schedule_now_on_host(context, service['host'],
-                                                  instance_ref['id'])
+        hosts = [HostMemory(service, memory_mb,
+                            self._host_capabilities(service['host']))
+                 for service, memory_mb in results
+                 if self.service_is_up(service)]
+        hosts = [host for host in hosts
+                 if host.fits(instance_ref['memory_mb'])]
+        if hosts:
+            if FLAGS.memory_pack_hosts:
+                chosen = min(hosts, key=lambda host: host.free_mb)
+            else:
+                chosen = max(hosts, key=lambda host: host.free_mb)
+            LOG.debug("Scheduling instance %s on %s with %dMB free" %
+                      (instance_ref['display_name'], chosen.host,
+                       chosen.free_mb))
+            return self._schedule_now_on_host(context, chosen.host,
+                                              instance_ref['id'])
         LOG.debug("Error scheduling %s" % instance_ref['display_name'])
         raise driver.NoValidHost(_("Insufficient memory on all hosts."))
 
@@ -190,16 +268,17 @@ class UnforgivingMemoryScheduler(MemoryScheduler):
 
     def schedule_run_instance(self, context, instance_id, *_args, **_kwargs):
         base = super(UnforgivingMemoryScheduler, self)
-        try:
-            return base.schedule_run_instance(context, instance_id,
-                                              *_args, **_kwargs)
-        except driver.NoValidHost:
-            db.instance_update(context, 
-                               instance_id, 
-                               {'power_state': power_state.FAILED,
-                                'vm_state': vm_states.ERROR})
-            memory_mb = db.instance_get(context, instance_id)['memory_mb']
-            notifier.notify(publisher_id(), 'out.of.instance.memory',
-                            notifier.ERROR,
-                            {"requested_instance_memory_mb": memory_mb})
-            raise OutOfInstanceMemory(instance_memory_mb=memory_mb)
+        with trace.span(context, 'scheduler.schedule', instance_id):
+            try:
+                return base.schedule_run_instance(context, instance_id,
+                                                  *_args, **_kwargs)
+            except driver.NoValidHost:
+                db.instance_update(context,
+                                   instance_id,
+                                   {'power_state': power_state.FAILED,
+                                    'vm_state': vm_states.ERROR})
+                memory_mb = db.instance_get(context, instance_id)['memory_mb']
+                notifier.notify(publisher_id(), 'out.of.instance.memory',
+                                notifier.ERROR,
+                                {"requested_instance_memory_mb": memory_mb})
+                raise OutOfInstanceMemory(instance_memory_mb=memory_mb)
@@ -15,6 +15,7 @@
 Tests for Instances API calls
 """
 
+import datetime
 import mox
 import json
 import time
@@ -83,6 +84,67 @@ class MgmtApiTest(test.TestCase):
     def test_hosts_restricted(self):
         self._test_path_restricted('hosts')
 
+    def test_hosts_capacity_restricted(self):
+        self._test_path_restricted('hosts/capacity')
+
+    def test_hosts_capacity(self):
+        service = mox.MockAnything()
+        service.host = 'host1'
+        empty = mox.MockAnything()
+        empty.host = 'host2'
+        self.stubs.Set(reddwarf.api.hosts, 'service_get_all_compute_sorted',
+                       lambda ctxt: [(service, 2), (empty, 0)])
+        self.stubs.Set(reddwarf.db.api, 'host_capacity_summary',
+                       lambda ctxt: {'host1': {'instance_count': 2,
+                                               'memory_mb': 1024,
+                                               'volume_gb': 3,
+                                               'states': {'active': 2}}})
+        req = webob.Request.blank(mgmt_url + 'hosts/capacity')
+        admin_context = context.RequestContext('fake', 'fake',
+                                               auth_token=True, is_admin=True)
+        res = req.get_response(util.wsgi_app(fake_auth_context=admin_context))
+        self.assertEqual(res.status_int, 200)
+        hosts = json.loads(res.body)['hosts']
+        self.assertEqual(['host1', 'host2'], [h['name'] for h in hosts])
+        self.assertEqual(2, hosts[0]['instanceCount'])
+        self.assertEqual(1024, hosts[0]['usedRAM'])
+        self.assertEqual(3, hosts[0]['usedVolumeGB'])
+        self.assertEqual({'active': 2}, hosts[0]['states'])
+        self.assertEqual(0, hosts[1]['instanceCount'])
+
+    def _show_host(self, query, count):
+        def show_instances_on_host(ctxt, id, marker, limit):
+            instances = []
+            for i in range(count):
+                instances.append(mox.MockAnything())
+                instances[i].id = i + (marker or 0) + 1
+                instances[i].display_description = 'db'
+                instances[i].vm_state = 'active'
+            return instances[:limit]
+        self.stubs.Set(reddwarf.db.api, 'show_instances_on_host',
+                       show_instances_on_host)
+        self.stubs.Set(reddwarf.db.api, 'instance_get_memory_sum_by_host',
+                       lambda ctxt, id: 512)
+        req = webob.Request.blank(mgmt_url + 'hosts/host1' + query)
+        admin_context = context.RequestContext('fake', 'fake',
+                                               auth_token=True, is_admin=True)
+        res = req.get_response(util.wsgi_app(fake_auth_context=admin_context))
+        self.assertEqual(res.status_int, 200)
+        return json.loads(res.body)['host']
+
+    def test_host_show_links_next_page(self):
+        host = self._show_host('?limit=2&marker=4', 3)
+        self.assertEqual([5, 6], [i['id'] for i in host['instances']])
+        link = host['links'][0]
+        self.assertEqual('next', link['rel'])
+        self.assertTrue(link['href'].endswith('hosts/host1?limit=2&marker=6'),
+                        link['href'])
+
+    def test_host_show_last_page_has_no_link(self):
+        host = self._show_host('?limit=2', 1)
+        self.assertEqual([1], [i['id'] for i in host['instances']])
+        self.assertFalse('links' in host)
+
     def test_images_available_to_admin(self):
         self.stubs.Set(nova.api.openstack.images.Controller,
                        "show", images_show)
@@ -118,6 +180,45 @@ class MgmtApiTest(test.TestCase):
     def test_instances_index_restricted(self):
         self._test_path_restricted('instances')
 
+    def test_timeline_restricted(self):
+        self._test_path_restricted('instances/1/timeline')
+
+    def test_build_timeline(self):
+        started = datetime.datetime(2011, 10, 1, 12, 0, 0)
+
+        def span(name, offset, duration, failed=False):
+            span = models.TraceSpan()
+            span.update({'name': name,
+                         'trace_id': 'req-1',
+                         'host': 'host1',
+                         'started_at': started +
+                                       datetime.timedelta(seconds=offset),
+                         'finished_at': started +
+                             datetime.timedelta(seconds=offset + duration),
+                         'duration': duration,
+                         'failed': failed})
+            return span
+
+        spans = [span('api.create', 0, 2.5),
+                 span('scheduler.schedule', 2, 0.5),
+                 span('compute.run_instance', 2.75, 60.5, failed=True),
+                 span('compute.spawn', 3, 40.0),
+                 span('compute.wait_for_guest', 43.25, 20.0, failed=True)]
+        view = reddwarf.api.views.instances.MgmtViewBuilder()
+        timeline = view.build_timeline('uuid', spans)
+        self.assertEqual('uuid', timeline['id'])
+        self.assertEqual(started, timeline['started'])
+        self.assertEqual(63.25, timeline['duration'])
+        self.assertEqual('compute.spawn', timeline['slowest'])
+        self.assertEqual([0, 2, 2.75, 3, 43.25],
+                         [s['offset'] for s in timeline['spans']])
+        self.assertTrue(timeline['spans'][4]['failed'])
+
+    def test_build_timeline_without_spans(self):
+        view = reddwarf.api.views.instances.MgmtViewBuilder()
+        self.assertEqual({'id': 'uuid', 'spans': []},
+                         view.build_timeline('uuid', []))
+
     def test_get_guest_info_no_dbs(self):
         # Instantiate the controller because we need to inject mocked
         # attributes and methods
@@ -165,14 +266,12 @@ class MgmtApiTest(test.TestCase):
         # Just some mock goodness
         status = mox.MockAnything()
         status.is_sql_running = True
-        self.mox.StubOutWithMock(controller.guest_api, 'list_databases')
-        controller.guest_api.list_databases(FAKE_CONTEXT,
-                                            FAKE_INSTANCE['id'])\
-            .AndReturn(FAKE_DB_LIST)
-        self.mox.StubOutWithMock(controller.guest_api, 'list_users')
-        controller.guest_api.list_users(FAKE_CONTEXT,
-                                        FAKE_INSTANCE['id'])\
-            .AndReturn(FAKE_USER_LIST)
+        self.mox.StubOutWithMock(controller.guest_api, 'describe')
+        controller.guest_api.describe(FAKE_CONTEXT, FAKE_INSTANCE['id'])\
+            .AndReturn({'volume_info': None,
+                        'databases': FAKE_DB_LIST,
+                        'users': FAKE_USER_LIST,
+                        'root_enabled': True})
         self.mox.StubOutWithMock(reddwarf.api.management.dbapi,
                                  'get_root_enabled_history')
         reddwarf.api.management.dbapi.get_root_enabled_history(
@@ -185,7 +284,7 @@ class MgmtApiTest(test.TestCase):
                                               FAKE_INSTANCE)
         self.assertTrue(isinstance(instance['databases'], list))
         self.assertTrue(isinstance(instance['users'], list))
-        self.assertTrue(len(instance['databases']) >= 0)
-        self.assertTrue(len(instance['users']) >= 0)
+        self.assertEqual(len(FAKE_DB_LIST), len(instance['databases']))
+        self.assertEqual(len(FAKE_USER_LIST), len(instance['users']))
         self.assertEqual(root_enabled.created_at, instance['root_enabled_at'])
         self.assertEqual(root_enabled.user_id, instance['root_enabled_by'])
\ No newline at end of file
@@ -27,6 +27,7 @@ from nova import test
 from reddwarf import exception
 from reddwarf.api import config
 from reddwarf.db import api as dbapi
+from reddwarf.db import config as config_cache
 from reddwarf.tests import util
 
 
@@ -137,6 +138,21 @@ class ConfigApiTest(test.TestCase):
         result = dbapi.config_get(test_key)
         self.assertEqual(new_value, result.value)
 
+    def test_config_zcache(self):
+        self.assertEqual(new_value, config_cache.get(test_key))
+        self.assertEqual(int(new_value), config_cache.get_int(test_key))
+        self.assertEqual("default", config_cache.get("missing", "default"))
+        self.assertRaises(exception.ConfigNotFound, config_cache.get,
+                          "missing")
+
+    def test_config_zcache_sees_other_writers(self):
+        self.flags(config_cache_check_interval=0)
+        config_cache.get(test_key)
+        dbapi.config_create('cached_key', 'true')
+        self.assertTrue(config_cache.get_bool('cached_key'))
+        dbapi.config_delete('cached_key')
+        self.assertEqual(None, config_cache.get('cached_key', None))
+
     def test_config_zdelete(self):
         req = webob.Request.blank('%s/%s' % (configs_url, test_key))
         req.method = 'DELETE'
@@ -146,6 +162,32 @@ class ConfigApiTest(test.TestCase):
         req1 = webob.Request.blank('%s/%s' % (configs_url, test_key))
         res = req1.get_response(util.wsgi_app(fake_auth_context=self.context))
 
+    def test_config_version_is_hidden(self):
+        self.assertRaises(exception.ConfigNotFound, dbapi.config_get,
+                          dbapi.CONFIG_VERSION_KEY)
+        req = webob.Request.blank(configs_url)
+        res = req.get_response(util.wsgi_app(fake_auth_context=self.context))
+        keys = [item['key'] for item in json.loads(res.body)['configs']]
+        self.assertFalse(dbapi.CONFIG_VERSION_KEY in keys)
+
+    def test_config_version_can_not_be_deleted(self):
+        version = dbapi.config_get_version()
+        req = webob.Request.blank('%s/%s' % (configs_url,
+                                             dbapi.CONFIG_VERSION_KEY))
+        req.method = 'DELETE'
+        res = req.get_response(util.wsgi_app(fake_auth_context=self.context))
+        self.assertEqual(res.status_int, 400)
+        self.assertEqual(version, dbapi.config_get_version())
+
+    def test_config_version_can_not_be_updated(self):
+        version = dbapi.config_get_version()
+        body = {'config': {'key': dbapi.CONFIG_VERSION_KEY, 'value': 'x'}}
+        req = request_obj('%s/%s' % (configs_url, dbapi.CONFIG_VERSION_KEY),
+                          'PUT', body)
+        res = req.get_response(util.wsgi_app(fake_auth_context=self.context))
+        self.assertEqual(res.status_int, 400)
+        self.assertEqual(version, dbapi.config_get_version())
+
     def test_config_zdelete_nonexistent(self):
         nonexistent = "nonexistent"
         req = webob.Request.blank('%s/%s' % (configs_url, nonexistent))
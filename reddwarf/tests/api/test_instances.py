@@ -115,6 +115,53 @@ class InstanceApiTest(test.TestCase):
         self.assertEqual(res.status_int, 202)
         self.assertEqual(res.body, '')
 
+class InstanceApiCreateTest(test.TestCase):
+    """Test the guest queue is declared when an instance is created"""
+
+    def setUp(self):
+        super(InstanceApiCreateTest, self).setUp()
+        self.flags(trace_builds=False)
+        self.context = context.get_admin_context()
+        self.controller = instances.Controller()
+        self.queues = []
+        self.stubs.Set(self.controller, "create_volume",
+                       lambda context, body: {'id': 2, 'size': 1})
+        self.stubs.Set(self.controller, "_setup_security_groups",
+                       lambda context, group_name, port: None)
+        self.stubs.Set(self.controller, "_create_server_dict",
+                       lambda instance, volume_id, mount_point: {})
+        self.stubs.Set(self.controller, "_try_create_server",
+                       lambda req, body: {'server': {'uuid': 'abc', 'id': 1}})
+        self.stubs.Set(self.controller.view, "build_single",
+                       lambda server, req, status_lookup, create: {})
+        self.stubs.Set(reddwarf.db.api, "guest_status_create",
+                       lambda id: None)
+        self.stubs.Set(reddwarf.db.api, "guest_status_get_list",
+                       lambda ids: [])
+        self.body = {'instance': {'flavorRef': 1, 'volume': {'size': 1}}}
+        self.req = webob.Request.blank(instances_url)
+        self.req.environ['nova.context'] = self.context
+
+    def tearDown(self):
+        self.stubs.UnsetAll()
+        super(InstanceApiCreateTest, self).tearDown()
+
+    def test_create_declares_guest_queue(self):
+        self.stubs.Set(self.controller.guest_api, "create_queue",
+                       lambda context, id: self.queues.append(id))
+        result = self.controller.create(self.req, self.body)
+        self.assertEqual([1], self.queues)
+        self.assertEqual({'size': 1}, result['instance']['volume'])
+
+    def test_create_survives_queue_failure(self):
+        def create_queue(context, id):
+            raise Exception("broker is down")
+        self.stubs.Set(self.controller.guest_api, "create_queue",
+                       create_queue)
+        result = self.controller.create(self.req, self.body)
+        self.assertEqual({'size': 1}, result['instance']['volume'])
+
+
 class InstanceApiValidation(test.TestCase):
     """
     Test the instance api validation methods
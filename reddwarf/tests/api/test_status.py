@@ -71,14 +71,9 @@ def fake_instance_get(context, id):
     return fake_instance
 
 def fake_guest_status_get_list(id_list=None):
-    class GSGL(object):
-        def __init__(self):
-            self.all_things = []
-            if id_list is not None:
-                self.all_things = [fake_status()]
-        def all(self):
-            return self.all_things
-    return GSGL()
+    if id_list is None:
+        return []
+    return [fake_status()]
 
 class StatusApiTest(test.TestCase):
 
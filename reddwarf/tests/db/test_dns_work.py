@@ -0,0 +1,119 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for the DNS work queue in reddwarf.db.api.
+"""
+
+import datetime
+
+from nova import test
+from nova.db.sqlalchemy.session import get_session
+
+from reddwarf.db import api as dbapi
+from reddwarf.db import models
+from reddwarf.tests import util
+
+
+def _get(id):
+    return get_session().query(models.DnsWorkItem).filter_by(id=id).one()
+
+
+class DnsWorkQueueTest(test.TestCase):
+    """Test queuing, claiming, retrying and completing DNS work"""
+
+    def setUp(self):
+        super(DnsWorkQueueTest, self).setUp()
+        util.reset_database()
+        util.db_sync()
+
+    def test_enqueue_is_idempotent_while_pending(self):
+        first = dbapi.dns_work_enqueue('create', 1, '10.0.0.1')
+        second = dbapi.dns_work_enqueue('create', 1, '10.0.0.1')
+        self.assertEqual(first.id, second.id)
+        other = dbapi.dns_work_enqueue('delete', 1, '10.0.0.1')
+        self.assertNotEqual(first.id, other.id)
+
+    def test_enqueue_after_completion_adds_new_item(self):
+        first = dbapi.dns_work_enqueue('create', 1, '10.0.0.1')
+        dbapi.dns_work_complete(first.id)
+        second = dbapi.dns_work_enqueue('create', 1, '10.0.0.1')
+        self.assertNotEqual(first.id, second.id)
+
+    def test_claim_marks_items_running(self):
+        first = dbapi.dns_work_enqueue('create', 1, '10.0.0.1')
+        second = dbapi.dns_work_enqueue('create', 2, '10.0.0.2')
+        claimed = dbapi.dns_work_claim(10, 600)
+        self.assertEqual([first.id, second.id],
+                         [item.id for item in claimed])
+        self.assertEqual('running', _get(first.id).state)
+
+    def test_claim_respects_limit(self):
+        for instance_id in range(3):
+            dbapi.dns_work_enqueue('create', instance_id, '10.0.0.1')
+        self.assertEqual(2, len(dbapi.dns_work_claim(2, 600)))
+        self.assertEqual(1, len(dbapi.dns_work_claim(2, 600)))
+
+    def test_double_claim_gets_nothing(self):
+        dbapi.dns_work_enqueue('create', 1, '10.0.0.1')
+        self.assertEqual(1, len(dbapi.dns_work_claim(10, 600)))
+        self.assertEqual([], dbapi.dns_work_claim(10, 600))
+
+    def test_stale_claim_is_taken_over(self):
+        item = dbapi.dns_work_enqueue('create', 1, '10.0.0.1')
+        dbapi.dns_work_claim(10, 600)
+        self.assertEqual([], dbapi.dns_work_claim(10, 600))
+        # Claims older than the timeout belong to a dead worker.
+        self.assertEqual([item.id], [claimed.id for claimed in
+                                     dbapi.dns_work_claim(10, -1)])
+
+    def test_retry_backs_off(self):
+        item = dbapi.dns_work_enqueue('create', 1, '10.0.0.1')
+        dbapi.dns_work_claim(10, 600)
+        before = datetime.datetime.utcnow()
+        self.assertTrue(dbapi.dns_work_retry(item.id, 'boom', 30, 5))
+        retried = _get(item.id)
+        self.assertEqual('queued', retried.state)
+        self.assertEqual(1, retried.attempts)
+        self.assertEqual('boom', retried.last_error)
+        self.assertTrue(retried.next_attempt_at >=
+                        before + datetime.timedelta(seconds=30))
+        # Not due yet, so it isn't claimed.
+        self.assertEqual([], dbapi.dns_work_claim(10, 600))
+
+        self.assertTrue(dbapi.dns_work_retry(item.id, 'boom', 30, 5))
+        self.assertTrue(_get(item.id).next_attempt_at >=
+                        before + datetime.timedelta(seconds=60))
+
+    def test_retry_gives_up_after_max_attempts(self):
+        item = dbapi.dns_work_enqueue('create', 1, '10.0.0.1')
+        self.assertTrue(dbapi.dns_work_retry(item.id, 'boom', 0, 2))
+        self.assertFalse(dbapi.dns_work_retry(item.id, 'boom', 0, 2))
+        self.assertEqual('failed', _get(item.id).state)
+        self.assertEqual([], dbapi.dns_work_claim(10, 600))
+
+    def test_retried_item_is_claimed_when_due(self):
+        item = dbapi.dns_work_enqueue('create', 1, '10.0.0.1')
+        dbapi.dns_work_claim(10, 600)
+        dbapi.dns_work_retry(item.id, 'boom', 0, 5)
+        self.assertEqual([item.id], [claimed.id for claimed in
+                                     dbapi.dns_work_claim(10, 600)])
+
+    def test_complete(self):
+        item = dbapi.dns_work_enqueue('create', 1, '10.0.0.1')
+        dbapi.dns_work_claim(10, 600)
+        dbapi.dns_work_complete(item.id)
+        completed = _get(item.id)
+        self.assertEqual('done', completed.state)
+        self.assertTrue(completed.deleted)
+        self.assertEqual([], dbapi.dns_work_claim(10, 600))
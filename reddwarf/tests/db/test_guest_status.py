@@ -0,0 +1,71 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for the guest status helpers in reddwarf.db.api.
+"""
+
+from nova import exception as nova_exception
+from nova import test
+
+from reddwarf.db import api as dbapi
+from reddwarf.guest import status as guest_status
+from reddwarf.tests import util
+
+
+class GuestStatusDbTest(test.TestCase):
+    """Test the core sql guest status reads and writes"""
+
+    def test_000_reset(self):
+        util.reset_database()
+        util.db_sync()
+
+    def test_create_and_get(self):
+        dbapi.guest_status_create(501)
+        result = dbapi.guest_status_get(501)
+        self.assertEqual(501, result.instance_id)
+        self.assertFalse(result.deleted)
+
+    def test_update(self):
+        dbapi.guest_status_update(501, guest_status.RUNNING)
+        self.assertEqual(guest_status.RUNNING.code,
+                         dbapi.guest_status_get(501).state)
+
+    def test_update_many(self):
+        dbapi.guest_status_create(502)
+        dbapi.guest_status_update_many([(501, guest_status.SHUTDOWN),
+                                        (502, guest_status.RUNNING)])
+        states = dict((row.instance_id, row.state) for row in
+                      dbapi.guest_status_get_list([501, 502]))
+        self.assertEqual({501: guest_status.SHUTDOWN.code,
+                          502: guest_status.RUNNING.code}, states)
+
+    def test_update_on_given_session(self):
+        session = dbapi.get_session()
+        session.begin()
+        dbapi._guest_status_execute(session, 'update',
+                                    {'id': 501,
+                                     'state': guest_status.RUNNING.code,
+                                     'state_description': 'running'})
+        self.assertEqual(guest_status.RUNNING.code,
+                         dbapi.guest_status_get(501, session=session).state)
+        session.rollback()
+        self.assertEqual(guest_status.SHUTDOWN.code,
+                         dbapi.guest_status_get(501).state)
+
+    def test_zdelete(self):
+        dbapi.guest_status_delete(502)
+        self.assertRaises(nova_exception.InstanceNotFound,
+                          dbapi.guest_status_get, 502)
+        self.assertEqual([501], [row.instance_id for row in
+                                 dbapi.guest_status_get_list([501, 502])])
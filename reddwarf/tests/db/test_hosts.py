@@ -0,0 +1,88 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for the host usage queries in reddwarf.db.api.
+"""
+
+from nova import context
+from nova import db
+from nova import test
+
+from reddwarf.db import api as dbapi
+from reddwarf.tests import util
+
+
+class HostUsageTest(test.TestCase):
+    """Test the host capacity summary and the instances listed by host"""
+
+    def setUp(self):
+        super(HostUsageTest, self).setUp()
+        util.reset_database()
+        util.db_sync()
+        self.context = context.get_admin_context()
+        db.service_create(self.context, {'host': 'host1',
+                                         'binary': 'nova-compute',
+                                         'topic': 'compute',
+                                         'report_count': 0,
+                                         'disabled': False})
+
+    def _instance(self, host, vm_state='active', memory_mb=512,
+                  volumes=()):
+        instance = db.instance_create(self.context, {'host': host,
+                                                     'vm_state': vm_state,
+                                                     'memory_mb': memory_mb})
+        for size in volumes:
+            db.volume_create(self.context, {'instance_id': instance['id'],
+                                            'size': size})
+        return instance['id']
+
+    def test_capacity_summary(self):
+        self._instance('host1', volumes=(1, 2))
+        self._instance('host1', vm_state='building', memory_mb=1024)
+        self._instance('host2', volumes=(4,))
+        summary = dbapi.host_capacity_summary(self.context)
+        self.assertEqual(['host1', 'host2'], sorted(summary))
+        self.assertEqual({'instance_count': 2,
+                          'memory_mb': 1536,
+                          'volume_gb': 3,
+                          'states': {'active': 1, 'building': 1}},
+                         summary['host1'])
+        self.assertEqual(4, summary['host2']['volume_gb'])
+
+    def test_capacity_summary_names_missing_state(self):
+        self._instance('host1', vm_state=None)
+        summary = dbapi.host_capacity_summary(self.context)
+        self.assertEqual({'pending': 1}, summary['host1']['states'])
+
+    def test_capacity_summary_skips_deleted(self):
+        deleted = self._instance('host1', volumes=(8,))
+        db.instance_destroy(self.context, deleted)
+        kept = self._instance('host1')
+        volume = db.volume_create(self.context, {'instance_id': kept,
+                                                 'size': 16})
+        db.volume_destroy(self.context, volume['id'])
+        self._instance(None)
+        summary = dbapi.host_capacity_summary(self.context)
+        self.assertEqual(['host1'], summary.keys())
+        self.assertEqual(1, summary['host1']['instance_count'])
+        self.assertEqual(0, summary['host1']['volume_gb'])
+
+    def test_instances_on_host_by_page(self):
+        ids = [self._instance('host1') for i in range(3)]
+        self._instance('host2')
+        page = dbapi.show_instances_on_host(self.context, 'host1', limit=2)
+        self.assertEqual(ids[:2], [instance.id for instance in page])
+        page = dbapi.show_instances_on_host(self.context, 'host1',
+                                            marker=ids[1], limit=2)
+        self.assertEqual(ids[2:], [instance.id for instance in page])
@@ -0,0 +1,53 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for the root enabled history in reddwarf.db.api.
+"""
+
+from nova import context
+from nova import test
+
+from reddwarf.db import api as dbapi
+from reddwarf.db import models
+from reddwarf.tests import util
+
+
+def _no_replica():
+    raise AssertionError("The replica may lag behind the insert")
+
+
+class RootEnabledHistoryTest(test.TestCase):
+    """Test root enabled history is recorded once per instance"""
+
+    def setUp(self):
+        super(RootEnabledHistoryTest, self).setUp()
+        util.reset_database()
+        util.db_sync()
+        self.context = context.get_admin_context()
+
+    def test_record_checks_the_primary(self):
+        self.stubs.Set(dbapi, 'get_replica_session', _no_replica)
+        dbapi.record_root_enabled_history(self.context, 7, 1)
+        record = dbapi.record_root_enabled_history(self.context, 7, 2)
+        self.assertEqual(1, record.user_id)
+        session = dbapi.get_session()
+        self.assertEqual(1, session.query(models.RootEnabledHistory).\
+                                    filter_by(instance_id=7).count())
+
+    def test_get_after_record(self):
+        dbapi.record_root_enabled_history(self.context, 7, 1)
+        history = dbapi.get_root_enabled_history(self.context, 7)
+        self.assertEqual(1, history.user_id)
+        self.assertEqual(None, dbapi.get_root_enabled_history(self.context,
+                                                              8))
@@ -0,0 +1,93 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for the local mirror of the DNS zone in reddwarf.db.api.
+"""
+
+from nova import test
+
+from reddwarf.db import api as dbapi
+from reddwarf.tests import util
+
+
+def _record(name, id, data, type='A', ttl=300):
+    return {'name': name, 'id': id, 'type': type, 'data': data, 'ttl': ttl}
+
+
+class RsDnsRecordMirrorTest(test.TestCase):
+    """Test lookups and syncs of the rsdns_records mirror"""
+
+    def setUp(self):
+        super(RsDnsRecordMirrorTest, self).setUp()
+        util.reset_database()
+        util.db_sync()
+        dbapi.rsdns_record_create('a.example.com', 'A-1', type='A',
+                                  data='10.0.0.1', ttl=300)
+        dbapi.rsdns_record_create('b.example.com', 'A-2', type='A',
+                                  data='10.0.0.2', ttl=300)
+
+    def test_find_by_name(self):
+        records = dbapi.rsdns_record_find(name='a.example.com')
+        self.assertEqual(['A-1'], [record.id for record in records])
+
+    def test_find_by_data(self):
+        records = dbapi.rsdns_record_find(data='10.0.0.2')
+        self.assertEqual(['b.example.com'],
+                         [record.name for record in records])
+
+    def test_find_by_name_and_data(self):
+        self.assertEqual([], dbapi.rsdns_record_find(name='a.example.com',
+                                                     data='10.0.0.2'))
+
+    def test_find_by_type(self):
+        dbapi.rsdns_record_create('c.example.com', 'TXT-1', type='TXT',
+                                  data='10.0.0.1', ttl=300)
+        records = dbapi.rsdns_record_find(data='10.0.0.1', type='A')
+        self.assertEqual(['A-1'], [record.id for record in records])
+
+    def test_find_by_zone(self):
+        dbapi.rsdns_record_create('a.example.org', 'A-3', type='A',
+                                  data='10.0.0.1', ttl=300)
+        dbapi.rsdns_record_create('a.notexample.com', 'A-4', type='A',
+                                  data='10.0.0.1', ttl=300)
+        records = dbapi.rsdns_record_find(data='10.0.0.1',
+                                          zone='example.com')
+        self.assertEqual(['A-1'], [record.id for record in records])
+
+    def test_sync_inserts_updates_and_prunes(self):
+        result = dbapi.rsdns_record_sync(
+            [_record('a.example.com', 'A-1', '10.0.0.9'),
+             _record('c.example.com', 'A-3', '10.0.0.3')])
+        self.assertEqual((1, 1, 1), result)
+        records = dict((record.name, record) for record in
+                       dbapi.rsdns_record_find())
+        self.assertEqual(['a.example.com', 'c.example.com'],
+                         sorted(records))
+        self.assertEqual('10.0.0.9', records['a.example.com'].data)
+        self.assertEqual('A-3', records['c.example.com'].id)
+
+    def test_sync_without_changes(self):
+        result = dbapi.rsdns_record_sync(
+            [_record('a.example.com', 'A-1', '10.0.0.1'),
+             _record('b.example.com', 'A-2', '10.0.0.2')])
+        self.assertEqual((0, 0, 0), result)
+
+    def test_sync_keeps_first_record_of_a_name(self):
+        result = dbapi.rsdns_record_sync(
+            [_record('a.example.com', 'A-1', '10.0.0.1'),
+             _record('a.example.com', 'A-7', '10.0.0.7'),
+             _record('b.example.com', 'A-2', '10.0.0.2')])
+        self.assertEqual((0, 0, 0), result)
+        self.assertEqual(['A-1'], [record.id for record in
+                         dbapi.rsdns_record_find(name='a.example.com')])
@@ -0,0 +1,129 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for the record mirror kept by the RS DNS driver.
+"""
+
+from nova import test
+
+from reddwarf import exception
+from reddwarf.db import api as dbapi
+from reddwarf.dns.driver import DnsEntry
+from reddwarf.dns.rsdns import driver
+from reddwarf.tests import util
+
+
+class FakeRecord(object):
+
+    def __init__(self, name, id, data, type='A', ttl=300):
+        self.name = name
+        self.id = id
+        self.data = data
+        self.type = type
+        self.ttl = ttl
+
+
+class FakeFuture(object):
+
+    def __init__(self, resource):
+        self.ready = True
+        self.resource = resource
+
+
+class FakeRecords(object):
+
+    def __init__(self, records):
+        self.records = records
+        self.listed = []
+        self.rejected = []
+
+    def list(self, **kwargs):
+        self.listed.append(kwargs)
+        return self.records
+
+    def create_many(self, domain, records):
+        return FakeFuture([FakeRecord(record['name'], 'new-%d' % i,
+                                      record['data'])
+                           for i, record in enumerate(records)
+                           if record['name'] not in self.rejected])
+
+
+class FakeClient(object):
+
+    def __init__(self, records):
+        self.records = FakeRecords(records)
+
+
+class RsDnsDriverMirrorTest(test.TestCase):
+    """Test lookups answered from rsdns_records and its reconcile"""
+
+    def setUp(self):
+        super(RsDnsDriverMirrorTest, self).setUp()
+        util.reset_database()
+        util.db_sync()
+        self.zone = driver.RsDnsZone(id=7, name='example.com')
+        self.client = FakeClient([FakeRecord('a.example.com', 'A-1',
+                                             '10.0.0.1'),
+                                  FakeRecord('b.example.com', 'A-2',
+                                             '10.0.0.2')])
+        # Skip __init__, which authenticates against RS DNS.
+        self.driver = driver.RsDnsDriver.__new__(driver.RsDnsDriver)
+        self.driver.dns_client = self.client
+        self.driver.default_dns_zone = self.zone
+        self.driver.converter = driver.EntryToRecordConverter(self.zone)
+
+    def test_reconcile_fills_mirror(self):
+        self.driver.reconcile()
+        self.assertEqual([{'domain_id': 7}], self.client.records.listed)
+        names = sorted(record.name for record in dbapi.rsdns_record_find())
+        self.assertEqual(['a.example.com', 'b.example.com'], names)
+
+    def test_lookups_are_served_from_mirror(self):
+        self.driver.reconcile()
+        self.client.records.listed = []
+        entries = self.driver.get_entries(content='10.0.0.2')
+        self.assertEqual(['b.example.com'], [entry.name for entry in entries])
+        self.assertEqual(self.zone, entries[0].dns_zone)
+        entries = self.driver.get_entries_by_name('a.example.com')
+        self.assertEqual(['10.0.0.1'], [entry.content for entry in entries])
+        self.assertEqual([], self.client.records.listed)
+
+    def test_lookup_of_unknown_name(self):
+        self.driver.reconcile()
+        self.assertEqual([], self.driver.get_entries(name='c.example.com'))
+
+    def test_lookups_only_return_a_records_of_the_zone(self):
+        self.client.records.records.extend(
+            [FakeRecord('t.example.com', 'TXT-1', '10.0.0.1', type='TXT'),
+             FakeRecord('c.example.org', 'A-3', '10.0.0.1')])
+        self.driver.reconcile()
+        entries = self.driver.get_entries_by_content('10.0.0.1')
+        self.assertEqual(['a.example.com'], [entry.name for entry in entries])
+
+    def test_unfiltered_listing_pages_through_zone(self):
+        entries = self.driver.get_entries()
+        self.assertEqual(2, len(entries))
+        self.assertEqual([{'domain_id': 7}], self.client.records.listed)
+
+    def test_create_entries_reports_records_not_created(self):
+        self.client.records.rejected = ['d.example.com']
+        entries = [DnsEntry('c.example.com', '10.0.0.3', 'A', ttl=300),
+                   DnsEntry('d.example.com', '10.0.0.4', 'A', ttl=300)]
+        try:
+            self.driver.create_entries(entries)
+            self.fail("DnsRecordsNotCreated was not raised")
+        except exception.DnsRecordsNotCreated as e:
+            self.assertEqual(['d.example.com'], e.names)
+        names = [record.name for record in dbapi.rsdns_record_find()]
+        self.assertEqual(['c.example.com'], names)
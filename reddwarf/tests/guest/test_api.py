@@ -0,0 +1,135 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for reddwarf.guest.api.
+"""
+
+import time
+
+from eventlet import greenthread
+
+from nova import test
+from nova.rpc import common as rpc_common
+from reddwarf import exception
+from reddwarf.guest import api
+
+
+def _sleep_and_return(seconds, value):
+    greenthread.sleep(seconds)
+    return value
+
+
+def _raise_error():
+    raise ValueError("guest exploded")
+
+
+class FanOutTest(test.TestCase):
+    """Test the concurrent guest calls"""
+
+    def test_calls_run_concurrently(self):
+        start = time.time()
+        results, errors = api.fan_out({
+            'a': lambda: _sleep_and_return(0.2, 1),
+            'b': lambda: _sleep_and_return(0.2, 2),
+            'c': lambda: _sleep_and_return(0.2, 3),
+            })
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertEqual({'a': 1, 'b': 2, 'c': 3}, results)
+        self.assertEqual({}, errors)
+
+    def test_errors_are_collected(self):
+        results, errors = api.fan_out({'ok': lambda: 1,
+                                       'bad': _raise_error})
+        self.assertEqual({'ok': 1}, results)
+        self.assertTrue(isinstance(errors['bad'], ValueError))
+
+    def test_deadline_is_shared(self):
+        start = time.time()
+        results, errors = api.fan_out({
+            'fast': lambda: _sleep_and_return(0, 1),
+            'slow': lambda: _sleep_and_return(5, 2),
+            'slower': lambda: _sleep_and_return(10, 3),
+            }, timeout=0.2)
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual({'fast': 1}, results)
+        self.assertTrue(isinstance(errors['slow'], rpc_common.Timeout))
+        self.assertTrue(isinstance(errors['slower'], rpc_common.Timeout))
+
+
+class FakeGuest(object):
+    """Answers rpc calls like a guest, failing the methods in failures."""
+
+    DETAILS = {'get_filesystem_stats': {'used': 1024},
+               'list_databases': [],
+               'list_users': [],
+               'is_root_enabled': True}
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.methods = []
+
+    def call(self, context, topic, msg, timeout=None):
+        method = msg['method']
+        self.methods.append(method)
+        if method in self.failures:
+            raise self.failures[method]
+        return self.DETAILS[method]
+
+
+class DescribeTest(test.TestCase):
+    """Test asking a guest for its details"""
+
+    def setUp(self):
+        super(DescribeTest, self).setUp()
+        api.DESCRIBE_UNSUPPORTED.clear()
+        self.api = api.API()
+        self.stubs.Set(self.api, '_get_routing_key',
+                       lambda context, id: "guest.instance-%s" % id)
+
+    def tearDown(self):
+        api.DESCRIBE_UNSUPPORTED.clear()
+        super(DescribeTest, self).tearDown()
+
+    def _guest(self, failures):
+        guest = FakeGuest(failures)
+        self.stubs.Set(api.rpc, 'call', guest.call)
+        return guest
+
+    def test_cpp_guest_without_describe(self):
+        # The C++ guest fails unknown methods with a plain message.
+        guest = self._guest({'describe': Exception(
+            "Could not handle the JSON input. No such method was found.")})
+        details = self.api.describe(None, 1)
+        self.assertEqual({'volume_info': {'used': 1024},
+                          'databases': [],
+                          'users': [],
+                          'root_enabled': True}, details)
+        self.assertEqual('describe', guest.methods[0])
+        # The guest is not asked to describe itself again.
+        guest.methods = []
+        self.api.describe(None, 1)
+        self.assertFalse('describe' in guest.methods)
+        self.assertEqual(4, len(guest.methods))
+
+    def test_remote_error_falls_back_each_time(self):
+        guest = self._guest({'describe': rpc_common.RemoteError(
+            'OperationalError', 'MySQL went away', '')})
+        self.assertEqual(True, self.api.describe(None, 1)['root_enabled'])
+        guest.methods = []
+        self.api.describe(None, 1)
+        self.assertEqual('describe', guest.methods[0])
+
+    def test_timeout_is_a_guest_error(self):
+        self._guest({'describe': rpc_common.Timeout()})
+        self.assertRaises(exception.GuestError, self.api.describe, None, 1)
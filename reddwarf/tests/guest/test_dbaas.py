@@ -0,0 +1,148 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for reddwarf.guest.dbaas.
+"""
+
+from sqlalchemy import exc
+
+from nova import test
+from reddwarf.guest import dbaas
+
+
+class FakeAgent(object):
+
+    def __init__(self):
+        self.reads = 0
+
+    @dbaas.cached_read
+    def list_databases(self):
+        self.reads += 1
+        return ["db%d" % self.reads]
+
+    @dbaas.invalidates_reads
+    def create_database(self, databases):
+        pass
+
+
+class ReadCacheTest(test.TestCase):
+    """Test the guest side cache of read only listings"""
+
+    def setUp(self):
+        super(ReadCacheTest, self).setUp()
+        dbaas.READ_CACHE.clear()
+        self.fingerprint = (1, 1)
+        self.stubs.Set(dbaas, 'data_fingerprint', lambda: self.fingerprint)
+        self.agent = FakeAgent()
+
+    def tearDown(self):
+        dbaas.READ_CACHE.clear()
+        super(ReadCacheTest, self).tearDown()
+
+    def test_repeated_reads_are_cached(self):
+        self.assertEqual(["db1"], self.agent.list_databases())
+        self.assertEqual(["db1"], self.agent.list_databases())
+        self.assertEqual(1, self.agent.reads)
+
+    def test_mutating_call_invalidates(self):
+        self.agent.list_databases()
+        self.agent.create_database([])
+        self.assertEqual(["db2"], self.agent.list_databases())
+
+    def test_fingerprint_change_invalidates(self):
+        self.agent.list_databases()
+        self.fingerprint = (2, 1)
+        self.assertEqual(["db2"], self.agent.list_databases())
+
+    def test_zero_ttl_disables_cache(self):
+        self.flags(guest_read_cache_ttl=0)
+        self.agent.list_databases()
+        self.agent.list_databases()
+        self.assertEqual(2, self.agent.reads)
+
+
+class FakeResult(object):
+
+    def __init__(self, row):
+        self.row = row
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeConnection(object):
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def begin(self):
+        return self
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+    def execute(self, statement, params):
+        self.engine.statements.append(statement)
+        if self.engine.error:
+            raise self.engine.error
+        return FakeResult(self.engine.row)
+
+
+class FakeEngine(object):
+
+    def __init__(self, row=None, error=None):
+        self.row = row
+        self.error = error
+        self.statements = []
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class DataFingerprintTest(test.TestCase):
+    """Test the marker for changes made outside of the agent"""
+
+    def _engine(self, engine):
+        self.stubs.Set(dbaas, 'get_engine', lambda: engine)
+        return engine
+
+    def test_single_query(self):
+        engine = self._engine(FakeEngine(row=(3, 123, 2, 456)))
+        self.assertEqual((3, 123, 2, 456), dbaas.data_fingerprint())
+        self.assertEqual([dbaas.FINGERPRINT], engine.statements)
+
+    def test_no_engine(self):
+        self._engine(None)
+        self.assertEqual(None, dbaas.data_fingerprint())
+
+    def test_mysql_down(self):
+        self._engine(FakeEngine(error=exc.OperationalError("SELECT", {},
+                                                           "gone away")))
+        self.assertEqual(None, dbaas.data_fingerprint())
+
+
+class FileSystemStatsTest(test.TestCase):
+    """Test the volume info reported by the guest"""
+
+    def test_reports_bytes_used(self):
+        stats = dbaas.DBaaSAgent().get_filesystem_stats("/")
+        self.assertEqual(stats['total'], stats['used'] + stats['free'])
+        self.assertEqual(stats['total'],
+                         stats['total_blocks'] * stats['block_size'])
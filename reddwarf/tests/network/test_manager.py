@@ -0,0 +1,108 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for queuing DNS work from reddwarf.network.manager.
+"""
+
+from nova import context
+from nova import exception
+from nova import test
+
+from reddwarf.network import manager
+
+
+NETWORKS = {1: {'id': 1, 'bridge': 'br100'},
+            2: {'id': 2, 'bridge': 'br200'},
+            3: {'id': 3, 'bridge': 'br100'}}
+
+
+class FakeDb(object):
+
+    def __init__(self):
+        self.network_gets = []
+
+    def network_get(self, context, network_id):
+        self.network_gets.append(network_id)
+        if network_id not in NETWORKS:
+            raise exception.NetworkNotFound(network_id=network_id)
+        return NETWORKS[network_id]
+
+
+class FakeDnsApi(object):
+
+    def __init__(self):
+        self.nudges = 0
+
+    def process_queued_work(self, context):
+        self.nudges += 1
+
+
+class FixedIpDnsEntriesTest(test.TestCase):
+    """Test how the DNS address is found and its work queued"""
+
+    def setUp(self):
+        super(FixedIpDnsEntriesTest, self).setUp()
+        self.flags(dns_bridge_name='br100')
+        self.context = context.get_admin_context()
+        # Skip NetworkManager.__init__, which loads the network driver.
+        self.manager = manager.FixedIpDnsEntries.__new__(
+            manager.FixedIpDnsEntries)
+        self.manager.db = FakeDb()
+        self.manager.dns_api = FakeDnsApi()
+        self.queued = []
+        self.stubs.Set(manager.db_api, 'dns_work_enqueue',
+                       lambda *args: self.queued.append(args))
+
+    def test_queue_dns_work(self):
+        self.manager._queue_dns_work(self.context, 'create', 5, '10.0.0.5')
+        self.assertEqual([('create', 5, '10.0.0.5')], self.queued)
+        self.assertEqual(1, self.manager.dns_api.nudges)
+
+    def test_queue_dns_work_without_address(self):
+        self.manager._queue_dns_work(self.context, 'create', 5, None)
+        self.assertEqual([], self.queued)
+        self.assertEqual(0, self.manager.dns_api.nudges)
+
+    def test_find_address_in_network_info(self):
+        network_info = [({'bridge': 'br200'}, {'ips': [{'ip': '10.2.0.5'}]}),
+                        ({'bridge': 'br100'}, {'ips': [{'ip': '10.1.0.5'}]})]
+        self.assertEqual('10.1.0.5',
+            self.manager._find_address_in_network_info(network_info))
+        self.assertEqual(None,
+            self.manager._find_address_in_network_info(network_info[:1]))
+        self.assertEqual(None,
+            self.manager._find_address_in_network_info(None))
+
+    def test_find_address_in_fixed_ips(self):
+        fixed_ips = [{'network_id': 2, 'address': '10.2.0.5'},
+                     {'network_id': 1, 'address': '10.1.0.5'}]
+        self.assertEqual('10.1.0.5',
+            self.manager._find_address_in_fixed_ips(self.context, fixed_ips))
+
+    def test_find_address_checks_each_network(self):
+        # Networks 1 and 3 both use the DNS bridge, as vlan hosts serving
+        # several networks may; neither is remembered for the next call.
+        first = [{'network_id': 1, 'address': '10.1.0.5'}]
+        second = [{'network_id': 2, 'address': '10.2.0.6'},
+                  {'network_id': 3, 'address': '10.3.0.6'}]
+        self.assertEqual('10.1.0.5',
+            self.manager._find_address_in_fixed_ips(self.context, first))
+        self.assertEqual('10.3.0.6',
+            self.manager._find_address_in_fixed_ips(self.context, second))
+        self.assertEqual([1, 2, 3], self.manager.db.network_gets)
+
+    def test_find_address_with_missing_network(self):
+        fixed_ips = [{'network_id': 9, 'address': '10.9.0.5'}]
+        self.assertEqual(None,
+            self.manager._find_address_in_fixed_ips(self.context, fixed_ips))
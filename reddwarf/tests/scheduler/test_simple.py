@@ -0,0 +1,103 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests for the memory model of reddwarf.scheduler.simple.
+"""
+
+from nova import test
+from nova.scheduler import driver
+from reddwarf.scheduler import simple
+
+
+GB = 1024 * simple.MB
+
+INSTANCE = {'id': 1, 'display_name': 'db1', 'memory_mb': 2048}
+
+
+def _caps(total_gb, rss_gb):
+    return {'host_memory_total': total_gb * GB,
+            'host_memory_rss': rss_gb * GB}
+
+
+class HostMemoryTest(test.TestCase):
+    """Test the capacity of a single host"""
+
+    def setUp(self):
+        super(HostMemoryTest, self).setUp()
+        self.flags(max_instance_memory_mb=4096,
+                   memory_host_reserved_mb=1024,
+                   memory_overcommit_ratio=1.5,
+                   memory_rss_max_percent=90)
+
+    def test_without_capabilities_uses_flat_limit(self):
+        host = simple.HostMemory({'host': 'a'}, 3072)
+        self.assertEqual(host.capacity_mb, 4096)
+        self.assertTrue(host.fits(1024))
+        self.assertFalse(host.fits(2048))
+
+    def test_overcommits_reported_memory(self):
+        # 9GB usable, 13.5GB may be handed out.
+        self.flags(max_instance_memory_mb=16 * 1024)
+        host = simple.HostMemory({'host': 'a'}, 12 * 1024, _caps(10, 2))
+        self.assertEqual(host.capacity_mb, 13.5 * 1024)
+        self.assertTrue(host.fits(1024))
+        self.assertFalse(host.fits(2048))
+
+    def test_reported_memory_is_capped(self):
+        host = simple.HostMemory({'host': 'a'}, 3072, _caps(10, 2))
+        self.assertEqual(host.capacity_mb, 4096)
+        self.assertFalse(host.fits(2048))
+
+    def test_busy_host_is_full_before_its_commitment(self):
+        self.flags(max_instance_memory_mb=16 * 1024)
+        host = simple.HostMemory({'host': 'a'}, 4096, _caps(10, 7))
+        self.assertFalse(host.fits(2048))
+        self.assertTrue(host.fits(512))
+
+
+class MemorySchedulerTest(test.TestCase):
+    """Test the choice of host"""
+
+    def setUp(self):
+        super(MemorySchedulerTest, self).setUp()
+        self.flags(memory_host_reserved_mb=0, memory_overcommit_ratio=1.0)
+        self.scheduler = simple.MemoryScheduler()
+        self.capabilities = {'empty': _caps(16, 1),
+                             'half': _caps(16, 4),
+                             'full': _caps(16, 8)}
+        results = [({'host': 'empty'}, 1024),
+                   ({'host': 'half'}, 8 * 1024),
+                   ({'host': 'full'}, 15 * 1024)]
+        self.stubs.Set(simple.db_api, 'service_get_all_compute_memory',
+                       lambda context: results)
+        self.stubs.Set(self.scheduler, 'service_is_up', lambda service: True)
+        self.stubs.Set(self.scheduler, '_host_capabilities',
+                       lambda host: self.capabilities[host])
+        self.stubs.Set(self.scheduler, '_schedule_now_on_host',
+                       lambda context, host, instance_id: host)
+
+    def test_spreads_to_emptiest_host(self):
+        host = self.scheduler._schedule_based_on_resources(None, INSTANCE)
+        self.assertEqual(host, 'empty')
+
+    def test_packs_fullest_host_that_fits(self):
+        self.flags(memory_pack_hosts=True)
+        host = self.scheduler._schedule_based_on_resources(None, INSTANCE)
+        self.assertEqual(host, 'half')
+
+    def test_no_host_fits(self):
+        instance = dict(INSTANCE, memory_mb=32 * 1024)
+        self.assertRaises(driver.NoValidHost,
+                          self.scheduler._schedule_based_on_resources,
+                          None, instance)
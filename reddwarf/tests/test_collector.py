@@ -0,0 +1,78 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2011 OpenStack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import test
+from reddwarf.collector.manager import StatusCollectorManager
+from reddwarf.db import api as dbapi
+from reddwarf.guest import status as guest_status
+
+
+class TestWhenCollectingGuestStatuses(test.TestCase):
+
+    def setUp(self):
+        super(TestWhenCollectingGuestStatuses, self).setUp()
+        self.writes = []
+        self.fail_writes = False
+        self.stubs.Set(dbapi, 'guest_status_update_many', self._update_many)
+        self.manager = StatusCollectorManager()
+
+    def _update_many(self, statuses):
+        if self.fail_writes:
+            raise Exception("database is down")
+        self.writes.append(sorted((instance_id, status.code)
+                                  for instance_id, status in statuses))
+
+    def _report(self, instance_id, status):
+        self.manager.report_status(None, instance_id, status.code)
+
+    def test_latest_report_per_guest_is_written(self):
+        self._report(1, guest_status.BUILDING)
+        self._report(1, guest_status.RUNNING)
+        self._report(2, guest_status.SHUTDOWN)
+        metrics = self.manager.flush()
+        self.assertEqual([[(1, guest_status.RUNNING.code),
+                           (2, guest_status.SHUTDOWN.code)]], self.writes)
+        self.assertEqual(3, metrics['received'])
+        self.assertEqual(1, metrics['coalesced'])
+        self.assertEqual(2, metrics['written'])
+
+    def test_writes_are_batched(self):
+        self.flags(status_collector_batch_size=2)
+        for instance_id in range(5):
+            self._report(instance_id, guest_status.RUNNING)
+        self.manager.flush()
+        self.assertEqual([2, 2, 1], [len(batch) for batch in self.writes])
+
+    def test_reports_beyond_max_pending_are_dropped(self):
+        self.flags(status_collector_max_pending=2)
+        for instance_id in range(3):
+            self._report(instance_id, guest_status.RUNNING)
+        # Guests already pending can still update their status.
+        self._report(0, guest_status.SHUTDOWN)
+        metrics = self.manager.flush()
+        self.assertEqual(1, metrics['dropped'])
+        self.assertEqual([[(0, guest_status.SHUTDOWN.code),
+                           (1, guest_status.RUNNING.code)]], self.writes)
+
+    def test_failed_writes_are_retried(self):
+        self._report(1, guest_status.RUNNING)
+        self.fail_writes = True
+        metrics = self.manager.flush()
+        self.assertEqual(1, metrics['failed'])
+        self.fail_writes = False
+        self.manager.flush()
+        self.assertEqual([[(1, guest_status.RUNNING.code)]], self.writes)
@@ -0,0 +1,71 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import test
+
+from reddwarf import rpc
+
+
+class FakeChannel(object):
+    pass
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.channel = FakeChannel()
+
+    def reconnect(self):
+        self.channel = FakeChannel()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class DeclareQueueTestCase(test.TestCase):
+
+    def setUp(self):
+        super(DeclareQueueTestCase, self).setUp()
+        self.declared = []
+        self.stubs.Set(rpc, '_declare_topic_queue',
+                       lambda channel, topic:
+                           self.declared.append((channel, topic)))
+        self.conn = FakeConnection()
+
+    def test_declares_queue_on_channel(self):
+        rpc.declare_queue('guest.one', self.conn)
+        self.assertEqual([(self.conn.channel, 'guest.one')], self.declared)
+
+    def test_declares_each_topic_once(self):
+        rpc.declare_queue('guest.one', self.conn)
+        rpc.declare_queue('guest.one', self.conn)
+        rpc.declare_queue('guest.two', self.conn)
+        self.assertEqual(['guest.one', 'guest.two'],
+                         [topic for channel, topic in self.declared])
+
+    def test_declares_again_after_reconnect(self):
+        rpc.declare_queue('guest.one', self.conn)
+        self.conn.reconnect()
+        rpc.declare_queue('guest.one', self.conn)
+        self.assertEqual(2, len(self.declared))
+        self.assertEqual(self.conn.channel, self.declared[1][0])
+
+    def test_uses_pooled_connection(self):
+        self.stubs.Set(rpc.impl_kombu, 'ConnectionContext',
+                       lambda: self.conn)
+        rpc.declare_queue('guest.one')
+        self.assertEqual([(self.conn.channel, 'guest.one')], self.declared)
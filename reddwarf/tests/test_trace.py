@@ -0,0 +1,121 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import context
+from nova import test
+
+from reddwarf import trace
+from reddwarf.guest import manager as guest_manager
+
+
+class SpanTestCase(test.TestCase):
+
+    def setUp(self):
+        super(SpanTestCase, self).setUp()
+        self.context = context.RequestContext('fake', 'fake',
+                                              request_id='req-1')
+        self.recorded = []
+        self.notified = []
+        self.stubs.Set(trace.dbapi, 'trace_span_create',
+                       lambda values: self.recorded.append(values))
+        self.stubs.Set(trace.notifier, 'notify',
+                       lambda publisher, event, priority, payload:
+                           self.notified.append((event, payload)))
+
+    def test_records_phase_under_request_id(self):
+        with trace.span(self.context, 'compute.volume', 7):
+            pass
+        self.assertEqual(1, len(self.recorded))
+        values = self.recorded[0]
+        self.assertEqual('req-1', values['trace_id'])
+        self.assertEqual(7, values['instance_id'])
+        self.assertEqual('compute.volume', values['name'])
+        self.assertFalse(values['failed'])
+        self.assertTrue(values['duration'] >= 0)
+        self.assertTrue(values['finished_at'] >= values['started_at'])
+        self.assertEqual([], self.notified)
+
+    def test_exception_marks_span_failed(self):
+        def fail():
+            with trace.span(self.context, 'compute.spawn', 7):
+                raise ValueError()
+        self.assertRaises(ValueError, fail)
+        self.assertTrue(self.recorded[0]['failed'])
+
+    def test_instance_id_set_later(self):
+        with trace.span(self.context, 'api.create') as span:
+            span.instance_id = 7
+        self.assertEqual(7, self.recorded[0]['instance_id'])
+
+    def test_span_without_instance_is_not_recorded(self):
+        with trace.span(self.context, 'api.create'):
+            pass
+        self.assertEqual([], self.recorded)
+
+    def test_disabled(self):
+        self.flags(trace_builds=False)
+        with trace.span(self.context, 'compute.volume', 7):
+            pass
+        self.assertEqual([], self.recorded)
+
+    def test_store_failure_does_not_fail_phase(self):
+        def broken_store(values):
+            raise Exception("database is down")
+        self.stubs.Set(trace.dbapi, 'trace_span_create', broken_store)
+        with trace.span(self.context, 'compute.volume', 7) as span:
+            pass
+        self.assertFalse(span.failed)
+
+    def test_notify(self):
+        self.flags(trace_notify=True)
+        with trace.span(self.context, 'guest.prepare', 7):
+            pass
+        event, payload = self.notified[0]
+        self.assertEqual('reddwarf.trace.span', event)
+        self.assertEqual('guest.prepare', payload['name'])
+        self.assertTrue(isinstance(payload['started_at'], basestring))
+
+
+class FakeGuestDriver(object):
+
+    def prepare(self, databases):
+        return databases
+
+
+class GuestPrepareTestCase(test.TestCase):
+
+    def setUp(self):
+        super(GuestPrepareTestCase, self).setUp()
+        self.context = context.RequestContext('fake', 'fake',
+                                              request_id='req-1')
+        self.recorded = []
+        self.stubs.Set(trace.dbapi, 'trace_span_create',
+                       lambda values: self.recorded.append(values))
+        self.manager = guest_manager.GuestManager(
+            guest_drivers=['reddwarf.tests.test_trace.FakeGuestDriver'])
+
+    def test_prepare_is_traced(self):
+        self.stubs.Set(guest_manager.guest_utils, 'get_instance_id',
+                       lambda: 7)
+        self.assertEqual(['db'], self.manager.prepare(self.context, ['db']))
+        self.assertEqual(7, self.recorded[0]['instance_id'])
+        self.assertEqual('guest.prepare', self.recorded[0]['name'])
+
+    def test_instance_lookup_failure_does_not_fail_prepare(self):
+        def broken_lookup():
+            raise Exception("database is down")
+        self.stubs.Set(guest_manager.guest_utils, 'get_instance_id',
+                       broken_lookup)
+        self.assertEqual(['db'], self.manager.prepare(self.context, ['db']))
+        self.assertEqual([], self.recorded)
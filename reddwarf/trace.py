@@ -0,0 +1,124 @@
+#    Copyright 2011 OpenStack LLC
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Timing of the phases of an instance build.
+
+Each phase is recorded as a span: one row in the trace_spans table with the
+instance, the host it ran on, when it started and how long it took.  The
+trace ID of a span is the request_id of its context, which already travels
+with every rpc message, so the API request, the scheduler, the compute
+manager and the guest all record their spans under the same trace.
+
+    with trace.span(context, 'compute.volume', instance_id):
+        ...
+
+A phase that reports failure by returning rather than raising can set
+``failed`` on the span itself.  With ``trace_notify`` each span is also sent
+as a reddwarf.trace.span notification.  Recording a span never fails the
+phase it measures.
+"""
+
+import time
+
+from nova import flags
+from nova import log as logging
+from nova import utils
+from nova.notifier import api as notifier
+
+from reddwarf.db import api as dbapi
+
+
+LOG = logging.getLogger('reddwarf.trace')
+FLAGS = flags.FLAGS
+flags.DEFINE_bool('trace_builds', True,
+                  'Record how long each phase of an instance build takes')
+flags.DEFINE_bool('trace_notify', False,
+                  'Also send each recorded build phase as a notification')
+
+
+def publisher_id(host=None):
+    return notifier.publisher_id("reddwarf-trace", host)
+
+
+class Span(object):
+    """One timed phase of a build, used as a context manager."""
+
+    def __init__(self, context, name, instance_id=None):
+        self.trace_id = getattr(context, 'request_id', None)
+        self.name = name
+        self.instance_id = instance_id
+        self.failed = False
+        self.started_at = None
+        self.duration = None
+        self._start = None
+
+    def __enter__(self):
+        self.started_at = utils.utcnow()
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.failed = True
+        self.finish()
+        return False
+
+    def finish(self):
+        """Stop timing and record the span."""
+        self.duration = time.time() - self._start
+        record(self)
+
+    def to_dict(self):
+        return {'trace_id': self.trace_id,
+                'instance_id': self.instance_id,
+                'name': self.name,
+                'host': FLAGS.host,
+                'started_at': self.started_at,
+                'finished_at': utils.utcnow(),
+                'duration': self.duration,
+                'failed': self.failed}
+
+
+def span(context, name, instance_id=None):
+    """Start timing the phase name of the build of instance_id.
+
+    The instance ID may also be set on the span once it is known, it must
+    be set by the time the span finishes for the span to be recorded.
+    """
+    return Span(context, name, instance_id)
+
+
+def record(span):
+    """Store a finished span, and send it on with trace_notify."""
+    if not FLAGS.trace_builds or span.instance_id is None:
+        return
+    values = span.to_dict()
+    LOG.debug("%(name)s of instance %(instance_id)s took %(duration).3fs"
+              % values)
+    try:
+        dbapi.trace_span_create(values)
+    except Exception:
+        LOG.exception("Unable to record %s of instance %s"
+                      % (span.name, span.instance_id))
+    if FLAGS.trace_notify:
+        payload = dict(values,
+                       started_at=utils.strtime(values['started_at']),
+                       finished_at=utils.strtime(values['finished_at']))
+        try:
+            notifier.notify(publisher_id(), 'reddwarf.trace.span',
+                            notifier.INFO, payload)
+        except Exception:
+            LOG.exception("Unable to send %s of instance %s"
+                          % (span.name, span.instance_id))
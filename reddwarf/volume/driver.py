@@ -104,8 +104,8 @@ class ReddwarfVolumeDriver(nova_driver.VolumeDriver):
         num_tries to account for the time lag.
         """
         try:
-            utils.execute('sudo', 'blockdev', '--getsize64', device_path,
-                          attempts=FLAGS.num_tries)
+            utils.execute('blockdev', '--getsize64', device_path,
+                          run_as_root=True, attempts=FLAGS.num_tries)
         except nova_exception.ProcessExecutionError:
             raise nova_exception.InvalidDevicePath(path=device_path)
 
@@ -164,7 +164,7 @@ class ReddwarfVolumeDriver(nova_driver.VolumeDriver):
         """Resize the filesystem on the specified device"""
         self._check_device_exists(device_path)
         try:
-            self._execute("sudo", "resize2fs", device_path)
+            self._execute("resize2fs", device_path, run_as_root=True)
         except nova_exception.ProcessExecutionError as err:
             LOG.error(err)
             raise nova_exception.Error("Error resizing the filesystem: %s"
@@ -191,8 +191,8 @@ class ReddwarfISCSIDriver(ReddwarfVolumeDriver, nova_driver.ISCSIDriver):
         talk to the iscsi target server.
         """
         try:
-            self._execute("sudo", "iscsiadm", "-m", "discovery",
-                          "-t", "st", "-p", FLAGS.san_ip)
+            self._execute("iscsiadm", "-m", "discovery",
+                          "-t", "st", "-p", FLAGS.san_ip, run_as_root=True)
         except nova_exception.ProcessExecutionError as err:
             LOG.fatal("Error initializing the volume client: %s" % err)
             raise nova_exception.VolumeServiceUnavailable()
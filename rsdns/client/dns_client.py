@@ -19,8 +19,13 @@ We have to duplicate a lot of code from the OpenStack client since so much
 is different here.
 """
 
+import calendar
+import re
+import time
+
 import eventlet
 from eventlet import pools
+from eventlet import semaphore
 from novaclient.client import HTTPClient
 from novaclient import exceptions
 httplib2 = eventlet.import_patched('httplib2')
@@ -35,65 +40,168 @@ except ImportError:
 LOG = logging.getLogger('rsdns.client.dns_client')
 
 
+class TokenCache(object):
+    """Auth tokens shared by every client in the process.
+
+    Each DnsManager worker builds its own DNSaasClient; keeping the token
+    here means only the first of them has to authenticate.
+
+    """
+
+    def __init__(self):
+        self.tokens = {}
+        self.lock = semaphore.Semaphore()
+
+    def get(self, key):
+        return self.tokens.get(key, (None, None))
+
+    def put(self, key, token, expires):
+        self.tokens[key] = (token, expires)
+
+    def invalidate(self, token):
+        """Forgets a token the service rejected, unless already replaced."""
+        for key, value in self.tokens.items():
+            if value[0] == token:
+                del self.tokens[key]
+
+    def clear(self):
+        self.tokens.clear()
+
+
+TOKEN_CACHE = TokenCache()
+
+
+class LatencyMetrics(object):
+    """Request count and timings for each endpoint the client calls."""
+
+    ID_PATTERN = re.compile(r'/\d+(?=/|$)')
+
+    def __init__(self):
+        self.endpoints = {}
+
+    def endpoint(self, method, url):
+        path = url.split('?', 1)[0]
+        return "%s %s" % (method, self.ID_PATTERN.sub('/{id}', path))
+
+    def record(self, method, url, elapsed):
+        key = self.endpoint(method, url)
+        stats = self.endpoints.setdefault(key, {'count': 0, 'total': 0.0,
+                                                'max': 0.0})
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+
+    def summary(self):
+        """Returns a dict of endpoint to count, average and max seconds."""
+        return dict((key, {'count': stats['count'],
+                           'avg': stats['total'] / stats['count'],
+                           'max': stats['max']})
+                    for key, stats in self.endpoints.items())
+
+
+def parse_expires(value):
+    """Converts the auth service's expiration time to seconds since epoch.
+
+    The service returns times like 2011-12-01T12:00:00.000-06:00. Returns
+    None if the value can't be understood, in which case the token is simply
+    used until it is rejected.
+
+    """
+    try:
+        timestamp = calendar.timegm(time.strptime(value[:19],
+                                                  "%Y-%m-%dT%H:%M:%S"))
+        zone = value[19:].lstrip('.0123456789')
+        if zone and zone != 'Z':
+            sign = -1 if zone[0] == '-' else 1
+            hours, minutes = zone[1:].split(':')
+            timestamp -= sign * (int(hours) * 3600 + int(minutes) * 60)
+        return timestamp
+    except (TypeError, ValueError):
+        return None
+
+
 class DNSaasClient(HTTPClient):
 
-    def __init__(self, accountId, user, apikey, auth_url, management_base_url):
-        tenant = "dbaas"    
+    # Tokens are renewed this many seconds before the service expires them.
+    token_refresh_margin = 300
+    token_expires = None
+
+    def __init__(self, accountId, user, apikey, auth_url, management_base_url,
+                 pool_size=4, token_cache=None):
+        tenant = "dbaas"
         super(DNSaasClient, self).__init__(user, apikey, tenant, auth_url)
         self.accountId = accountId
         self.management_base_url = management_base_url
-        self.http_pool = pools.Pool()
+        # Reusing the most recently returned Http keeps its connection warm.
+        self.http_pool = pools.Pool(max_size=pool_size, order_as_stack=True)
         self.http_pool.create = httplib2.Http
+        self.token_cache = token_cache or TOKEN_CACHE
+        self.metrics = LatencyMetrics()
 
     def authenticate(self):
+        key = (self.auth_url, self.user)
+        with self.token_cache.lock:
+            token, expires = self.token_cache.get(key)
+            if token is None or self._token_expiring(expires):
+                token, expires = self._request_token()
+                self.token_cache.put(key, token, expires)
+        self.auth_token = token
+        self.token_expires = expires
+        self.management_url = self.management_base_url + str(self.accountId)
+        LOG.debug("Authenticated with the DNS service.")
+
+    def _request_token(self):
         headers = {'Content-Type': 'application/json'}
         body = {'credentials':{'username':self.user, 'key':self.apikey}}
         with self.http_pool.item() as http:
             resp, resp_body = http.request(
                 self.auth_url, "POST", headers=headers, body=json.dumps(body))
-        resp, resp_body = http.request(self.auth_url, "POST", headers=headers,
-                                       body=json.dumps(body))
-
         resp_body = json.loads(resp_body)
-        LOG.debug(json.dumps({'body':resp_body, 'resp':resp}, sort_keys=True,
-                             indent=4))
         try:
-            self.auth_token = resp_body['auth']['token']['id']
+            token = resp_body['auth']['token']
+            return token['id'], parse_expires(token.get('expires'))
         except KeyError:
             # Not sure if this is the correct exception to raise here
             # Copied what i saw us doing in the ReddwarfHTTPClient.authenticate
             raise exceptions.HTTPNotImplemented("DNS Service: is not available")
-        self.management_url = self.management_base_url + str(self.accountId)
 
-        LOG.debug("AUTH_TOKEN=%s" % self.auth_token)
+    def _token_expiring(self, expires):
+        return expires is not None and \
+               time.time() > expires - self.token_refresh_margin
 
     def _munge_get_url(self, url):
         return url  # Don't munge this.
 
     def request(self, *args, **kwargs):
         auth_attempts = 0
+        url = args[0] if args else kwargs.get('uri', '')
+        method = args[1] if len(args) > 1 else kwargs.get('method', 'GET')
+        kwargs.setdefault('headers', {})
         if 'body' in kwargs:
             kwargs['headers']['Content-Type'] = 'application/json'
             kwargs['body'] = json.dumps(kwargs['body'])
-            LOG.debug("REQ BODY:" + str(kwargs['body']))
+        if self.token_expires is not None and \
+           time.time() > self.token_expires - self.token_refresh_margin:
+            LOG.debug("Auth token about to expire, re-authing....")
+            self.authenticate()
         while(True):
-            kwargs.setdefault('headers', {})
             kwargs['headers']['User-Agent'] = self.USER_AGENT
             kwargs['headers']['X-Auth-Token'] = self.auth_token
-            LOG.debug("REQ ARGS:" + str(args))
-            LOG.debug("REQ HEADERS:" + str(kwargs['headers']))
 
+            start = time.time()
             with self.http_pool.item() as http:
-                LOG.debug("BODY:" + str(args) + " kWARGS:" + str(kwargs))
                 resp, body_response = http.request(*args, **kwargs)
-            LOG.debug("RES RESPONSE:" + str(resp))
-            LOG.debug("RES BODY:" + str(body_response))
-            body = json.loads(body_response)
+            elapsed = time.time() - start
+            self.metrics.record(method, url, elapsed)
+            LOG.debug("DNS %s %s returned %s in %.3fs."
+                      % (method, url, resp.status, elapsed))
+            body = json.loads(body_response) if body_response else None
             if resp.status == 401 and auth_attempts < 3:
                 LOG.debug("Auth token expired, re-authing....")
                 auth_attempts += 1
                 if auth_attempts == 2:
                     LOG.debug("This is the last attempt to re-auth...")
+                self.token_cache.invalidate(self.auth_token)
                 self.authenticate()
             else:
                 if resp.status in (400, 401, 403, 404, 413, 500, 501):
@@ -101,8 +209,6 @@ class DNSaasClient(HTTPClient):
                 return resp, body
 
 
-
-
 def exception_from_response(response, body):
     """
     Return an instance of an OpenStackException or subclass
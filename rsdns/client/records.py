@@ -17,6 +17,7 @@
 Records interface.
 """
 
+import urllib
 import urlparse
 
 from novaclient import base
@@ -61,8 +62,22 @@ class RecordsManager(base.ManagerWithFind):
         :param record: The ID of the :class:`Record` to get.
         :rtype: :class:`Record`
         """
-        data = {"records":[{"type": record_type, "name": record_name,
-                            "data": record_data, "ttl": record_ttl }]}
+        return self.create_many(domain, [{"type": record_type,
+                                          "name": record_name,
+                                          "data": record_data,
+                                          "ttl": record_ttl}])
+
+    def create_many(self, domain, records):
+        """
+        Create several Records on the given domain with a single request.
+
+        :param domain: The ID of the :class:`Domain` to add the records to.
+        :param records: A list of dicts with "type", "name", "data" and "ttl"
+                        keys.
+        :rtype: :class:`FutureRecord` whose resource is the list of created
+                :class:`Record` objects.
+        """
+        data = {"records": records}
         resp, body = self.api.client.post("/domains/%s/records" % \
                                           base.getid(domain), body=data)
         if resp.status == 202:
@@ -76,6 +91,14 @@ class RecordsManager(base.ManagerWithFind):
     def delete(self, domain_id, record_id):
         self._delete("/domains/%s/records/%s" % (domain_id, record_id))
 
+    def delete_many(self, domain_id, record_ids):
+        """Deletes all of the given record IDs with a single request."""
+        if not record_ids:
+            return
+        query = urllib.urlencode([('id', record_id)
+                                  for record_id in record_ids])
+        self._delete("/domains/%s/records?%s" % (domain_id, query))
+
     def match_record(self, record, name=None, address=None, type=None):
         assert(isinstance(record, Record))
         return (not name or record.name == name) and \
@@ -108,10 +131,19 @@ class RecordsManager(base.ManagerWithFind):
         url = "/domains/%s/records" % domain_id
         if record_id:
             url += ("/%s" % record_id)
+        # Let the service narrow the search so fewer pages come back; the
+        # results are still checked with match_record below.
+        filters = [(key, value) for key, value in (('name', record_name),
+                                                   ('data', record_address),
+                                                   ('type', record_type))
+                   if value]
+        filter_query = ""
+        if filters:
+            filter_query = "&" + urllib.urlencode(filters)
         offset = 0
         list = []
         while offset is not None:
-            next_url = "%s?offset=%d" % (url, offset)
+            next_url = "%s?offset=%d%s" % (url, offset, filter_query)
             partial_list, offset = self.page_list(next_url)
             list += partial_list
         all_records = self.create_from_list(list)
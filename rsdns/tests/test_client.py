@@ -7,6 +7,9 @@ from eventlet import pools
 from novaclient.client import HTTPClient
 from novaclient import exceptions
 from rsdns.client.dns_client import DNSaasClient
+from rsdns.client.dns_client import LatencyMetrics
+from rsdns.client.dns_client import parse_expires
+from rsdns.client.dns_client import TokenCache
 
 ACCOUNT_ID = 1155
 USERNAME = "test_user"
@@ -45,6 +48,8 @@ class WhenDNSaasClientConnectsSuccessfully(unittest.TestCase):
         mock_client.http_pool = pools.Pool()
         mock_client.http_pool.create = FakeHttpLib2
         mock_client.auth_token = 'token'
+        mock_client.token_cache = TokenCache()
+        mock_client.metrics = LatencyMetrics()
         return mock_client
 
 
@@ -100,5 +105,48 @@ class WhenDNSaasClientConnectsSuccessfully(unittest.TestCase):
         self.assertEqual(200, resp.status)
         self.assertEqual({"hi":"hello"}, body)
 
+    def test_make_request_records_latency(self):
+        def fake_request(self, *args, **kwargs):
+            return FakeResponse(200), '{"hi":"hello"}'
+
+        mock_client = self.create_mock_client(fake_request)
+        DNSaasClient.request(mock_client, "/domains/5/records/7", "GET")
+        DNSaasClient.request(mock_client, "/domains/6/records/8?offset=0",
+                             "GET")
+        summary = mock_client.metrics.summary()
+        self.assertEqual(["GET /domains/{id}/records/{id}"], summary.keys())
+        self.assertEqual(2, summary["GET /domains/{id}/records/{id}"]["count"])
+
+    def test_make_request_with_empty_response_body(self):
+        def fake_request(self, *args, **kwargs):
+            return FakeResponse(202), ''
+
+        mock_client = self.create_mock_client(fake_request)
+        resp, body = DNSaasClient.request(mock_client, "/domains/5", "DELETE")
+        self.assertEqual(202, resp.status)
+        self.assertEqual(None, body)
+
+    def test_make_request_refreshes_expiring_token(self):
+        def fake_request(self, *args, **kwargs):
+            return FakeResponse(200), '{"hi":"hello"}'
+
+        mock_client = self.create_mock_client(fake_request)
+        mock_client.token_expires = 0
+        mock_client.authenticate()
+        self.mox.ReplayAll()
+        resp, body = DNSaasClient.request(mock_client, "/domains", "GET")
+        self.assertEqual(200, resp.status)
+
+
+class WhenParsingTokenExpiration(unittest.TestCase):
+
+    def test_parse_with_offset(self):
+        self.assertEqual(1322762400,
+                         parse_expires("2011-12-01T12:00:00.000-06:00"))
 
+    def test_parse_utc(self):
+        self.assertEqual(1322740800, parse_expires("2011-12-01T12:00:00Z"))
 
+    def test_parse_garbage(self):
+        self.assertEqual(None, parse_expires("tomorrow"))
+        self.assertEqual(None, parse_expires(None))
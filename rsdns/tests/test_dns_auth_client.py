@@ -8,6 +8,7 @@ from eventlet import pools
 from novaclient import client
 from novaclient import exceptions
 from rsdns.client import DNSaas
+from rsdns.client.dns_client import TOKEN_CACHE
 
 
 fake_response = httplib2.Response({"status": 200})
@@ -38,6 +39,7 @@ class DNSClientAuthFailPassTest(unittest.TestCase):
     def setUp(self):
         self.old_request =httplib2.Http.request
         self.mox = mox.Mox()
+        TOKEN_CACHE.clear()
 
     def tearDown(self):
         httplib2.Http.request = self.old_request
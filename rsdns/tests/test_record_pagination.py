@@ -62,6 +62,21 @@ class DNSClientRecordPagination(unittest.TestCase):
         for letter in expected_filtered_list:
             self.assertTrue(letter in actual_list)
 
+    def test_list_with_filters(self):
+        dns = FakeDNSaaS(None, None, None)
+        records = RecordsManager(dns)
+        self.mox.StubOutWithMock(records, "create_from_list")
+        self.mox.StubOutWithMock(records, "page_list")
+        expected_url = "/domains/%s/records" % FAKE_DOMAIN_ID
+        records.page_list(expected_url + "?offset=0&name=a.com&type=A")\
+            .AndReturn(([], None))
+        records.create_from_list([]).AndReturn([])
+        self.mox.ReplayAll()
+
+        actual_list = records.list(FAKE_DOMAIN_ID, record_name="a.com",
+                                   record_type="A")
+        self.assertEqual(0, len(actual_list))
+
     def test_page_list(self):
         """Tests grabbing the list and next offset from the RS DNS API."""
         client = self.mox.CreateMock(DNSaasClient)
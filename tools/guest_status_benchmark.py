@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compares the ORM guest status queries with the compiled core sql ones in
+reddwarf.db.api.
+
+    tools/guest_status_benchmark.py --sql_connection=mysql://... \\
+        --benchmark_instances=500 --benchmark_rounds=10
+
+Defaults to a throwaway sqlite database in the temp directory.  Rows are
+created with instance ids from 900000 up and removed again at the end.
+"""
+
+import gettext
+import os
+import sys
+import tempfile
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir,
+                                   os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'reddwarf', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from nova import flags
+from nova import utils
+from nova.db.sqlalchemy.session import get_session
+
+from reddwarf.db import api as dbapi
+from reddwarf.db import models
+from reddwarf.guest import status as guest_status
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer('benchmark_instances', 200,
+                     'Number of guest status rows to benchmark with')
+flags.DEFINE_integer('benchmark_rounds', 5,
+                     'Number of passes over the rows for each method')
+
+FIRST_ID = 900000
+
+
+def orm_get(instance_id):
+    return get_session().query(models.GuestStatus).\
+                         filter_by(instance_id=instance_id).\
+                         filter_by(deleted=False).\
+                         first()
+
+
+def orm_update(instance_id, status):
+    session = get_session()
+    with session.begin():
+        session.query(models.GuestStatus).\
+                filter_by(instance_id=instance_id).\
+                update({'state': status.code,
+                        'state_description': status.description})
+
+
+def timed(name, ids, call):
+    start = time.time()
+    for _round in range(FLAGS.benchmark_rounds):
+        for instance_id in ids:
+            call(instance_id)
+    elapsed = time.time() - start
+    calls = len(ids) * FLAGS.benchmark_rounds
+    print "%-24s %8d calls %8.3fs %8.1f us/call" % (
+        name, calls, elapsed, elapsed / calls * 1000000)
+    return elapsed
+
+
+def main():
+    utils.default_flagfile()
+    flags.FLAGS(sys.argv)
+    if FLAGS.sql_connection.startswith('sqlite:///$'):
+        FLAGS.sql_connection = 'sqlite:///%s' % os.path.join(
+            tempfile.gettempdir(), 'guest_status_benchmark.sqlite')
+    models.GuestStatus.__table__.create(bind=get_session().bind,
+                                        checkfirst=True)
+
+    ids = range(FIRST_ID, FIRST_ID + FLAGS.benchmark_instances)
+    for instance_id in ids:
+        dbapi.guest_status_create(instance_id)
+    try:
+        running = guest_status.RUNNING
+        orm = timed("orm get", ids, orm_get)
+        core = timed("core get", ids, dbapi.guest_status_get)
+        print "core get is %.1fx the orm speed" % (orm / core)
+        orm = timed("orm update", ids,
+                    lambda instance_id: orm_update(instance_id, running))
+        core = timed("core update", ids,
+                     lambda instance_id: dbapi.guest_status_update(
+                         instance_id, running))
+        print "core update is %.1fx the orm speed" % (orm / core)
+        start = time.time()
+        for _round in range(FLAGS.benchmark_rounds):
+            dbapi.guest_status_update_many([(instance_id, running)
+                                            for instance_id in ids])
+        elapsed = time.time() - start
+        print "%-24s %8d rows  %8.3fs" % ("core update_many",
+            len(ids) * FLAGS.benchmark_rounds, elapsed)
+    finally:
+        get_session().query(models.GuestStatus).\
+                      filter(models.GuestStatus.instance_id >= FIRST_ID).\
+                      delete()
+
+
+if __name__ == '__main__':
+    main()
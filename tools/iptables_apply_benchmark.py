@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2011 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compares applying iptables rules once per container with
+IptablesManager.apply_coalesced while a wave of containers is set up at
+once, the way OpenVzConnection._initial_secure_host does during spawn.
+
+    tools/iptables_apply_benchmark.py --benchmark_containers=10,50,200
+
+No rules are installed.  iptables-save and iptables-restore are simulated,
+each costing --benchmark_fork_time seconds plus --benchmark_line_time for
+every line of the ruleset, so the numbers show how the cost grows with the
+number of containers rather than what a particular host takes.
+"""
+
+import gettext
+import os
+import sys
+import tempfile
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(sys.argv[0]),
+                                   os.pardir,
+                                   os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from eventlet import greenthread
+
+from nova import flags
+from nova import utils
+from nova.network import linux_net
+
+
+FLAGS = flags.FLAGS
+flags.DEFINE_list('benchmark_containers', ['10', '50', '200'],
+                  'Sizes of the container waves to benchmark')
+flags.DEFINE_float('benchmark_fork_time', 0.005,
+                   'Simulated cost of starting iptables-save/restore')
+flags.DEFINE_float('benchmark_line_time', 0.00002,
+                   'Simulated cost of each ruleset line saved or restored')
+
+
+class FakeIptables(object):
+    """Keeps the restored ruleset so the next save returns it."""
+
+    def __init__(self):
+        self.tables = {}
+        self.restores = 0
+
+    def execute(self, cmd, *args, **kwargs):
+        if cmd.endswith('-save'):
+            lines = self.tables.get((cmd, args[1]), ['*%s' % args[1],
+                                                     'COMMIT'])
+            self._cost(lines)
+            return '\n'.join(lines), ''
+        lines = kwargs['process_input'].split('\n')
+        self._cost(lines)
+        self.restores += 1
+        table = lines[0].lstrip('*') if lines else ''
+        self.tables[(cmd.replace('-restore', '-save'), table)] = lines
+        return '', ''
+
+    def _cost(self, lines):
+        greenthread.sleep(FLAGS.benchmark_fork_time +
+                          FLAGS.benchmark_line_time * len(lines))
+
+
+def secure_host(manager, ctid, coalesced):
+    for table in (manager.ipv4['filter'], manager.ipv6['filter']):
+        table.add_chain(str(ctid))
+        table.add_rule(str(ctid), '-s 10.0.0.1/32 -p tcp --dport 3306 '
+                                  '-j ACCEPT')
+    if coalesced:
+        manager.apply_coalesced()
+    else:
+        manager.apply()
+
+
+def wave(count, coalesced):
+    fake = FakeIptables()
+    manager = linux_net.IptablesManager(execute=fake.execute)
+    start = time.time()
+    threads = [greenthread.spawn(secure_host, manager, ctid, coalesced)
+               for ctid in range(1000, 1000 + count)]
+    for thread in threads:
+        thread.wait()
+    return time.time() - start, fake.restores
+
+
+def main():
+    utils.default_flagfile()
+    flags.FLAGS(sys.argv)
+    # apply takes an external lock, keep it out of the way.
+    FLAGS.lock_path = tempfile.mkdtemp()
+    print "%10s %14s %10s %14s %10s" % ("containers", "apply each",
+                                        "restores", "coalesced",
+                                        "restores")
+    for count in FLAGS.benchmark_containers:
+        count = int(count)
+        each, each_restores = wave(count, False)
+        coalesced, coalesced_restores = wave(count, True)
+        print "%10d %13.3fs %10d %13.3fs %10d" % (count, each, each_restores,
+                                                  coalesced,
+                                                  coalesced_restores)
+
+
+if __name__ == '__main__':
+    main()